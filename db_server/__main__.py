@@ -2,9 +2,15 @@
 
 import asyncio
 import logging
+import os
+import socket
+from typing import List
 from urllib.parse import quote_plus
 
-from motor.motor_tornado import MotorClient  # type: ignore
+import tornado.httpserver
+import tornado.netutil
+import tornado.process
+import tornado.web
 
 # local imports
 from rest_tools.server import (  # type: ignore
@@ -13,17 +19,34 @@ from rest_tools.server import (  # type: ignore
     RestServer,
 )
 
-from .config import EXPECTED_CONFIG
+from .coalesce import SingleFlight
+from .config import check_config, EXPECTED_CONFIG
+from .metrics import Metrics, MongoCommandListener
+from .notifications import ChangeNotifier
 from .routes import (
+    ChangeEventsHandler,
     CollectionsHistogramsHandler,
     CollectionsHistogramsNamesHandler,
     CollectionsNamesHandler,
     DatabasesNamesHandler,
     FileNamesHandler,
+    HistogramDeltaHandler,
     HistogramHandler,
-    MadDashMotorClient,
     MainHandler,
+    MetricsHandler,
+    PublicMetricsHandler,
 )
+from .storage import create_storage, MadDashMotorClient
+
+
+def _startup_workers(server: RestServer, sockets: List[socket.socket]) -> None:
+    """Serve the routes on the pre-bound `sockets` (shared by all workers).
+
+    Like `RestServer.startup()`, but without binding a new socket.
+    """
+    app = tornado.web.Application(server.routes, **server.app_args)
+    server.http_server = tornado.httpserver.HTTPServer(app, xheaders=True)
+    server.http_server.add_sockets(sockets)
 
 
 def start(debug: bool = False) -> RestServer:
@@ -32,6 +55,7 @@ def start(debug: bool = False) -> RestServer:
 
     for name in config:
         logging.info(f"{name} = {config[name]}")
+    check_config(config)
 
     args = RestHandlerSetup(
         {
@@ -44,7 +68,8 @@ def start(debug: bool = False) -> RestServer:
         }
     )
 
-    # configure access to MongoDB as a backing store
+    # configure access to MongoDB (or an in-memory stand-in) as a backing store
+    backend = config["MAD_DASH_STORAGE_BACKEND"]
     mongo_user = quote_plus(config["MAD_DASH_MONGODB_AUTH_USER"])
     mongo_pass = quote_plus(config["MAD_DASH_MONGODB_AUTH_PASS"])
     mongo_host = config["MAD_DASH_MONGODB_HOST"]
@@ -53,15 +78,64 @@ def start(debug: bool = False) -> RestServer:
     if mongo_user and mongo_pass:
         mongodb_url = f"mongodb://{mongo_user}:{mongo_pass}@{mongo_host}:{mongo_port}"
 
-    # ensure indexes
-    md_mc = MadDashMotorClient(MotorClient(mongodb_url))
-    asyncio.get_event_loop().run_until_complete(md_mc.ensure_all_databases_indexes())
+    def setup_storage() -> None:
+        # the metrics observe every command of the MongoDB client
+        args["metrics"] = Metrics(
+            collection_sizes_ttl=float(config["MAD_DASH_METRICS_COLLECTION_SIZES_TTL"])
+        )
+        args["storage"] = create_storage(
+            backend,
+            mongodb_url,
+            event_listeners=[MongoCommandListener(args["metrics"])],
+        )
+
+    # ensure indexes -- only once, before forking any workers
+    setup_storage()
+    asyncio.get_event_loop().run_until_complete(
+        args["storage"].ensure_all_databases_indexes()
+    )
 
-    args["motor_client"] = MotorClient(mongodb_url)
+    # fork workers which share one listening socket (0 means one per CPU)
+    sockets = []  # type: List[socket.socket]
+    workers = int(config["MAD_DASH_REST_WORKERS"])
+    if workers != 1:
+        if isinstance(args["storage"], MadDashMotorClient):
+            args["storage"].motor_client.close()  # MongoDB clients are not fork-safe
+        sockets = tornado.netutil.bind_sockets(
+            int(config["MAD_DASH_REST_PORT"]),
+            address=config["MAD_DASH_REST_HOST"],
+            family=socket.AF_INET,
+        )
+        task_id = tornado.process.fork_processes(workers)
+        asyncio.set_event_loop(asyncio.new_event_loop())  # don't share parent's loop
+        logging.info(f"Started worker #{task_id} (pid: {os.getpid()}).")
+
+        # each worker gets its own MotorClient (and metrics), created after the fork
+        setup_storage()
+
+    # limit how large a (gzipped) request body may decompress to
+    args["max_body_size"] = int(config["MAD_DASH_MAX_BODY_SIZE"])
+
+    # share in-flight queries between identical concurrent GETs
+    args["single_flight"] = SingleFlight(enabled=bool(config["MAD_DASH_SINGLE_FLIGHT"]))
+
+    # configure change notifications
+    args["notifier"] = ChangeNotifier()
+    if config["MAD_DASH_CHANGE_STREAMS"]:
+        if not isinstance(args["storage"], MadDashMotorClient):
+            raise RuntimeError("change streams require the 'mongodb' storage backend")
+        asyncio.get_event_loop().create_task(
+            args["notifier"].watch_change_streams(args["storage"].motor_client)
+        )
 
     # configure REST routes
     server = RestServer(debug=debug)
     server.add_route(r"/$", MainHandler, args)
+    server.add_route(
+        r"/metrics$",
+        PublicMetricsHandler if config["MAD_DASH_METRICS_PUBLIC"] else MetricsHandler,
+        args,
+    )  # get server metrics
     server.add_route(
         r"/databases/names$", DatabasesNamesHandler, args
     )  # get database names
@@ -75,11 +149,19 @@ def start(debug: bool = False) -> RestServer:
         r"/collections/histograms$", CollectionsHistogramsHandler, args
     )  # get all histogram objects in collection
     server.add_route(r"/histogram$", HistogramHandler, args)  # get histogram object
+    server.add_route(
+        r"/histogram/delta$", HistogramDeltaHandler, args
+    )  # increment histogram bins
     server.add_route(r"/files/names$", FileNamesHandler, args)  # get file names
-
-    server.startup(
-        address=config["MAD_DASH_REST_HOST"], port=int(config["MAD_DASH_REST_PORT"])
-    )
+    server.add_route(r"/events$", ChangeEventsHandler, args)  # stream change events
+
+    if sockets:
+        _startup_workers(server, sockets)
+    else:
+        server.startup(
+            address=config["MAD_DASH_REST_HOST"],
+            port=int(config["MAD_DASH_REST_PORT"]),
+        )
     return server
 
 
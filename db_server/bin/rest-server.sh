@@ -9,4 +9,7 @@ export MAD_DASH_MONGODB_HOST=${MAD_DASH_MONGODB_HOST:='localhost'}
 export MAD_DASH_MONGODB_PORT=${MAD_DASH_MONGODB_PORT:='27017'}
 export MAD_DASH_REST_HOST=${MAD_DASH_REST_HOST:="127.0.0.1"}
 export MAD_DASH_REST_PORT=${MAD_DASH_REST_PORT:="8080"}
+export MAD_DASH_STORAGE_BACKEND=${MAD_DASH_STORAGE_BACKEND:='mongodb'}
+export MAD_DASH_REST_WORKERS=${MAD_DASH_REST_WORKERS:="1"}
+export MAD_DASH_CHANGE_STREAMS=${MAD_DASH_CHANGE_STREAMS:=''}
 python -m db_server.rest_server
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""Request coalescing for the Mad-Dash REST API server interface."""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Share one in-flight call's result with concurrent calls of the same key.
+
+    Nothing is cached: once the call finishes, the next call with the key
+    runs again. If not `enabled`, every call runs on its own.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(
+        self, key: Hashable, func: Callable[[], Awaitable[T]]
+    ) -> Tuple[T, bool]:
+        """Return `func()`'s result and whether it was shared from another call.
+
+        If a call with `key` is already in flight, wait for its result
+        (or exception) instead of calling `func`. The call runs in its own
+        task, so cancelling any caller, even the first, doesn't cancel it
+        for the others.
+        """
+        self.calls += 1
+        if not self.enabled:
+            return await func(), False
+
+        task = self.inflight.get(key)
+        coalesced = task is not None
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self.inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task), coalesced
+
+    def forget(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Stop sharing the in-flight calls whose key matches `predicate`.
+
+        Their current callers still get their results, but later calls with
+        those keys run again. Return the number of calls forgotten.
+        """
+        keys = [key for key in self.inflight if predicate(key)]
+        for key in keys:
+            del self.inflight[key]
+        return len(keys)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved, in case every caller was cancelled
@@ -0,0 +1,34 @@
+"""Decompression of (gzip) request bodies, with a size guard."""
+
+import zlib
+
+ENCODINGS = ["gzip", "x-gzip"]
+
+
+class BodyTooLargeError(ValueError):
+    """Raised when a decompressed body would be larger than allowed."""
+
+
+def decompress_body(body: bytes, content_encoding: str, max_size: int) -> bytes:
+    """Return the body, decompressed according to its Content-Encoding.
+
+    At most `max_size` bytes are decompressed, so a small, malicious body
+    can't expand to exhaust memory. Raise `BodyTooLargeError` if the body
+    is larger, and `ValueError` if it's not valid for its encoding.
+    """
+    encoding = content_encoding.strip().lower()
+    if encoding in ["", "identity"]:
+        return body
+    if encoding not in ENCODINGS:
+        raise ValueError(f"unsupported Content-Encoding ({content_encoding})")
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # expect a gzip header
+    try:
+        data = decompressor.decompress(body, max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"invalid gzip body ({e})")
+    if len(data) > max_size:
+        raise BodyTooLargeError(f"decompressed body is over {max_size} bytes")
+    if not decompressor.eof:
+        raise ValueError("truncated gzip body")
+    return data
@@ -1,5 +1,6 @@
 """Config settings."""
 
+from typing import Any, Dict
 
 EXPECTED_CONFIG = {
     "MAD_DASH_AUTH_ALGORITHM": "HS512",  # 'RS256',
@@ -11,9 +12,27 @@ EXPECTED_CONFIG = {
     "MAD_DASH_MONGODB_PORT": "27017",
     "MAD_DASH_REST_HOST": "localhost",
     "MAD_DASH_REST_PORT": "8080",
+    "MAD_DASH_REST_WORKERS": "1",  # 0 means one worker process per CPU
+    "MAD_DASH_STORAGE_BACKEND": "mongodb",  # or 'memory' (for testing/benchmarking)
+    "MAD_DASH_CHANGE_STREAMS": "",  # non-empty means source events from change streams
+    "MAD_DASH_MAX_BODY_SIZE": "268435456",  # max bytes of a (decompressed) request body
+    "MAD_DASH_SINGLE_FLIGHT": "1",  # empty means identical GETs don't share queries
+    "MAD_DASH_METRICS_PUBLIC": "",  # non-empty means serve /metrics without auth
+    "MAD_DASH_METRICS_COLLECTION_SIZES_TTL": "60",  # seconds to cache collStats for
 }
 
 
+def check_config(config: Dict[str, Any]) -> None:
+    """Raise `RuntimeError` if the settings can't work together."""
+    workers = int(config["MAD_DASH_REST_WORKERS"])
+    if config["MAD_DASH_STORAGE_BACKEND"] == "memory" and workers != 1:
+        # each forked worker would have its own, private in-memory store
+        raise RuntimeError(
+            "the 'memory' storage backend requires MAD_DASH_REST_WORKERS=1"
+            f" (not {workers}), since workers can't share it"
+        )
+
+
 AUTH_PREFIX = "maddash"
 
 
@@ -0,0 +1,236 @@
+"""Request and MongoDB metrics for the Mad-Dash REST API server interface.
+
+Everything is kept in-process and rendered in the Prometheus text format.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, DefaultDict, Dict, List, Sequence, Tuple
+
+from pymongo import monitoring  # type: ignore
+
+from .coalesce import SingleFlight
+
+# types
+Labels = Tuple[Tuple[str, str], ...]
+Gauges = Dict[Tuple[str, Labels], float]
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """A cumulative-bucket histogram of observed values."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add value to the histogram."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: Labels) -> List[str]:
+        """Return the histogram's Prometheus text lines."""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(
+                f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}"
+            )
+        lines.append(f"{name}_sum{_format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+
+def _escape_label_value(value: str) -> str:
+    """Escape backslashes, double quotes, and newlines, as Prometheus requires."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in labels)
+    return f"{{{inner}}}"
+
+
+class CachedGauges:
+    """Gauges that are re-read at most once every `ttl` seconds.
+
+    Concurrent reads of expired gauges share one refresh.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.gauges: Gauges = {}
+        self.expires = 0.0
+        self.single_flight: SingleFlight[Gauges] = SingleFlight()
+
+    async def get(self, read: Callable[[], Awaitable[Gauges]]) -> Gauges:
+        """Return the gauges, calling `read()` for new ones if they've expired."""
+        if time.monotonic() >= self.expires:
+            await self.single_flight.do((), lambda: self._refresh(read))
+        return self.gauges
+
+    async def _refresh(self, read: Callable[[], Awaitable[Gauges]]) -> Gauges:
+        self.gauges = await read()
+        self.expires = time.monotonic() + self.ttl
+        return self.gauges
+
+
+class Metrics:
+    """Collection of the server's counters, histograms, and gauges.
+
+    The collection-size gauges are costly to read (a `collStats` per
+    collection), so they're cached for `collection_sizes_ttl` seconds.
+    """
+
+    def __init__(self, collection_sizes_ttl: float = 60.0) -> None:
+        self.lock = threading.Lock()  # MongoDB commands are observed from threads
+        self.counters: DefaultDict[Tuple[str, Labels], float] = defaultdict(int)
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.help: Dict[str, Tuple[str, str]] = {}
+        self.collection_sizes = CachedGauges(collection_sizes_ttl)
+
+        self.describe(
+            "maddash_requests_total",
+            "counter",
+            "Requests by route, method, and status.",
+        )
+        self.describe(
+            "maddash_request_seconds",
+            "histogram",
+            "Request latency by route and method.",
+        )
+        self.describe(
+            "maddash_request_bytes_total", "counter", "Request body bytes received."
+        )
+        self.describe(
+            "maddash_response_bytes_total", "counter", "Response body bytes sent."
+        )
+        self.describe(
+            "maddash_mongo_seconds", "histogram", "MongoDB command latency by command."
+        )
+        self.describe(
+            "maddash_mongo_failures_total", "counter", "Failed MongoDB commands."
+        )
+        self.describe(
+            "maddash_singleflight_calls_total",
+            "counter",
+            "Coalescable GET requests by route.",
+        )
+        self.describe(
+            "maddash_singleflight_coalesced_total",
+            "counter",
+            "GET requests that shared another request's query and response.",
+        )
+        self.describe(
+            "maddash_collection_documents", "gauge", "Documents in each collection."
+        )
+        self.describe(
+            "maddash_collection_bytes", "gauge", "Data size of each collection."
+        )
+
+    def describe(self, name: str, type_: str, help_: str) -> None:
+        """Set a metric's type and help text."""
+        self.help[name] = (type_, help_)
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        """Increment a counter."""
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        """Add a value to a histogram."""
+        with self.lock:
+            try:
+                histogram = self.histograms[(name, labels)]
+            except KeyError:
+                histogram = self.histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def observe_request(  # pylint: disable=R0913
+        self,
+        route: str,
+        method: str,
+        status: int,
+        seconds: float,
+        request_bytes: int,
+        response_bytes: int,
+    ) -> None:
+        """Record a finished request."""
+        labels = (("route", route), ("method", method))
+        self.inc("maddash_requests_total", labels + (("status", str(status)),))
+        self.observe("maddash_request_seconds", labels, seconds)
+        self.inc("maddash_request_bytes_total", labels, request_bytes)
+        self.inc("maddash_response_bytes_total", labels, response_bytes)
+
+    def render(self, gauges: Gauges) -> str:
+        """Return all metrics (and the given gauges) in Prometheus text format."""
+        samples: DefaultDict[str, List[str]] = defaultdict(list)
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                samples[name].append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                samples[name].extend(histogram.render(name, labels))
+        for (name, labels), value in sorted(gauges.items()):
+            samples[name].append(f"{name}{_format_labels(labels)} {value}")
+
+        lines = []
+        for name in sorted(samples):
+            if name in self.help:
+                type_, help_ = self.help[name]
+                lines.append(f"# HELP {name} {help_}")
+                lines.append(f"# TYPE {name} {type_}")
+            lines.extend(samples[name])
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandListener(monitoring.CommandListener):  # type: ignore
+    """Record the latency of every MongoDB command (find, insert, update, ...).
+
+    Pass to `MotorClient(..., event_listeners=[...])`.
+    """
+
+    def __init__(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """Ignore; the duration is reported at the end."""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """Record the command's latency."""
+        self.metrics.observe(
+            "maddash_mongo_seconds",
+            (("command", event.command_name),),
+            event.duration_micros / 1e6,
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """Record the command's failure."""
+        self.metrics.inc(
+            "maddash_mongo_failures_total", (("command", event.command_name),)
+        )
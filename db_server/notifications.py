@@ -0,0 +1,109 @@
+"""Change notifications for the Mad-Dash REST API server interface."""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from motor.motor_tornado import MotorClient  # type: ignore
+
+from .config import EXCLUDE_DBS
+
+# types
+ChangeEvent = Dict[str, Any]
+
+
+class ChangeNotifier:
+    """Fan out change notifications (database, collection, name, version).
+
+    Every subscriber gets its own bounded queue. A slow subscriber only
+    loses its own oldest events, it never blocks a writer.
+    """
+
+    def __init__(self, max_queue_size: int = 1000) -> None:
+        self.max_queue_size = max_queue_size
+        self.subscribers: List[asyncio.Queue] = []
+        self.from_change_streams = False
+
+    def subscribe(self) -> "asyncio.Queue[ChangeEvent]":
+        """Return a new queue that will receive every published event."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[ChangeEvent]") -> None:
+        """Stop sending events to `queue`."""
+        if queue in self.subscribers:
+            self.subscribers.remove(queue)
+
+    def publish(
+        self, database_name: str, collection_name: str, name: str, version: int
+    ) -> None:
+        """Send event to every subscriber."""
+        event = {
+            "database": database_name,
+            "collection": collection_name,
+            "name": name,
+            "version": version,
+        }
+        for queue in self.subscribers:
+            if queue.full():  # drop the oldest event
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def notify_write(
+        self, database_name: str, collection_name: str, name: str, version: int
+    ) -> None:
+        """Publish a write made by this server.
+
+        No-op if events are sourced from MongoDB change streams, which
+        already see every write (including other servers' writes).
+        """
+        if self.from_change_streams:
+            return
+        self.publish(database_name, collection_name, name, version)
+
+    async def watch_change_streams(self, motor_client: MotorClient) -> None:
+        """Publish an event for each write seen by MongoDB's change streams.
+
+        Requires MongoDB to be running as a replica set.
+        """
+        self.from_change_streams = True
+        pipeline = [
+            {"$match": {"operationType": {"$in": ["insert", "replace", "update"]}}}
+        ]
+
+        while True:
+            try:
+                async with motor_client.watch(
+                    pipeline, full_document="updateLookup"
+                ) as stream:
+                    async for change in stream:
+                        self._publish_change(change)
+            except Exception as e:  # pylint: disable=W0703
+                logging.error(f"Change stream interrupted ({e}), restarting...")
+                await asyncio.sleep(5)
+
+    def _publish_change(self, change: Dict[str, Any]) -> None:
+        database_name = change["ns"]["db"]
+        if database_name in EXCLUDE_DBS:
+            return
+        document: Dict[str, Any] = change.get("fullDocument") or {}
+        if "name" not in document:
+            return
+        self.publish(
+            database_name,
+            change["ns"]["coll"],
+            document["name"],
+            len(document.get("history", [])),
+        )
+
+
+def matches(
+    event: ChangeEvent, database_name: Optional[str], collection_name: Optional[str]
+) -> bool:
+    """Return whether the event is for the database/collection (if given)."""
+    if database_name and event["database"] != database_name:
+        return False
+    if collection_name and event["collection"] != collection_name:
+        return False
+    return True
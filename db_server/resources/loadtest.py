@@ -0,0 +1,177 @@
+"""Load test a running Mad-Dash REST server with concurrent GET requests.
+
+Run once per `MAD_DASH_REST_WORKERS` setting to see throughput scale with
+the number of worker processes. Run against a server with
+`MAD_DASH_STORAGE_BACKEND=memory` (and `--seed-histograms`) to measure the
+REST/serialization cost without a MongoDB server.
+
+Every request GETs the same arguments, so by default most of them share
+another request's query (see `maddash_singleflight_coalesced_total`). Run
+the server with `MAD_DASH_SINGLE_FLIGHT=` (empty) to measure each
+request's own cost.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, List
+from urllib.parse import urlencode, urljoin
+
+import requests
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+
+async def _worker(
+    client: AsyncHTTPClient,
+    url: str,
+    headers: dict,
+    deadline: float,
+    latencies: List[float],
+    errors: List[int],
+) -> None:
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            await client.fetch(url, headers=headers, request_timeout=60)
+        except HTTPClientError as e:
+            errors.append(e.code)
+            continue
+        latencies.append(time.monotonic() - start)
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+def seed_histograms(
+    dbms_url: str, token_url: str, database: str, collection: str, n_histos: int
+) -> None:
+    """POST `n_histos` random histograms (+ a filelist) to the collection."""
+    token_json = requests.get(
+        urljoin(token_url, "token?scope=maddash:production")
+    ).json()
+    headers = {"Authorization": f"Bearer {token_json['access']}"}
+
+    for i in range(n_histos):
+        histo = {
+            "name": f"LoadTest_{i}",
+            "xmax": 10.0,
+            "xmin": 0.0,
+            "overflow": 0,
+            "underflow": 0,
+            "nan_count": 0,
+            "bin_values": [random.randint(0, 1000) for _ in range(100)],
+        }
+        body: Dict[str, Any] = {
+            "database": database,
+            "collection": collection,
+            "histogram": histo,
+            "update": True,
+        }
+        requests.post(
+            urljoin(dbms_url, "/histogram"), json=body, headers=headers
+        ).raise_for_status()
+
+    body = {
+        "database": database,
+        "collection": collection,
+        "files": [f"LoadTest_{i}.i3.zst" for i in range(n_histos)],
+        "update": True,
+    }
+    requests.post(
+        urljoin(dbms_url, "/files/names"), json=body, headers=headers
+    ).raise_for_status()
+    logging.info(f"Seeded {n_histos} histograms into {collection} (db: {database}).")
+
+
+async def main() -> None:
+    """Do main."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dbms-url",
+        dest="dbms_url",
+        default="http://localhost:8080",
+        help="url to the dbms server.",
+    )
+    parser.add_argument(
+        "--token-url",
+        dest="token_url",
+        default="http://localhost:8888",
+        help="url to the token service.",
+    )
+    parser.add_argument(
+        "--route",
+        default="/collections/histograms",
+        help="route to GET (with the database/collection arguments).",
+    )
+    parser.add_argument("--database", default="test_histograms")
+    parser.add_argument("--collection", default="TEST")
+    parser.add_argument(
+        "--concurrency", type=int, default=32, help="number of concurrent requests."
+    )
+    parser.add_argument(
+        "--seed-histograms",
+        dest="seed_histograms",
+        type=int,
+        default=0,
+        help="POST this many histograms to the collection before testing.",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, help="length of the test in seconds."
+    )
+    parser.add_argument("-l", "--log", default="INFO", help="the output logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log.upper()))
+    for arg, val in vars(args).items():
+        logging.info(f"{arg}: {val}")
+
+    if args.seed_histograms:
+        seed_histograms(
+            args.dbms_url,
+            args.token_url,
+            args.database,
+            args.collection,
+            args.seed_histograms,
+        )
+
+    token_json = requests.get(urljoin(args.token_url, "token?scope=maddash:web")).json()
+    headers = {"Authorization": f"Bearer {token_json['access']}"}
+    query = urlencode({"database": args.database, "collection": args.collection})
+    url = f"{urljoin(args.dbms_url, args.route)}?{query}"
+
+    AsyncHTTPClient.configure(None, max_clients=args.concurrency)
+    client = AsyncHTTPClient()
+
+    latencies: List[float] = []
+    errors: List[int] = []
+    start = time.monotonic()
+    deadline = start + args.duration
+    await asyncio.gather(
+        *[
+            _worker(client, url, headers, deadline, latencies, errors)
+            for _ in range(args.concurrency)
+        ]
+    )
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    results = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p95": _percentile(latencies, 95),
+        "latency_p99": _percentile(latencies, 99),
+    }
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main())
@@ -1,23 +1,35 @@
 """Routes handlers for the Mad-Dash REST API server interface."""
 
+import asyncio
 import time
-from typing import Any, get_args, List, Optional, Tuple, Union
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    get_args,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+import tornado.iostream
 import tornado.web
-from motor.motor_tornado import (  # type: ignore
-    MotorClient,
-    MotorCollection,
-    MotorDatabase,
-)
+from tornado.escape import json_encode
 
 # local imports
-from api import check_type, I3Histogram, MongoHistogram, Num
+from api import check_type, I3Histogram, Num
 from rest_tools.client import json_decode  # type: ignore
 from rest_tools.server import handler, RestHandler  # type: ignore
 
-from .config import AUTH_PREFIX, EXCLUDE_DBS
-
-REMOVE_ID = {"_id": False}
+from .coalesce import SingleFlight
+from .compression import BodyTooLargeError, decompress_body
+from .config import AUTH_PREFIX
+from .metrics import Gauges, Metrics
+from .notifications import ChangeNotifier, matches
+from .storage import MadDashMotorClient, StorageBackend  # noqa: F401
 
 EXCLUDE_KEYS = ["_id", "history"]
 
@@ -25,115 +37,80 @@ EXCLUDE_KEYS = ["_id", "history"]
 # -----------------------------------------------------------------------------
 
 
-class MadDashMotorClient:
-    """MotorClient with additional guardrails for Mad-Dash things."""
-
-    def __init__(self, motor_client: MotorClient) -> None:
-        """Init."""
-        self.motor_client = motor_client
-
-    async def get_database_names(self) -> List[str]:
-        """Return all databases' names."""
-        database_names = [
-            n
-            for n in await self.motor_client.list_database_names()
-            if n not in EXCLUDE_DBS
-        ]
-        return database_names
-
-    def get_database(self, database_name: str) -> MotorDatabase:
-        """Return database instance."""
-        try:
-            return self.motor_client[database_name]
-        except (KeyError, TypeError):
-            raise tornado.web.HTTPError(
-                400, reason=f"database not found ({database_name})"
-            )
-
-    async def get_collection_names(self, database_name: str) -> List[str]:
-        """Return collection names in database."""
-        database = self.get_database(database_name)
-        collection_names = [
-            n for n in await database.list_collection_names() if n != "system.indexes"
-        ]
-
-        return collection_names
-
-    def get_collection(
-        self, database_name: str, collection_name: str
-    ) -> MotorCollection:
-        """Return collection instance."""
-        database = self.get_database(database_name)
-        try:
-            return database[collection_name]
-        except KeyError:
-            raise tornado.web.HTTPError(
-                400, reason=f"collection not found ({collection_name})"
-            )
+class BaseMadDashHandler(RestHandler):  # type: ignore  # pylint: disable=W0223
+    """BaseMadDashHandler is a RestHandler for all Mad-Dash routes."""
 
-    async def ensure_collection_indexes(
-        self, database_name: str, collection_name: str
+    def initialize(  # pylint: disable=W0221
+        self,
+        storage: StorageBackend,
+        notifier: ChangeNotifier,
+        metrics: Metrics,
+        single_flight: SingleFlight,
+        max_body_size: int,
+        *args: Any,
+        **kwargs: Any,
     ) -> None:
-        """Create indexes in collection."""
-        collection = self.get_collection(database_name, collection_name)
-        await collection.create_index("name", name="name_index", unique=True)
-        async for index in collection.list_indexes():
-            print(index)
-
-    async def ensure_all_databases_indexes(self) -> None:
-        """Create all indexes in all databases."""
-        for database_name in await self.get_database_names():
-            for collection_name in await self.get_collection_names(database_name):
-                await self.ensure_collection_indexes(database_name, collection_name)
-
-    async def get_create_collection(
-        self, database_name: str, collection_name: str
-    ) -> MotorCollection:
-        """Return collection instance, if it doesn't exist, create it."""
-        database = self.get_database(database_name)
-        try:
-            collection = database[collection_name]
-        except KeyError:
-            database.create_collection(collection_name)
-            await self.ensure_collection_indexes(database_name, collection_name)
+        """Initialize a BaseMadDashHandler object."""
+        super(BaseMadDashHandler, self).initialize(*args, **kwargs)
+        self.storage = storage  # pylint: disable=W0201
+        self.notifier = notifier  # pylint: disable=W0201
+        self.metrics = metrics  # pylint: disable=W0201
+        self.single_flight = single_flight  # pylint: disable=W0201
+        self.max_body_size = max_body_size  # pylint: disable=W0201
+        self.json_body = None  # type: Any  # pylint: disable=W0201
+
+    def on_finish(self) -> None:
+        """Record the request's metrics."""
+        super(BaseMadDashHandler, self).on_finish()
+        self.metrics.observe_request(
+            self.request.path,
+            str(self.request.method),
+            self.get_status(),
+            self.request.request_time(),
+            len(self.request.body or b""),
+            int(self._headers.get("Content-Length", 0)),
+        )
 
-        return collection
+    async def write_coalesced(
+        self, key: Tuple[Any, ...], func: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> None:
+        """Write `func()`'s response as JSON.
 
-    async def get_mongo_histograms_in_collection(
-        self, database_name: str, collection_name: str
-    ) -> List[MongoHistogram]:
-        """Return collection's histograms as dicts."""
-        collection = self.get_collection(database_name, collection_name)
+        Concurrent requests to the same route with the same `key` (the
+        parsed arguments) share one call of `func` and one JSON encoding.
+        """
 
-        mongo_histos = [
-            o
-            async for o in collection.find(projection=REMOVE_ID)
-            if o["name"] != "filelist"
-        ]
+        async def encode() -> str:
+            return json_encode(await func())
 
-        # type check
-        try:
-            for histo in mongo_histos:
-                _ = I3Histogram.from_dict(histo)
-        except (NameError, AttributeError, TypeError) as e:
-            raise tornado.web.HTTPError(500, reason=str(e))
+        response, coalesced = await self.single_flight.do(
+            (self.request.path,) + key, encode
+        )
 
-        return mongo_histos
+        labels = (("route", self.request.path),)
+        self.metrics.inc("maddash_singleflight_calls_total", labels)
+        if coalesced:
+            self.metrics.inc("maddash_singleflight_coalesced_total", labels)
 
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write(response)
 
-# -----------------------------------------------------------------------------
+    def notify_write(
+        self, database_name: str, collection_name: str, name: str, version: int
+    ) -> None:
+        """Publish a write's change event, and stop sharing queries it made stale.
 
+        A GET that would join a query started before the write could get
+        pre-write data, so those queries are forgotten.
+        """
+        written = (database_name, collection_name, name)
 
-class BaseMadDashHandler(RestHandler):  # type: ignore  # pylint: disable=W0223
-    """BaseMadDashHandler is a RestHandler for all Mad-Dash routes."""
+        def is_stale(key: Hashable) -> bool:
+            # keys are (route, *args); queries whose args prefix `written` are stale
+            return isinstance(key, tuple) and key[1:] == written[: len(key) - 1]
 
-    def initialize(  # pylint: disable=W0221
-        self, motor_client: MotorClient, *args: Any, **kwargs: Any
-    ) -> None:
-        """Initialize a BaseMadDashHandler object."""
-        super(BaseMadDashHandler, self).initialize(*args, **kwargs)
-        # self.motor_client = motor_client  # pylint: disable=W0201
-        self.md_mc = MadDashMotorClient(motor_client)  # pylint: disable=W0201
+        self.single_flight.forget(is_stale)
+        self.notifier.notify_write(database_name, collection_name, name, version)
 
     def get_optional_argument(self, name: str, default: Any = None) -> Any:
         """Return argument, or default value if not present."""
@@ -142,11 +119,31 @@ class BaseMadDashHandler(RestHandler):  # type: ignore  # pylint: disable=W0223
         except tornado.web.HTTPError:
             return default
 
+    def get_json_body(self) -> Any:
+        """Return the decoded JSON body, decompressing it if it's gzipped.
+
+        The body is decoded once per request. Raise 413 if it decompresses
+        to more than `max_body_size` bytes, or 400 if it can't be decoded.
+        """
+        if self.json_body is None:
+            try:
+                body = decompress_body(
+                    self.request.body,
+                    self.request.headers.get("Content-Encoding", ""),
+                    self.max_body_size,
+                )
+            except BodyTooLargeError as e:
+                raise tornado.web.HTTPError(413, reason=str(e))
+            except ValueError as e:
+                raise tornado.web.HTTPError(400, reason=str(e))
+            self.json_body = json_decode(body)
+        return self.json_body
+
     def get_required_argument(self, name: str) -> Any:
         """Return argument, raise 400 if not present."""
         if self.request.body:
             try:
-                return json_decode(self.request.body)[name]
+                return self.get_json_body()[name]
             except KeyError:
                 pass
         try:
@@ -171,15 +168,56 @@ class MainHandler(BaseMadDashHandler):  # pylint: disable=W0223
 # -----------------------------------------------------------------------------
 
 
+class MetricsHandler(BaseMadDashHandler):  # pylint: disable=W0223
+    """Handle exposing the server's metrics in the Prometheus text format."""
+
+    @handler.scope_role_auth(prefix=AUTH_PREFIX, roles=["production", "web"])  # type: ignore
+    async def get(self) -> None:
+        """Handle GET."""
+        await self.write_metrics()
+
+    async def write_metrics(self) -> None:
+        """Write the metrics, with the (cached) collection-size gauges."""
+
+        async def read_collection_sizes() -> Gauges:
+            gauges: Gauges = {}
+            for (database_name, collection_name), sizes in (
+                await self.storage.get_collection_sizes()
+            ).items():
+                labels = (("database", database_name), ("collection", collection_name))
+                gauges[("maddash_collection_documents", labels)] = sizes["documents"]
+                gauges[("maddash_collection_bytes", labels)] = sizes["bytes"]
+            return gauges
+
+        gauges = await self.metrics.collection_sizes.get(read_collection_sizes)
+
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(self.metrics.render(gauges))
+
+
+class PublicMetricsHandler(MetricsHandler):  # pylint: disable=W0223
+    """Handle exposing the server's metrics, without authentication."""
+
+    async def get(self) -> None:
+        """Handle GET."""
+        await self.write_metrics()
+
+
+# -----------------------------------------------------------------------------
+
+
 class DatabasesNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
     """Handle querying list of databases in mongodb client."""
 
     @handler.scope_role_auth(prefix=AUTH_PREFIX, roles=["production", "web"])  # type: ignore
     async def get(self) -> None:
         """Handle GET."""
-        database_names = await self.md_mc.get_database_names()
 
-        self.write({"databases": database_names})
+        async def query() -> Dict[str, Any]:
+            database_names = await self.storage.get_database_names()
+            return {"databases": database_names}
+
+        await self.write_coalesced((), query)
 
 
 # -----------------------------------------------------------------------------
@@ -193,9 +231,11 @@ class CollectionsNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
         """Handle GET."""
         database_name = self.get_required_argument("database")
 
-        collection_names = await self.md_mc.get_collection_names(database_name)
+        async def query() -> Dict[str, Any]:
+            collection_names = await self.storage.get_collection_names(database_name)
+            return {"database": database_name, "collections": collection_names}
 
-        self.write({"database": database_name, "collections": collection_names})
+        await self.write_coalesced((database_name,), query)
 
 
 # -----------------------------------------------------------------------------
@@ -210,18 +250,18 @@ class CollectionsHistogramsNamesHandler(BaseMadDashHandler):  # pylint: disable=
         database_name = self.get_required_argument("database")
         collection_name = self.get_required_argument("collection")
 
-        mongo_histos = await self.md_mc.get_mongo_histograms_in_collection(
-            database_name, collection_name
-        )
-        histogram_names = [c["name"] for c in mongo_histos]
-
-        self.write(
-            {
+        async def query() -> Dict[str, Any]:
+            mongo_histos = await self.storage.get_mongo_histograms_in_collection(
+                database_name, collection_name
+            )
+            histogram_names = [c["name"] for c in mongo_histos]
+            return {
                 "database": database_name,
                 "collection": collection_name,
                 "histograms": histogram_names,
             }
-        )
+
+        await self.write_coalesced((database_name, collection_name), query)
 
 
 # -----------------------------------------------------------------------------
@@ -236,17 +276,17 @@ class CollectionsHistogramsHandler(BaseMadDashHandler):  # pylint: disable=W0223
         database_name = self.get_required_argument("database")
         collection_name = self.get_required_argument("collection")
 
-        mongo_histo = await self.md_mc.get_mongo_histograms_in_collection(
-            database_name, collection_name
-        )
-
-        self.write(
-            {
+        async def query() -> Dict[str, Any]:
+            mongo_histo = await self.storage.get_mongo_histograms_in_collection(
+                database_name, collection_name
+            )
+            return {
                 "database": database_name,
                 "collection": collection_name,
                 "histograms": mongo_histo,
             }
-        )
+
+        await self.write_coalesced((database_name, collection_name), query)
 
 
 # -----------------------------------------------------------------------------
@@ -260,26 +300,20 @@ class HistogramHandler(BaseMadDashHandler):  # pylint: disable=W0223
         database_name: str,
         collection_name: str,
         histogram_name: str,
-        remove_id: bool = True,
     ) -> Optional[I3Histogram]:
         """Return I3Histogram object.
 
         Also type-checks the required I3Histogram attributes.
         """
-        collection = self.md_mc.get_collection(database_name, collection_name)
-
-        if remove_id:
-            mongo_histogram = await collection.find_one(
-                {"name": histogram_name}, projection=REMOVE_ID
-            )
-        else:
-            mongo_histogram = await collection.find_one({"name": histogram_name})
+        mongo_histogram = await self.storage.find_one(
+            database_name, collection_name, histogram_name
+        )
 
         if not mongo_histogram:
             return None
 
         try:
-            histogram = I3Histogram.from_dict(mongo_histogram)
+            histogram = I3Histogram.from_dict(mongo_histogram)  # type: ignore
         except (NameError, AttributeError, TypeError) as e:
             raise tornado.web.HTTPError(500, reason=str(e))
 
@@ -292,21 +326,23 @@ class HistogramHandler(BaseMadDashHandler):  # pylint: disable=W0223
         collection_name = self.get_required_argument("collection")
         histogram_name = self.get_required_argument("name")
 
-        histogram = await self.get_i3histogram(
-            database_name, collection_name, histogram_name
-        )
-        if not histogram:
-            raise tornado.web.HTTPError(
-                400, reason=f"histogram not found ({histogram_name})"
+        async def query() -> Dict[str, Any]:
+            histogram = await self.get_i3histogram(
+                database_name, collection_name, histogram_name
             )
-
-        self.write(
-            {
+            if not histogram:
+                raise tornado.web.HTTPError(
+                    400, reason=f"histogram not found ({histogram_name})"
+                )
+            return {
                 "database": database_name,
                 "collection": collection_name,
                 "histogram": histogram.to_dict(exclude=EXCLUDE_KEYS),
                 "history": histogram.history,
             }
+
+        await self.write_coalesced(
+            (database_name, collection_name, histogram_name), query
         )
 
     async def update_histogram(
@@ -317,7 +353,7 @@ class HistogramHandler(BaseMadDashHandler):  # pylint: disable=W0223
         Write back to output buffer.
         """
         i3histo = await self.get_i3histogram(
-            database_name, collection_name, histogram.name, remove_id=False
+            database_name, collection_name, histogram.name
         )
         if not i3histo:  # here to appease mypy
             raise Exception(
@@ -327,10 +363,12 @@ class HistogramHandler(BaseMadDashHandler):  # pylint: disable=W0223
         i3histo.update(histogram)
 
         # put in DB
-        collection = self.md_mc.get_collection(database_name, collection_name)
-        mongo_histo = i3histo.to_dict()
-        _id = mongo_histo["_id"]  # type: ignore  # https://github.com/python/mypy/issues/4617
-        result = await collection.replace_one({"_id": _id}, mongo_histo)
+        acknowledged = await self.storage.upsert(
+            database_name, collection_name, [i3histo.to_dict()]  # type: ignore
+        )
+        self.notify_write(
+            database_name, collection_name, i3histo.name, len(i3histo.history)
+        )
 
         # write
         self.write(
@@ -339,7 +377,7 @@ class HistogramHandler(BaseMadDashHandler):  # pylint: disable=W0223
                 "collection": collection_name,
                 "histogram": i3histo.to_dict(exclude=EXCLUDE_KEYS),
                 "history": i3histo.history,
-                "updated": result.acknowledged,
+                "updated": acknowledged,
             }
         )
 
@@ -352,11 +390,17 @@ class HistogramHandler(BaseMadDashHandler):  # pylint: disable=W0223
         """
         histogram.add_to_history()  # record when this happened
 
-        # put in DB
-        collection = await self.md_mc.get_create_collection(
-            database_name, collection_name
+        # put in DB -- unless another request inserted it since it was looked up
+        inserted = await self.storage.insert(
+            database_name, collection_name, histogram.to_dict()  # type: ignore
+        )
+        if not inserted:
+            raise tornado.web.HTTPError(
+                409, reason=f"histogram already in collection ({histogram.name})"
+            )
+        self.notify_write(
+            database_name, collection_name, histogram.name, len(histogram.history)
         )
-        await collection.insert_one(histogram.to_dict())
 
         # write
         self.write(
@@ -411,28 +455,91 @@ class HistogramHandler(BaseMadDashHandler):  # pylint: disable=W0223
 # -----------------------------------------------------------------------------
 
 
+class HistogramDeltaHandler(BaseMadDashHandler):  # pylint: disable=W0223
+    """Handle incrementing an existing histogram by a sparse delta."""
+
+    COUNTERS = ["overflow", "underflow", "nan_count"]
+
+    @handler.scope_role_auth(prefix=AUTH_PREFIX, roles=["production"])  # type: ignore
+    async def post(self) -> None:
+        """Handle POST.
+
+        Add `values[i]` to bin `indices[i]`, and each of the (optional)
+        overflow, underflow, and nan_count to the histogram's, atomically.
+        """
+        database_name = self.get_required_argument("database")
+        collection_name = self.get_required_argument("collection")
+        histogram_name = self.get_required_argument("name")
+        indices = self.get_required_argument("indices")
+        values = self.get_required_argument("values")
+        counters = {c: self.get_optional_argument(c, default=0) for c in self.COUNTERS}
+
+        # check type and structure
+        try:
+            check_type(indices, list, int)
+            check_type(values, list, get_args(Num))
+            for value in counters.values():
+                check_type(value, int)
+        except TypeError as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+        if len(indices) != len(values):
+            raise tornado.web.HTTPError(
+                400, reason="'indices' and 'values' must be the same length"
+            )
+        if len(set(indices)) != len(indices) or any(i < 0 for i in indices):
+            raise tornado.web.HTTPError(
+                400, reason="'indices' must be unique and non-negative"
+            )
+
+        # increment
+        history_length = await self.storage.increment_histogram(
+            database_name,
+            collection_name,
+            histogram_name,
+            dict(zip(indices, values)),
+            {c: v for c, v in counters.items() if v},
+            time.time(),
+        )
+        if history_length is None:
+            raise tornado.web.HTTPError(
+                400,
+                reason=f"histogram not found, or bins out of range ({histogram_name})",
+            )
+        self.notify_write(
+            database_name, collection_name, histogram_name, history_length
+        )
+
+        # write
+        self.write(
+            {
+                "database": database_name,
+                "collection": collection_name,
+                "name": histogram_name,
+                "history_length": history_length,
+                "updated": True,
+            }
+        )
+
+
+# -----------------------------------------------------------------------------
+
+
 class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
     """Handle querying list of filenames for given collection."""
 
     async def get_filelist_attributes(
-        self, database_name: str, collection_name: str, remove_id: bool = True
-    ) -> Tuple[Any, List[str], List[Num]]:
-        """Return filelist-dict's `id, filenames, history` in collection.
+        self, database_name: str, collection_name: str
+    ) -> Tuple[bool, List[str], List[Num]]:
+        """Return filelist-dict's `exists, filenames, history` in collection.
 
-        Return `None` for id, if the `collection_name` is not in the DB.
+        Return `False` for exists, if the filelist is not in the DB.
         Return [] for filenames and/or history, if they're not in the
         collection.
         """
-        collection = self.md_mc.get_collection(database_name, collection_name)
-
-        if remove_id:
-            dict_ = await collection.find_one(
-                {"name": "filelist"}, projection=REMOVE_ID
-            )
-        dict_ = await collection.find_one({"name": "filelist"})
+        dict_ = await self.storage.get_filelist(database_name, collection_name)
 
         if not dict_:
-            return None, [], []
+            return False, [], []
 
         history = []  # type: List[Union[int,float]]
         if "history" in dict_:  # old collections may not have a history defined
@@ -445,7 +552,7 @@ class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
         check_type(history, list, get_args(Num))
         check_type(files, list, str)
 
-        return dict_["_id"], files, history
+        return True, files, history
 
     @handler.scope_role_auth(prefix=AUTH_PREFIX, roles=["production", "web"])  # type: ignore
     async def get(self) -> None:
@@ -453,18 +560,18 @@ class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
         database_name = self.get_required_argument("database")
         collection_name = self.get_required_argument("collection")
 
-        _, filenames, history = await self.get_filelist_attributes(
-            database_name, collection_name
-        )
-
-        self.write(
-            {
+        async def query() -> Dict[str, Any]:
+            _, filenames, history = await self.get_filelist_attributes(
+                database_name, collection_name
+            )
+            return {
                 "database": database_name,
                 "collection": collection_name,
                 "files": filenames,
                 "history": history,
             }
-        )
+
+        await self.write_coalesced((database_name, collection_name), query)
 
     async def update_filelist(
         self, database_name: str, collection_name: str, new_filenames: List[str]
@@ -473,8 +580,8 @@ class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
 
         Write back to output buffer.
         """
-        _id, prev_filenames, history = await self.get_filelist_attributes(
-            database_name, collection_name, remove_id=False
+        _, prev_filenames, history = await self.get_filelist_attributes(
+            database_name, collection_name
         )
 
         filenames = sorted(set(new_filenames) | set(prev_filenames))
@@ -484,9 +591,10 @@ class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
         history.append(time.time())
 
         # put in DB
-        collection = self.md_mc.get_collection(database_name, collection_name)
-        dict_ = {"name": "filelist", "files": filenames, "history": history}
-        result = await collection.replace_one({"_id": _id}, dict_)
+        acknowledged = await self.storage.put_filelist(
+            database_name, collection_name, filenames, history
+        )
+        self.notify_write(database_name, collection_name, "filelist", len(history))
 
         # write
         self.write(
@@ -495,7 +603,7 @@ class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
                 "collection": collection_name,
                 "files": filenames,
                 "history": history,
-                "updated": result.acknowledged,
+                "updated": acknowledged,
             }
         )
 
@@ -506,15 +614,15 @@ class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
 
         Write back to output buffer.
         """
-        collection = await self.md_mc.get_create_collection(
-            database_name, collection_name
-        )
         history = [time.time()]
 
-        # put in DB
-        await collection.insert_one(
-            {"name": "filelist", "files": filenames, "history": history}
-        )
+        # put in DB -- unless another request inserted it since it was looked up
+        dict_ = {"name": "filelist", "files": filenames, "history": history}
+        if not await self.storage.insert(database_name, collection_name, dict_):
+            raise tornado.web.HTTPError(
+                409, reason=f"files already in collection, {collection_name}"
+            )
+        self.notify_write(database_name, collection_name, "filelist", len(history))
 
         # write
         self.write(
@@ -543,10 +651,10 @@ class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
 
         # is the filelist already in the collection?
         async def filelist_exists() -> bool:
-            id_, _, _ = await self.get_filelist_attributes(
+            exists, _, _ = await self.get_filelist_attributes(
                 database_name, collection_name
             )
-            return bool(id_)
+            return exists
 
         # update/insert
         if await filelist_exists():
@@ -560,3 +668,44 @@ class FileNamesHandler(BaseMadDashHandler):  # pylint: disable=W0223
 
 
 # -----------------------------------------------------------------------------
+
+
+class ChangeEventsHandler(BaseMadDashHandler):  # pylint: disable=W0223
+    """Handle streaming change notifications as Server-Sent Events.
+
+    Each event is `{database, collection, name, version}`, where `version`
+    is the length of the histogram's/filelist's history.
+    """
+
+    KEEPALIVE_SECONDS = 15
+
+    @handler.scope_role_auth(prefix=AUTH_PREFIX, roles=["production", "web"])  # type: ignore
+    async def get(self) -> None:
+        """Handle GET."""
+        database_name = self.get_optional_argument("database")
+        collection_name = self.get_optional_argument("collection")
+
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+
+        queue = self.notifier.subscribe()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), timeout=self.KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    self.write(": keepalive\n\n")
+                else:
+                    if not matches(event, database_name, collection_name):
+                        continue
+                    self.write(f"data: {json_encode(event)}\n\n")
+                await self.flush()
+        except tornado.iostream.StreamClosedError:
+            pass
+        finally:
+            self.notifier.unsubscribe(queue)
+
+
+# -----------------------------------------------------------------------------
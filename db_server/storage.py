@@ -0,0 +1,419 @@
+"""Storage backends for the Mad-Dash REST API server interface.
+
+A backend stores documents (dicts with a unique "name") in collections in
+databases. A collection's histograms are documents, and so is its
+filelist (named "filelist").
+"""
+
+import copy
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import tornado.web
+from motor.motor_tornado import (  # type: ignore
+    MotorClient,
+    MotorCollection,
+    MotorDatabase,
+)
+from pymongo import ReplaceOne, ReturnDocument  # type: ignore
+from pymongo.errors import DuplicateKeyError, InvalidName  # type: ignore
+
+# local imports
+from api import I3Histogram, MongoHistogram, Num
+
+from .config import EXCLUDE_DBS
+
+REMOVE_ID = {"_id": False}
+
+# types
+Document = Dict[str, Any]
+CollectionSizes = Dict[Tuple[str, str], Dict[str, int]]
+
+
+class StorageBackend:
+    """Interface for the server's backing store."""
+
+    async def get_database_names(self) -> List[str]:
+        """Return all databases' names."""
+        raise NotImplementedError()
+
+    async def get_collection_names(self, database_name: str) -> List[str]:
+        """Return collection names in database."""
+        raise NotImplementedError()
+
+    async def find_all(
+        self, database_name: str, collection_name: str
+    ) -> List[Document]:
+        """Return every document in the collection."""
+        raise NotImplementedError()
+
+    async def find_one(
+        self, database_name: str, collection_name: str, name: str
+    ) -> Optional[Document]:
+        """Return the document named `name`, or None if it doesn't exist."""
+        raise NotImplementedError()
+
+    async def upsert(
+        self, database_name: str, collection_name: str, documents: List[Document]
+    ) -> bool:
+        """Insert/replace (by name) the documents. Create the collection if needed.
+
+        Return whether the write was acknowledged.
+        """
+        raise NotImplementedError()
+
+    async def insert(
+        self, database_name: str, collection_name: str, document: Document
+    ) -> bool:
+        """Insert the document, unless one with its name already exists.
+
+        Create the collection if needed. Return whether it was inserted.
+        """
+        raise NotImplementedError()
+
+    async def increment_histogram(  # pylint: disable=R0913
+        self,
+        database_name: str,
+        collection_name: str,
+        name: str,
+        bins: Dict[int, Num],
+        counters: Dict[str, int],
+        timestamp: float,
+    ) -> Optional[int]:
+        """Atomically add to the histogram's bins and counters, and its history.
+
+        `bins` maps bin index to increment; `counters` maps attribute
+        (overflow, underflow, nan_count) to increment. Return the new
+        history length, or None if there's no such histogram or a bin index
+        is out of range.
+        """
+        raise NotImplementedError()
+
+    async def ensure_all_databases_indexes(self) -> None:
+        """Create all indexes in all databases."""
+
+    async def get_collection_sizes(self) -> CollectionSizes:
+        """Return the document count and data size of every collection."""
+        raise NotImplementedError()
+
+    async def get_filelist(
+        self, database_name: str, collection_name: str
+    ) -> Optional[Document]:
+        """Return the collection's filelist document."""
+        return await self.find_one(database_name, collection_name, "filelist")
+
+    async def put_filelist(
+        self,
+        database_name: str,
+        collection_name: str,
+        files: List[str],
+        history: List[Num],
+    ) -> bool:
+        """Insert/replace the collection's filelist document."""
+        dict_ = {"name": "filelist", "files": files, "history": history}
+        return await self.upsert(database_name, collection_name, [dict_])
+
+    async def get_mongo_histograms_in_collection(
+        self, database_name: str, collection_name: str
+    ) -> List[MongoHistogram]:
+        """Return collection's histograms as dicts."""
+        mongo_histos = [
+            o
+            for o in await self.find_all(database_name, collection_name)
+            if o["name"] != "filelist"
+        ]
+
+        # type check
+        try:
+            for histo in mongo_histos:
+                _ = I3Histogram.from_dict(histo)  # type: ignore
+        except (NameError, AttributeError, TypeError) as e:
+            raise tornado.web.HTTPError(500, reason=str(e))
+
+        return mongo_histos  # type: ignore
+
+
+# -----------------------------------------------------------------------------
+
+
+class MadDashMotorClient(StorageBackend):
+    """MotorClient with additional guardrails for Mad-Dash things."""
+
+    def __init__(self, motor_client: MotorClient) -> None:
+        """Init."""
+        self.motor_client = motor_client
+        self.indexed: Set[Tuple[str, str]] = set()
+
+    async def get_database_names(self) -> List[str]:
+        """Return all databases' names."""
+        database_names = [
+            n
+            for n in await self.motor_client.list_database_names()
+            if n not in EXCLUDE_DBS
+        ]
+        return database_names
+
+    def get_database(self, database_name: str) -> MotorDatabase:
+        """Return database instance."""
+        try:
+            return self.motor_client[database_name]
+        except (KeyError, TypeError, InvalidName):
+            raise tornado.web.HTTPError(
+                400, reason=f"database not found ({database_name})"
+            )
+
+    async def get_collection_names(self, database_name: str) -> List[str]:
+        """Return collection names in database."""
+        database = self.get_database(database_name)
+        collection_names = [
+            n for n in await database.list_collection_names() if n != "system.indexes"
+        ]
+
+        return collection_names
+
+    def get_collection(
+        self, database_name: str, collection_name: str
+    ) -> MotorCollection:
+        """Return collection instance."""
+        database = self.get_database(database_name)
+        try:
+            return database[collection_name]
+        except (KeyError, TypeError, InvalidName):
+            raise tornado.web.HTTPError(
+                400, reason=f"collection not found ({collection_name})"
+            )
+
+    async def ensure_collection_indexes(
+        self, database_name: str, collection_name: str
+    ) -> None:
+        """Create indexes in collection."""
+        collection = self.get_collection(database_name, collection_name)
+        await collection.create_index("name", name="name_index", unique=True)
+        async for index in collection.list_indexes():
+            print(index)
+        self.indexed.add((database_name, collection_name))
+
+    async def ensure_all_databases_indexes(self) -> None:
+        """Create all indexes in all databases."""
+        for database_name in await self.get_database_names():
+            for collection_name in await self.get_collection_names(database_name):
+                await self.ensure_collection_indexes(database_name, collection_name)
+
+    async def get_collection_sizes(self) -> CollectionSizes:
+        """Return the document count and data size of every collection."""
+        sizes = {}
+        for database_name in await self.get_database_names():
+            database = self.get_database(database_name)
+            for collection_name in await self.get_collection_names(database_name):
+                stats = await database.command("collStats", collection_name)
+                sizes[(database_name, collection_name)] = {
+                    "documents": stats["count"],
+                    "bytes": stats["size"],
+                }
+        return sizes
+
+    async def find_all(
+        self, database_name: str, collection_name: str
+    ) -> List[Document]:
+        """Return every document in the collection."""
+        collection = self.get_collection(database_name, collection_name)
+        return [o async for o in collection.find(projection=REMOVE_ID)]
+
+    async def find_one(
+        self, database_name: str, collection_name: str, name: str
+    ) -> Optional[Document]:
+        """Return the document named `name`, or None if it doesn't exist."""
+        collection = self.get_collection(database_name, collection_name)
+        return await collection.find_one(  # type: ignore
+            {"name": name}, projection=REMOVE_ID
+        )
+
+    async def upsert(
+        self, database_name: str, collection_name: str, documents: List[Document]
+    ) -> bool:
+        """Insert/replace (by name) the documents. Create the collection if needed.
+
+        Return whether the write was acknowledged.
+        """
+        if (database_name, collection_name) not in self.indexed:
+            await self.ensure_collection_indexes(database_name, collection_name)
+
+        collection = self.get_collection(database_name, collection_name)
+        result = await collection.bulk_write(
+            [ReplaceOne({"name": d["name"]}, d, upsert=True) for d in documents]
+        )
+        return bool(result.acknowledged)
+
+    async def insert(
+        self, database_name: str, collection_name: str, document: Document
+    ) -> bool:
+        """Insert the document, unless one with its name already exists.
+
+        Create the collection if needed. Return whether it was inserted.
+        """
+        if (database_name, collection_name) not in self.indexed:
+            await self.ensure_collection_indexes(database_name, collection_name)
+
+        collection = self.get_collection(database_name, collection_name)
+        try:  # the unique name index rejects a duplicate, even a concurrent one
+            await collection.insert_one(dict(document))  # (it'd add an "_id")
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def increment_histogram(  # pylint: disable=R0913
+        self,
+        database_name: str,
+        collection_name: str,
+        name: str,
+        bins: Dict[int, Num],
+        counters: Dict[str, int],
+        timestamp: float,
+    ) -> Optional[int]:
+        """Atomically add to the histogram's bins and counters, and its history.
+
+        `bins` maps bin index to increment; `counters` maps attribute
+        (overflow, underflow, nan_count) to increment. Return the new
+        history length, or None if there's no such histogram or a bin index
+        is out of range.
+        """
+        query: Document = {"name": {"$eq": name, "$ne": "filelist"}}
+        if bins:  # the highest bin must exist, so $inc can't extend the array
+            query[f"bin_values.{max(bins)}"] = {"$exists": True}
+
+        increments = {f"bin_values.{i}": v for i, v in bins.items()}
+        increments.update(counters)
+        update: Document = {"$push": {"history": timestamp}}
+        if increments:
+            update["$inc"] = increments
+
+        collection = self.get_collection(database_name, collection_name)
+        result = await collection.find_one_and_update(
+            query,
+            update,
+            projection={"_id": False, "history": True},
+            return_document=ReturnDocument.AFTER,
+        )
+        return len(result["history"]) if result else None
+
+
+# -----------------------------------------------------------------------------
+
+
+class InMemoryStorage(StorageBackend):
+    """A process-local, non-persistent backend, for testing and benchmarking.
+
+    Documents are copied in and out, so callers can't mutate stored state.
+    """
+
+    def __init__(self) -> None:
+        self.databases: Dict[str, Dict[str, Dict[str, Document]]] = {}
+
+    def _get_collection(
+        self, database_name: str, collection_name: str
+    ) -> Dict[str, Document]:
+        return self.databases.get(database_name, {}).get(collection_name, {})
+
+    async def get_database_names(self) -> List[str]:
+        """Return all databases' names."""
+        return [n for n in self.databases if n not in EXCLUDE_DBS]
+
+    async def get_collection_names(self, database_name: str) -> List[str]:
+        """Return collection names in database."""
+        return list(self.databases.get(database_name, {}))
+
+    async def find_all(
+        self, database_name: str, collection_name: str
+    ) -> List[Document]:
+        """Return every document in the collection."""
+        collection = self._get_collection(database_name, collection_name)
+        return copy.deepcopy(list(collection.values()))
+
+    async def find_one(
+        self, database_name: str, collection_name: str, name: str
+    ) -> Optional[Document]:
+        """Return the document named `name`, or None if it doesn't exist."""
+        collection = self._get_collection(database_name, collection_name)
+        return copy.deepcopy(collection.get(name))
+
+    async def upsert(
+        self, database_name: str, collection_name: str, documents: List[Document]
+    ) -> bool:
+        """Insert/replace (by name) the documents. Create the collection if needed.
+
+        Return whether the write was acknowledged.
+        """
+        collection = self.databases.setdefault(database_name, {}).setdefault(
+            collection_name, {}
+        )
+        for document in documents:
+            collection[document["name"]] = copy.deepcopy(document)
+        return True
+
+    async def insert(
+        self, database_name: str, collection_name: str, document: Document
+    ) -> bool:
+        """Insert the document, unless one with its name already exists.
+
+        Create the collection if needed. Return whether it was inserted.
+        """
+        # there's no await, so nothing else can interleave
+        collection = self.databases.setdefault(database_name, {}).setdefault(
+            collection_name, {}
+        )
+        if document["name"] in collection:
+            return False
+        collection[document["name"]] = copy.deepcopy(document)
+        return True
+
+    async def increment_histogram(  # pylint: disable=R0913
+        self,
+        database_name: str,
+        collection_name: str,
+        name: str,
+        bins: Dict[int, Num],
+        counters: Dict[str, int],
+        timestamp: float,
+    ) -> Optional[int]:
+        """Atomically add to the histogram's bins and counters, and its history.
+
+        `bins` maps bin index to increment; `counters` maps attribute
+        (overflow, underflow, nan_count) to increment. Return the new
+        history length, or None if there's no such histogram or a bin index
+        is out of range.
+        """
+        # there's no await, so nothing else can interleave
+        histogram = self._get_collection(database_name, collection_name).get(name)
+        if not histogram or name == "filelist":
+            return None
+        if bins and max(bins) >= len(histogram["bin_values"]):
+            return None
+
+        for i, value in bins.items():
+            histogram["bin_values"][i] += value
+        for attr, value in counters.items():
+            histogram[attr] = histogram.get(attr, 0) + value
+        histogram.setdefault("history", []).append(timestamp)
+        return len(histogram["history"])
+
+    async def get_collection_sizes(self) -> CollectionSizes:
+        """Return the document count and data size of every collection."""
+        sizes = {}
+        for database_name, collections in self.databases.items():
+            for collection_name, collection in collections.items():
+                sizes[(database_name, collection_name)] = {
+                    "documents": len(collection),
+                    "bytes": sum(len(json.dumps(d)) for d in collection.values()),
+                }
+        return sizes
+
+
+def create_storage(
+    backend: str, mongodb_url: str, **motor_kwargs: Any
+) -> StorageBackend:
+    """Return the storage backend named by `backend` ("mongodb" or "memory")."""
+    if backend == "mongodb":
+        return MadDashMotorClient(MotorClient(mongodb_url, **motor_kwargs))
+    if backend == "memory":
+        return InMemoryStorage()
+    raise ValueError(f"unknown storage backend ({backend})")
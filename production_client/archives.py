@@ -0,0 +1,101 @@
+"""Read pickles straight out of tar/zip archives, without extracting them.
+
+A pickle in an archive is addressed like a file in a directory:
+`/data/run.tar.gz/job_1/Collection.pkl` is the member `job_1/Collection.pkl`
+of the archive `/data/run.tar.gz`.
+"""
+
+import os
+import tarfile
+import zipfile
+from typing import Iterator, Optional, Tuple
+
+EXTENSIONS = [".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip"]
+
+
+def is_archive(path: str) -> bool:
+    """Return whether the path is (named like) an archive."""
+    return path.endswith(tuple(EXTENSIONS))
+
+
+def split_member(path: str) -> Optional[Tuple[str, str]]:
+    """Return the archive and member name of a path inside an archive, else None."""
+    parts = path.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if is_archive(part):
+            archive = "/".join(parts[: i + 1])
+            if os.path.isfile(archive):
+                return archive, "/".join(parts[i + 1 :])
+    return None
+
+
+def source_path(path: str) -> str:
+    """Return the path of the file on disk: the archive, for a member."""
+    split = split_member(path)
+    return split[0] if split else path
+
+
+def list_members(archive: str) -> Iterator[str]:
+    """Generate the name of each file in the archive, in the archive's order."""
+    if archive.endswith(".zip"):
+        with zipfile.ZipFile(archive) as zf:
+            for zip_info in zf.infolist():
+                if not zip_info.is_dir():
+                    yield zip_info.filename
+    else:
+        with tarfile.open(archive, "r|*") as tar:
+            for tar_info in tar:
+                if tar_info.isfile():
+                    yield tar_info.name
+
+
+class ArchiveReader:
+    """Read members out of archives, keeping the current archive open.
+
+    A compressed tar can only be read front to back, so reading its
+    members in order (like `list_members()` generates them) decompresses
+    it once. Reading a member that was already passed starts over.
+    """
+
+    def __init__(self) -> None:
+        self.archive = ""
+        self.tar = None  # type: Optional[tarfile.TarFile]
+        self.zip = None  # type: Optional[zipfile.ZipFile]
+
+    def close(self) -> None:
+        """Close the current archive."""
+        if self.tar:
+            self.tar.close()
+        if self.zip:
+            self.zip.close()
+        self.archive, self.tar, self.zip = "", None, None
+
+    def _open(self, archive: str) -> None:
+        self.close()
+        if archive.endswith(".zip"):
+            self.zip = zipfile.ZipFile(archive)
+        else:
+            self.tar = tarfile.open(archive, "r|*")
+        self.archive = archive
+
+    def read(self, path: str) -> bytes:
+        """Return the contents of the archive member at `path`."""
+        split = split_member(path)
+        if not split:
+            raise FileNotFoundError(f"{path} is not in an archive.")
+        archive, member = split
+
+        if archive != self.archive:
+            self._open(archive)
+        if self.zip:
+            return self.zip.read(member)
+
+        for _ in range(2):  # from here, then from the start
+            while self.tar:
+                info = self.tar.next()
+                if not info:
+                    break
+                if info.name == member:
+                    return self.tar.extractfile(info).read()  # type: ignore
+            self._open(archive)
+        raise FileNotFoundError(f"{member} is not in {archive}.")
@@ -0,0 +1,159 @@
+"""Instrumentation for profiling an ingest, with or without a server."""
+
+import logging
+import resource
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+# local imports
+import api
+import rest_client
+
+STAGES = ["discover", "load", "validate", "encode", "send"]
+
+
+class StageTimer:
+    """Seconds spent in each stage of an ingest, and the bytes processed.
+
+    The stages are pipelined, so their times overlap and needn't add up to
+    the elapsed time. "load" is how long the uploader waited for loaded
+    collections, so with `--workers` it excludes unpickling done ahead.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.time()
+        self.seconds: DefaultDict[str, float] = defaultdict(float)
+        self.calls: DefaultDict[str, int] = defaultdict(int)
+        self.input_bytes = 0
+        self.encoded_bytes = 0
+        self.histograms = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Add the time spent in the context to the stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def report(self, dry_run: bool = False) -> None:
+        """Log the per-stage breakdown, throughput, and peak memory."""
+        elapsed = time.time() - self.start
+        logging.info(
+            f"Benchmark{' (dry run)' if dry_run else ''}: {self.histograms}"
+            f" histograms in {elapsed:.2f} seconds"
+            f" ({self.histograms / elapsed:.2f} histograms/second)."
+        )
+        for name in STAGES:
+            logging.info(
+                f"  {name:>8}: {self.seconds[name]:8.3f}s"
+                f" ({self.calls[name]} calls,"
+                f" {100 * self.seconds[name] / elapsed:.1f}% of elapsed)"
+            )
+        mb_in, mb_out = self.input_bytes / 1e6, self.encoded_bytes / 1e6
+        logging.info(
+            f"  read {mb_in:.2f} MB ({mb_in / elapsed:.2f} MB/s),"
+            f" encoded {mb_out:.2f} MB ({mb_out / elapsed:.2f} MB/s)"
+        )
+        rss, children_rss = get_peak_rss()
+        logging.info(
+            f"  peak RSS: {rss / 1e6:.1f} MB"
+            f" (largest worker process: {children_rss / 1e6:.1f} MB)"
+        )
+
+
+def get_peak_rss() -> Tuple[int, int]:
+    """Return the peak RSS (bytes) of this process, and of its largest child."""
+    scale = 1 if sys.platform == "darwin" else 1024  # macOS reports bytes
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    )
+
+
+def timed_iter(items: Iterable[str], timer: StageTimer, stage: str) -> Iterator[str]:
+    """Generate each item, adding the time spent getting it to the stage."""
+    iterator = iter(items)
+    while True:
+        with timer.stage(stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+async def timed_load(
+    collections: AsyncIterable[Any], timer: StageTimer
+) -> AsyncIterator[Any]:
+    """Generate each loaded collection, timing the wait and counting its bytes."""
+    iterator = collections.__aiter__()
+    while True:
+        with timer.stage("load"):
+            try:
+                loaded = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        timer.input_bytes += sum(pkl.size for pkl in loaded.files)
+        yield loaded
+
+
+def validate(path: str, args: Dict[str, Any]) -> None:
+    """Check the request body like the server would, raising if it's invalid."""
+    if path == "/histogram":
+        api.I3Histogram.from_dict(args["histogram"])
+    elif path == "/files/names":
+        api.check_type(args["files"], list, str)
+
+
+class BenchmarkRestClient:
+    """A REST client that validates, encodes, and times each request.
+
+    Requests are then sent with `rc`, or, without one, dropped (a dry run).
+    With `rc`, "send" includes `rc`'s own encoding of the request. With
+    `compress`, "encode" includes gzipping (see `rest_client.encode_body()`).
+    """
+
+    def __init__(
+        self,
+        timer: StageTimer,
+        rc: Optional[rest_client.MadDashRestClient] = None,
+        compress: bool = False,
+    ) -> None:
+        self.timer = timer
+        self.rc = rc
+        self.compress = compress
+        self.stats = rc.stats if rc else rest_client.LatencyStats()
+
+    async def request(
+        self, method: str, path: str, args: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """Validate, encode, and send (or drop) the request."""
+        args = args if args else {}
+        with self.timer.stage("validate"):
+            validate(path, args)
+        with self.timer.stage("encode"):
+            data, _ = rest_client.encode_body(args, self.compress)
+            self.timer.encoded_bytes += len(data)
+        if path.startswith("/histogram"):
+            self.timer.histograms += 1
+
+        if not self.rc:
+            return {"dry_run": True}
+        with self.timer.stage("send"):
+            return await self.rc.request(method, path, args)
@@ -0,0 +1,196 @@
+"""A columnar, memory-mappable collection format -- no pickles involved.
+
+Unpickling a collection allocates a Python object per bin, and isn't safe
+for files from untrusted sources. A columnar collection is a JSON header
+followed by every histogram's bins in two contiguous columns (integer
+and floating-point bins), which are memory-mapped (`numpy.memmap`) when
+read. So, bins go from disk to the wire encoder as array views, without
+per-bin Python objects.
+
+Layout (all integers little-endian):
+    MAGIC (8 bytes)
+    header length, H (uint64)
+    header (H bytes of UTF-8 JSON):
+        {
+            "version": 1,
+            "digest": sha256 of the header (sans digest & offsets) and the bins,
+            "columns": {
+                "<i8" and/or "<f8" (the dtype): {
+                    "offset": where the column starts (64-byte aligned),
+                    "length": n bins,
+                },
+            },
+            "histograms": [
+                {"name", "xmin", "xmax", "overflow", "underflow", "nan_count",
+                 other attributes..., "column": its dtype,
+                 "offset": its first bin in the column, "length": n bins},
+                ...
+            ],
+            "filelist": list of files, or null
+        }
+    padding, column, padding, column
+
+Production jobs can write these directly with `write_columnar()`.
+"""
+
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+import numpy as np  # type: ignore
+
+EXTENSION = ".mdcol"
+MAGIC = b"MADCOL01"
+VERSION = 1
+ALIGNMENT = 64
+
+INT, FLOAT = "<i8", "<f8"
+
+_LENGTH = struct.Struct("<Q")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value)} is not JSON serializable")
+
+
+def write_columnar(
+    collection: Mapping[str, Any], path: str, digest: Optional[str] = None
+) -> None:
+    """Write the collection (histograms and filelist) to `path`.
+
+    Every histogram needs a 1-D, numeric `bin_values`, and JSON-able (or
+    numpy scalar) other attributes. `digest` defaults to a hash of the contents. The file is
+    written to a temporary file then renamed, so it's always complete.
+    """
+    histograms: List[Dict[str, Any]] = []
+    columns: Dict[str, List[np.ndarray]] = {INT: [], FLOAT: []}
+    lengths = {INT: 0, FLOAT: 0}
+    for name, histo in collection.items():
+        if name == "filelist":
+            continue
+        bins = np.asarray(histo["bin_values"])
+        if bins.ndim != 1 or bins.dtype.kind not in "iubf":
+            raise ValueError(f"Histogram ({name}) doesn't have 1-D numeric bins.")
+        column = FLOAT if bins.dtype.kind == "f" else INT
+        attrs = {k: v for k, v in histo.items() if k != "bin_values"}
+        histograms.append(
+            {**attrs, "column": column, "offset": lengths[column], "length": len(bins)}
+        )
+        columns[column].append(bins.astype(column))
+        lengths[column] += len(bins)
+    data = {c: np.concatenate(arrays) for c, arrays in columns.items() if arrays}
+
+    filelist = collection.get("filelist")
+    header: Dict[str, Any] = {
+        "version": VERSION,
+        "columns": {c: {"offset": 0, "length": len(a)} for c, a in data.items()},
+        "histograms": histograms,
+        "filelist": filelist["files"] if filelist else None,
+    }
+    if digest is None:
+        sha = hashlib.sha256(
+            json.dumps(header, sort_keys=True, default=_to_json).encode()
+        )
+        for array in data.values():
+            sha.update(array.tobytes())
+        digest = sha.hexdigest()
+    header["digest"] = digest
+
+    # the columns' offsets depend on the header's length, which includes them
+    while True:
+        encoded = json.dumps(header, default=_to_json).encode()
+        end = len(MAGIC) + _LENGTH.size + len(encoded)
+        offsets = {}
+        for column, array in data.items():
+            offsets[column] = _align(end)
+            end = offsets[column] + array.nbytes
+        if all(header["columns"][c]["offset"] == o for c, o in offsets.items()):
+            break
+        for column, offset in offsets.items():
+            header["columns"][column]["offset"] = offset
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(_LENGTH.pack(len(encoded)))
+        f.write(encoded)
+        for column, array in data.items():
+            f.write(b"\0" * (offsets[column] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp, path)
+
+
+class ColumnarCollection(Mapping[str, Any]):
+    """A read-only collection backed by a memory-mapped columnar file.
+
+    Each histogram's `bin_values` is a read-only view into its mapped
+    column. Pickling only keeps the path and header; the columns are
+    re-mapped after.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a columnar collection.")
+            (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+            self.header = json.loads(f.read(length))
+        if self.header["version"] != VERSION:
+            raise ValueError(
+                f"{path} is version {self.header['version']}, not {VERSION}."
+            )
+        self.digest: str = self.header["digest"]
+        self.index = {h["name"]: h for h in self.header["histograms"]}
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def get_column(self, column: str) -> np.ndarray:
+        """Return the column's bins (memory-mapped, read-only)."""
+        if column not in self._columns:
+            dtype = np.dtype(column)
+            meta = self.header["columns"][column]
+            if meta["length"]:
+                end = meta["offset"] + meta["length"] * dtype.itemsize
+                if os.path.getsize(self.path) < end:
+                    raise ValueError(f"{self.path} is truncated.")
+                self._columns[column] = np.memmap(
+                    self.path,
+                    dtype=dtype,
+                    mode="r",
+                    offset=meta["offset"],
+                    shape=(meta["length"],),
+                )
+            else:
+                self._columns[column] = np.empty(0, dtype)
+        return self._columns[column]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {**self.__dict__, "_columns": {}}
+
+    def __getitem__(self, name: str) -> Any:
+        if name == "filelist":
+            if self.header["filelist"] is None:
+                raise KeyError(name)
+            return {"files": self.header["filelist"]}
+        meta = self.index[name]
+        histo = {
+            k: v for k, v in meta.items() if k not in ["column", "offset", "length"]
+        }
+        column = self.get_column(meta["column"])
+        histo["bin_values"] = column[meta["offset"] : meta["offset"] + meta["length"]]
+        return histo
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.index
+        if self.header["filelist"] is not None:
+            yield "filelist"
+
+    def __len__(self) -> int:
+        return len(self.index) + int(self.header["filelist"] is not None)
@@ -0,0 +1,119 @@
+"""Convert production histogram pickles to formats that are cheaper to ingest.
+
+- shard: one pickle per histogram, for memory-bounded ingest
+- columnar: a JSON header and memory-mapped bins, no pickles involved
+"""
+
+import argparse
+import logging
+import os
+import sys
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+# local imports
+# try import relative
+try:
+    import api  # noqa: F401  # pylint: disable=W0611
+except ModuleNotFoundError:
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    parent_dir_path = os.path.abspath(os.path.join(dir_path, os.pardir))
+    sys.path.insert(0, parent_dir_path)
+
+from production_client import archives, columnar, shards  # isort:skip  # noqa: E402
+from production_client.ingest_pickled_collections import (  # isort:skip  # noqa: E402
+    get_all_pickles,
+    load_collection,
+)
+
+# types
+Format = Tuple[str, Callable[..., None], Callable[[str], Mapping[str, Any]]]
+
+# format: (extension, writer, reader)
+FORMATS: Dict[str, Format] = {
+    "shard": (shards.EXTENSION, shards.write_shard, shards.ShardCollection),
+    "columnar": (
+        columnar.EXTENSION,
+        columnar.write_columnar,
+        columnar.ColumnarCollection,
+    ),
+}
+
+
+def convert(pkl: str, format_: str, out_dir: Optional[str] = None) -> str:
+    """Convert the pickle (to `out_dir`, or beside it), and return the new path.
+
+    The converted collection keeps the pickle's content hash, so a manifest
+    treats them as the same collection.
+    """
+    extension, write, read = FORMATS[format_]
+    loaded = load_collection(pkl, compact=True)
+    filename = f"{loaded.name}{extension}"
+    path = os.path.join(out_dir if out_dir else os.path.dirname(pkl), filename)
+    write(loaded.collection, path, loaded.digest)
+
+    converted = read(path)  # check that it reads back
+    if sorted(converted) != sorted(loaded.collection):
+        raise RuntimeError(f"{path} doesn't match {pkl}.")
+    logging.info(f"Converted {pkl} to {path} ({len(converted)} items).")
+    return path
+
+
+def main() -> None:
+    """Do main."""
+    parser = argparse.ArgumentParser(
+        description="Convert pickled collections to shards or columnar collections,"
+        " which are ingested one histogram at a time. Ingest either the pickles or"
+        " the converted collections, not both."
+    )
+    parser.add_argument(
+        "paths", metavar="PATHS", nargs="+", help="path(s) to grab pickles."
+    )
+    parser.add_argument(
+        "-r",
+        dest="recurse_paths",
+        default=False,
+        action="store_true",
+        help="recursively search for pickle files.",
+    )
+    parser.add_argument(
+        "--include",
+        metavar="GLOB",
+        action="append",
+        help="only convert pickles whose filename matches GLOB (repeatable).",
+    )
+    parser.add_argument(
+        "--format",
+        dest="format_",
+        choices=list(FORMATS),
+        default="shard",
+        help="format to convert to.",
+    )
+    parser.add_argument(
+        "--out-dir",
+        dest="out_dir",
+        metavar="DIR",
+        help="directory to write to (default: beside each pickle).",
+    )
+    parser.add_argument(
+        "--delete",
+        default=False,
+        action="store_true",
+        help="delete each pickle once it's converted.",
+    )
+    parser.add_argument("-l", "--log", default="INFO", help="the output logging level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log.upper()))
+
+    pickles = get_all_pickles(args.paths, args.recurse_paths, args.include)
+    for pkl in pickles:
+        if not pkl.endswith(".pkl") or archives.split_member(pkl):
+            continue  # already converted, or in an archive
+        convert(pkl, args.format_, args.out_dir)
+        if args.delete:
+            os.remove(pkl)
+            logging.info(f"Deleted {pkl}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,40 @@
 
 import argparse
 import asyncio
+import fnmatch
+import hashlib
 import logging
 import os
 import pickle
 import re
+import signal
 import sys
-from typing import Iterator, List, Optional, Tuple
-from urllib.parse import urljoin
+import time
+from itertools import islice
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
-import requests
+import numpy as np  # type: ignore
 
 # local imports
-from rest_tools.client import RestClient  # type: ignore
-
 # try import relative
 try:
     import api
@@ -24,9 +45,35 @@ except ModuleNotFoundError:
     sys.path.insert(0, parent_dir_path)
     import api
 
+import rest_client  # isort:skip  # noqa: E402
+from production_client import archives  # isort:skip  # noqa: E402
+from production_client import benchmark  # isort:skip  # noqa: E402
+from production_client.manifest import (  # isort:skip  # noqa: E402
+    COUNTERS,
+    HistogramState,
+    Manifest,
+)
+from production_client.columnar import (  # isort:skip  # noqa: E402
+    ColumnarCollection,
+    EXTENSION as COLUMNAR_EXTENSION,
+)
+from production_client.routing import (  # isort:skip  # noqa: E402
+    load_routes,
+    parse_route,
+    Router,
+)
+from production_client import validation  # isort:skip  # noqa: E402
+from production_client.shards import (  # isort:skip  # noqa: E402
+    EXTENSION as SHARD_EXTENSION,
+    ShardCollection,
+)
+from production_client.watch import PickleWatcher  # isort:skip  # noqa: E402
+
+EXTENSIONS = [".pkl", SHARD_EXTENSION, COLUMNAR_EXTENSION]
+
 
 async def post_filelist(
-    rc: RestClient,
+    rc: rest_client.MadDashRestClient,
     filelist: api.FilelistList,
     collection_name: str,
     database_name: str,
@@ -59,7 +106,7 @@ def get_filelist(
 
 
 async def post_histogram(
-    rc: RestClient,
+    rc: rest_client.MadDashRestClient,
     histo: api.MongoHistogram,
     collection_name: str,
     database_name: str,
@@ -69,7 +116,7 @@ async def post_histogram(
     post_body = {
         "database": database_name,
         "collection": collection_name,
-        "histogram": histo,
+        "histogram": expand_histogram(histo),
         "update": update,
     }
     post_resp = await rc.request("POST", "/histogram", post_body)
@@ -79,6 +126,60 @@ async def post_histogram(
     logging.debug(f"POST response: {post_resp}.")
 
 
+async def post_histogram_delta(  # pylint: disable=R0913
+    rc: rest_client.MadDashRestClient,
+    delta: Dict[str, Any],
+    histogram_name: str,
+    collection_name: str,
+    database_name: str,
+) -> None:
+    """POST a sparse delta (see `compute_delta()`) to the histogram in the DBMS."""
+    post_body = {
+        "database": database_name,
+        "collection": collection_name,
+        "name": histogram_name,
+        **delta,
+    }
+    post_resp = await rc.request("POST", "/histogram/delta", post_body)
+    logging.info(
+        f"POSTed delta ({len(delta['indices'])} bins) for histogram ({histogram_name})"
+        f" to {collection_name} (db: {database_name})."
+    )
+    logging.debug(f"POST response: {post_resp}.")
+
+
+def compute_delta(
+    histo: api.MongoHistogram, state: HistogramState
+) -> Optional[Dict[str, Any]]:
+    """Return the sparse difference between the histogram and its previous state.
+
+    The delta has the changed bins' `indices` and the differences, `values`,
+    plus any changed counters. Return None if nothing changed. Raise
+    `ValueError` if the number of bins changed.
+    """
+    bins = np.asarray(histo["bin_values"])
+    prev_bins, prev_counters = state
+    if bins.shape != prev_bins.shape:
+        raise ValueError(
+            f"Histogram ({histo['name']}) went from {len(prev_bins)} to"
+            f" {len(bins)} bins, so it can't be ingested as a delta."
+        )
+
+    diff = bins - prev_bins
+    indices = np.flatnonzero(diff)
+    counters = {
+        c: int(histo.get(c, 0)) - prev_counters[c] for c in COUNTERS  # type: ignore
+    }
+
+    if not len(indices) and not any(counters.values()):
+        return None
+    return {
+        "indices": indices.tolist(),
+        "values": diff[indices].tolist(),
+        **{c: v for c, v in counters.items() if v},
+    }
+
+
 def get_each_histogram(
     collection: api.MongoCollection, collection_name: str
 ) -> Iterator[api.MongoHistogram]:
@@ -90,30 +191,182 @@ def get_each_histogram(
         yield histo
 
 
-def get_all_pickles(paths: List[str], recurse: bool = False) -> List[str]:
-    """Get all pickle files in paths."""
-    pickles = []
+def get_each_valid_histogram(
+    collection: api.MongoCollection,
+    collection_name: str,
+    stats: "IngestStats",
+    fix: bool = False,
+    batch_size: int = validation.BATCH_SIZE,
+) -> Iterator[api.MongoHistogram]:
+    """Get the histograms in collection that the server would accept.
+
+    Histograms are checked `batch_size` at a time (see `validation.py`).
+    The others are recorded in `stats`, and skipped, unless `fix` can
+    fix them.
+    """
+    names = (name for name in collection if name != "filelist")
+    while True:
+        batch = {name: collection[name] for name in islice(names, batch_size)}
+        if not batch:
+            return
+        valid, invalid = validation.validate_histograms(batch, fix)
+        stats.invalid.extend((collection_name, i) for i in invalid)
+        for histo in valid:
+            logging.debug(
+                f"From collection ('{collection_name}'), grabbed histogram ('{histo['name']}')."
+            )
+            yield histo
+
+
+def get_all_pickles(
+    paths: Iterable[str],
+    recurse: bool = False,
+    include: Optional[List[str]] = None,
+    include_regex: Optional[str] = None,
+) -> Iterator[str]:
+    """Generate each pickle file in paths (and their sub-directories, if `recurse`).
+
+    Shards and columnar collections (see `shards.py` and `columnar.py`) count
+    as pickles. Directories are walked with `os.scandir`, whose entries
+    already know their type, so there's no extra stat per file. Pickles in
+    tar/zip archives are generated as paths within the archive (see
+    `archives.py`). Optionally, only generate files whose name matches one
+    of the `include` globs and/or whose path matches `include_regex`.
+    """
+    regex = re.compile(include_regex) if include_regex else None
+
+    def wanted(path: str, filename: str) -> bool:
+        if include and not any(fnmatch.fnmatchcase(filename, g) for g in include):
+            return False
+        if regex and not regex.search(path):
+            return False
+        return True
+
+    def from_file(path: str, filename: str) -> Iterator[str]:
+        if archives.is_archive(filename):
+            logging.debug(f"Path is an archive, '{path}', getting its pickles...")
+            for member in archives.list_members(path):
+                name = os.path.basename(member)
+                if name.endswith(".pkl") and wanted(f"{path}/{member}", name):
+                    yield f"{path}/{member}"
+        elif filename.endswith(tuple(EXTENSIONS)) and wanted(path, filename):
+            yield path
 
     for p in paths:
         # is it a directory?
         if os.path.isdir(p):
-            if recurse:
-                logging.debug(f"Path is a directory, '{p}', getting it's files...")
-                paths.extend(os.path.join(p, f) for f in os.listdir(p))
-            else:
+            if not recurse:
                 raise RuntimeError(
                     f"{p} is a directory. Run with -r to recursively find pickles."
                 )
+            dirs = deque([p])
+            while dirs:
+                dir_ = dirs.popleft()
+                logging.debug(f"Path is a directory, '{dir_}', getting it's files...")
+                with os.scandir(dir_) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            dirs.append(entry.path)
+                        elif entry.is_file():
+                            yield from from_file(entry.path, entry.name)
         # is it a file?
         elif os.path.isfile(p):
             logging.debug(f"Path is a file, '{p}'.")
-            if p.endswith(".pkl"):
-                pickles.append(p)
+            yield from from_file(p, os.path.basename(p))
         # or something else?
         else:
             logging.debug(f"Path is not a file nor directory, '{p}'.")
 
-    return pickles
+
+def compact_histogram(histo: api.MongoHistogram) -> None:
+    """Convert the histogram's numeric bin_values list to a numpy array.
+
+    Arrays are much cheaper than lists to pass between processes. Anything
+    non-numeric is left as-is for the server to reject.
+    """
+    if not isinstance(histo.get("bin_values"), list):
+        return
+    array = np.asarray(histo["bin_values"])
+    if array.ndim == 1 and array.dtype.kind in "iuf":
+        histo["bin_values"] = array  # type: ignore
+
+
+def expand_histogram(histo: api.MongoHistogram) -> api.MongoHistogram:
+    """Return the histogram with a compacted bin_values converted back to a list."""
+    if isinstance(histo.get("bin_values"), np.ndarray):
+        return {**histo, "bin_values": histo["bin_values"].tolist()}  # type: ignore
+    return histo
+
+
+class PickleFile(NamedTuple):
+    """A pickle file, as it was when it was loaded."""
+
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class LoadedCollection(NamedTuple):
+    """An unpickled (or merged) collection, and where it came from."""
+
+    collection: api.MongoCollection
+    name: str
+    digest: str  # sha256 of the pickle, or of the merged pickles' digests
+    files: List[PickleFile]
+
+
+def get_collection_name(pkl: str) -> str:
+    """Return the collection name for the pickle, its filename sans extension."""
+    pattern = rf"/([^/]*)(?:{'|'.join(re.escape(e) for e in EXTENSIONS)})$"
+    return str(re.findall(pattern, pkl)[0])
+
+
+def load_collection(
+    pkl: str, compact: bool = False, data: Optional[bytes] = None
+) -> LoadedCollection:
+    """Unpickle the collection at `pkl`, and get its name from the filename.
+
+    Shards and columnar collections aren't unpickled, just indexed: their
+    histograms are loaded (or memory-mapped) one at a time, as they're
+    accessed. A pickle in an archive is unpickled from `data`, its
+    contents (see `archives.ArchiveReader`).
+    """
+    lazy = None  # type: Optional[Union[ShardCollection, ColumnarCollection]]
+    if pkl.endswith(SHARD_EXTENSION):
+        lazy = ShardCollection(pkl)
+    elif pkl.endswith(COLUMNAR_EXTENSION):
+        lazy = ColumnarCollection(pkl)
+    if lazy is not None:
+        stat = os.stat(pkl)
+        logging.debug(f"Indexed collection at {pkl} ({len(lazy)} items).")
+        return LoadedCollection(
+            lazy,  # type: ignore
+            get_collection_name(pkl),
+            lazy.digest,
+            [PickleFile(pkl, stat.st_size, stat.st_mtime_ns)],
+        )
+
+    # unpickle
+    if data is None:
+        with open(pkl, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+    else:
+        stat = os.stat(archives.source_path(pkl))
+    collection = pickle.loads(data)
+    logging.debug(f"Unpickled collection at {pkl}.")
+    if compact:
+        for histo in api.yield_mongo_histograms(collection):
+            compact_histogram(histo)
+    # get name
+    name = get_collection_name(pkl)
+    logging.debug(f"Name for {pkl} is {name}.")
+    return LoadedCollection(
+        collection,
+        name,
+        hashlib.sha256(data).hexdigest(),
+        [PickleFile(pkl, stat.st_size, stat.st_mtime_ns)],
+    )
 
 
 def get_each_collection(
@@ -123,25 +376,479 @@ def get_each_collection(
     pickles = get_all_pickles(paths, recurse=recurse)
 
     for pkl in pickles:
-        # unpickle
-        with open(pkl, "rb") as f:
-            collection = pickle.load(f)
-        logging.debug(f"Unpickled collection at {pkl}.")
-        # get name
-        name = re.findall(r"/([^/]*).pkl$", pkl)[0]
-        logging.debug(f"Name for {pkl} is {name}.")
-        # yield
-        logging.info(f"Grabbed collection, {name}.")
-        yield (collection, name)
+        loaded = load_collection(pkl)
+        logging.info(f"Grabbed collection, {loaded.name}.")
+        yield (loaded.collection, loaded.name)
+
+
+async def _aiter(items: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def load_each_collection(
+    pickles: Union[Iterable[str], AsyncIterable[str]],
+    workers: int = 1,
+    prefetch: int = 2,
+    on_error: Optional[Callable[[str, Exception], None]] = None,
+) -> AsyncIterator[LoadedCollection]:
+    """Generate (compacted) collections, unpickled in `workers` processes.
+
+    `pickles` may be an async iterable, like a never-ending watcher. A
+    producer keeps up to `prefetch` pickles loading ahead of the consumer,
+    in order. With `workers=0`, unpickle in this process (blocking the
+    event loop). Archived pickles are read out of their archive here, in
+    order, then unpickled like the others.
+
+    A pickle's error is raised, unless there's an `on_error` callback, in
+    which case the error is passed to it and the pickle is skipped.
+    """
+    loop = asyncio.get_event_loop()
+    load = partial(load_collection, compact=True)
+    queue = asyncio.Queue(maxsize=prefetch)  # type: asyncio.Queue
+    reader = archives.ArchiveReader()
+
+    def read(pkl: str) -> Optional[bytes]:
+        return reader.read(pkl) if archives.split_member(pkl) else None
+
+    def submit(pool: ProcessPoolExecutor, pkl: str) -> asyncio.Future:
+        try:
+            data = read(pkl)
+        except Exception as e:  # pylint: disable=W0703
+            failed = loop.create_future()
+            failed.set_exception(e)
+            return failed
+        return loop.run_in_executor(pool, partial(load, pkl, data=data))
+
+    async def produce(pool: Optional[ProcessPoolExecutor]) -> None:
+        try:
+            async for pkl in _aiter(pickles):
+                if pool:
+                    await queue.put((pkl, submit(pool, pkl)))
+                else:
+                    await queue.put((pkl, None))
+        except Exception as e:  # pylint: disable=W0703
+            await queue.put(e)  # re-raise to the consumer
+        else:
+            await queue.put(None)
+
+    with ProcessPoolExecutor(workers) if workers else nullcontext() as pool:
+        producer = asyncio.ensure_future(produce(pool))
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                pkl, future = item
+                try:
+                    loaded = await future if future else load(pkl, data=read(pkl))
+                except Exception as e:  # pylint: disable=W0703
+                    if not on_error:
+                        raise
+                    on_error(pkl, e)
+                    continue
+                logging.info(f"Grabbed collection, {loaded.name}.")
+                yield loaded
+        finally:
+            producer.cancel()
+            reader.close()
+
+
+def merge_histograms(
+    total: api.MongoHistogram, histo: api.MongoHistogram
+) -> api.MongoHistogram:
+    """Return the sum of two (compacted) histograms.
+
+    This matches what the server does on an update: the counts are added
+    (bins are truncated to the shorter histogram) and the other attributes
+    come from `histo`.
+    """
+    merged = {**total, **histo}  # type: ignore
+    total_bins = np.asarray(total["bin_values"])
+    histo_bins = np.asarray(histo["bin_values"])
+    if len(total_bins) != len(histo_bins):
+        logging.warning(
+            f"Histogram ({histo['name']}) has {len(histo_bins)} bins, not"
+            f" {len(total_bins)}; truncating to the shorter."
+        )
+    n_bins = min(len(total_bins), len(histo_bins))
+    merged["bin_values"] = total_bins[:n_bins] + histo_bins[:n_bins]
+    for attr in ["overflow", "underflow", "nan_count"]:
+        merged[attr] = total.get(attr, 0) + histo.get(attr, 0)  # type: ignore
+    return merged  # type: ignore
+
+
+def merge_collections(
+    total: LoadedCollection, loaded: LoadedCollection
+) -> LoadedCollection:
+    """Return the merge of two loaded collections (of the same name).
+
+    Histograms are summed, and filelists are unioned (like the server).
+    """
+    collection = dict(total.collection)
+    for histo in api.yield_mongo_histograms(loaded.collection):
+        if histo["name"] in collection:
+            collection[histo["name"]] = merge_histograms(
+                collection[histo["name"]], histo  # type: ignore
+            )
+        else:
+            collection[histo["name"]] = histo
+
+    filelist = api.get_mongo_filelist(loaded.collection)
+    if filelist is not None:
+        files = set(api.get_mongo_filelist(total.collection) or []) | set(filelist)
+        collection["filelist"] = {"files": sorted(files)}
+
+    digests = sorted(total.digest.split(",") + [loaded.digest])
+    return LoadedCollection(
+        collection, total.name, ",".join(digests), total.files + loaded.files
+    )
+
+
+def finish_merge(merged: LoadedCollection) -> LoadedCollection:
+    """Log and return the merged collection, with a single digest."""
+    logging.info(
+        f"Aggregated {len(merged.files)} pickles into collection, {merged.name}."
+    )
+    if len(merged.files) == 1:
+        return merged
+    digest = hashlib.sha256(merged.digest.encode()).hexdigest()
+    return merged._replace(digest=digest)
+
+
+async def aggregate_each_collection(
+    pickles: Iterable[str],
+    workers: int = 1,
+    prefetch: int = 2,
+    database_for: Optional[Callable[[str], str]] = None,
+) -> AsyncIterator[LoadedCollection]:
+    """Generate one merged collection per collection name (and database).
+
+    All the pickles are found first, then each name's pickles are loaded
+    (see `load_each_collection()`) and merged into one collection. With
+    `database_for`, pickles routed to different databases aren't merged.
+    """
+
+    def group_of(pkl: str) -> Tuple[str, str]:
+        return (database_for(pkl) if database_for else "", get_collection_name(pkl))
+
+    groups: DefaultDict[Tuple[str, str], List[str]] = defaultdict(list)
+    for pkl in pickles:
+        groups[group_of(pkl)].append(pkl)
+    logging.info(f"Found {len(groups)} collections to aggregate.")
+
+    merged = None  # type: Optional[LoadedCollection]
+    ordered = [pkl for group in groups.values() for pkl in group]
+    async for loaded in load_each_collection(ordered, workers, prefetch):
+        if merged and group_of(merged.files[0].path) == group_of(loaded.files[0].path):
+            merged = merge_collections(merged, loaded)
+            continue
+        if merged:
+            yield finish_merge(merged)
+        merged = loaded
+    if merged:
+        yield finish_merge(merged)
+
+
+class IngestStats:
+    """Counts and timing of an ingest."""
+
+    def __init__(self) -> None:
+        self.start = time.time()
+        self.histograms = 0
+        self.filelists = 0
+        self.skipped = 0
+        self.failed = 0
+        self.unchanged = 0
+        self.delta_bins = 0
+        self.rewritten = 0
+        self.collections: DefaultDict[str, int] = defaultdict(int)
+        self.invalid = []  # type: List[Tuple[str, validation.Invalid]]
+        self.reported_invalid = 0
+
+    def report(self) -> None:
+        """Log the sustained throughput."""
+        elapsed = time.time() - self.start
+        rate = self.histograms / elapsed if elapsed else 0.0
+        logging.info(
+            f"POSTed {self.histograms} histograms and {self.filelists} filelists"
+            f" in {elapsed:.2f} seconds ({rate:.2f} histograms/second)."
+        )
+        if len(self.collections) > 1:
+            for database_name, count in sorted(self.collections.items()):
+                logging.info(f"Ingested {count} collections into {database_name}.")
+        if self.skipped:
+            logging.info(f"Skipped {self.skipped} already-ingested histograms.")
+        if self.delta_bins or self.unchanged:
+            logging.info(
+                f"Sent {self.delta_bins} changed bins as deltas; {self.unchanged}"
+                f" histograms were unchanged."
+            )
+        if self.rewritten:
+            logging.warning(
+                f"Skipped {self.rewritten} collections whose pickles changed since"
+                f" they were ingested; adding them again (-u) would double-count."
+            )
+        if self.failed:
+            logging.warning(f"Failed to ingest {self.failed} collections.")
+        self.report_invalid()
+
+    def report_invalid(self, limit: int = 20) -> None:
+        """Log the invalid histograms (and filelists) found since the last report."""
+        new = self.invalid[self.reported_invalid :]
+        self.reported_invalid = len(self.invalid)
+        if not new:
+            return
+        fixed = sum(1 for _, invalid in new if invalid.fixed)
+        logging.warning(
+            f"Found {len(new)} invalid histograms/filelists: fixed {fixed},"
+            f" skipped {len(new) - fixed}."
+        )
+        for collection_name, invalid in new[:limit]:
+            action = "fixed" if invalid.fixed else "skipped"
+            logging.warning(
+                f"  {collection_name}/{invalid.name} ({action}):"
+                f" {'; '.join(invalid.reasons)}"
+            )
+        if len(new) > limit:
+            logging.warning(f"  ...and {len(new) - limit} more.")
+
+
+async def ingest_collection(  # pylint: disable=R0913
+    rc: rest_client.MadDashRestClient,
+    loaded: LoadedCollection,
+    database_name: str,
+    semaphore: asyncio.Semaphore,
+    stats: IngestStats,
+    update: bool = False,
+    manifest: Optional[Manifest] = None,
+    delta: bool = False,
+    max_pending: int = 100,
+    fix_invalid: bool = False,
+) -> None:
+    """POST the collection's histograms concurrently, then its filelist.
+
+    `semaphore` bounds the number of in-flight POSTs (shared by all
+    collections). At most `max_pending` of the collection's histograms are
+    loaded and waiting to be POSTed at once, so a shard's histograms are
+    streamed. The filelist is POSTed only after all its histograms.
+
+    With a `manifest`, skip whatever was acknowledged by a previous run,
+    record each acknowledgement, and finally mark the pickle as done. With
+    `update` (but not `delta`), a collection whose pickles changed since
+    they were completely ingested is skipped, since its histograms would be
+    added again on top of their previous counts.
+
+    With `delta` (and a `manifest`), a histogram that was ingested before
+    from the same pickle is POSTed as only what changed since (if anything).
 
+    Histograms (and the filelist) that the server would reject aren't
+    POSTed, but recorded in `stats`; with `fix_invalid`, the fixable ones
+    are fixed and POSTed.
+    """
+    collection, collection_name = loaded.collection, loaded.name
+    source = ",".join(pkl.path for pkl in loaded.files)
 
-def get_rest_client(dbms_url: str, token_url: str) -> RestClient:
+    if update and manifest and not delta:
+        digests = {manifest.get_digest(database_name, pkl.path) for pkl in loaded.files}
+        if digests - {None, loaded.digest}:
+            logging.warning(
+                f"Skipping {collection_name} ({source}): it changed since it was"
+                f" ingested, and adding it again would double-count (see --delta)."
+            )
+            stats.rewritten += 1
+            return
+
+    acked: Set[str] = set()
+    if manifest:
+        acked = manifest.get_acked(database_name, source, loaded.digest)
+
+    def ack(name: str) -> None:
+        if manifest:
+            manifest.ack(database_name, source, loaded.digest, name)
+
+    async def post(histo: api.MongoHistogram) -> None:
+        state, diff = None, None
+        if delta and manifest:
+            state = manifest.get_state(database_name, source, histo["name"])
+            if state:
+                diff = compute_delta(histo, state)
+
+        if not state:
+            async with semaphore:
+                await post_histogram(rc, histo, collection_name, database_name, update)
+                stats.histograms += 1
+        elif diff:
+            async with semaphore:
+                await post_histogram_delta(
+                    rc, diff, histo["name"], collection_name, database_name
+                )
+                stats.histograms += 1
+                stats.delta_bins += len(diff["indices"])
+        else:
+            stats.unchanged += 1
+
+        if delta and manifest:
+            manifest.set_state(
+                database_name,
+                source,
+                histo["name"],
+                np.asarray(histo["bin_values"]),
+                {c: histo.get(c, 0) for c in COUNTERS},  # type: ignore
+            )
+        ack(histo["name"])
+
+    pending: Set[asyncio.Future] = set()
+    histos = get_each_valid_histogram(collection, collection_name, stats, fix_invalid)
+    for histo in histos:
+        if histo["name"] in acked:
+            stats.skipped += 1
+            continue
+        if len(pending) >= max_pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                task.result()  # raise any error
+        pending.add(asyncio.ensure_future(post(histo)))
+    await asyncio.gather(*pending)
+
+    filelist = get_filelist(collection, collection_name)
+    invalid = validation.validate_filelist(filelist) if filelist else None
+    if invalid:
+        stats.invalid.append(
+            (collection_name, validation.Invalid("filelist", [invalid], False))
+        )
+    elif filelist and "filelist" not in acked:
+        async with semaphore:
+            await post_filelist(rc, filelist, collection_name, database_name, update)
+            stats.filelists += 1
+        ack("filelist")
+
+    if manifest:
+        for pkl in loaded.files:
+            manifest.mark_done(
+                database_name, pkl.path, pkl.size, pkl.mtime_ns, loaded.digest
+            )
+
+
+async def ingest(  # pylint: disable=R0913
+    rc: rest_client.MadDashRestClient,
+    collections: AsyncIterator[LoadedCollection],
+    database_name: str,
+    concurrency: int = 1,
+    update: bool = False,
+    max_collections_in_flight: int = 2,
+    manifest: Optional[Manifest] = None,
+    stats: Optional[IngestStats] = None,
+    on_error: Optional[Callable[[LoadedCollection, Exception], None]] = None,
+    delta: bool = False,
+    router: Optional[Router] = None,
+    fix_invalid: bool = False,
+) -> IngestStats:
+    """POST each collection's histograms and filelist, `concurrency` at a time.
+
+    The next collection starts uploading while the previous one finishes,
+    but no more than `max_collections_in_flight` are held at once.
+
+    With a `router`, each collection goes to the database its (first)
+    pickle is routed to, `database_name` is only the default, and each
+    database has its own concurrency budget.
+
+    Collections with the same name (in the same database) are ingested one
+    at a time, since the server's merges (with `update`) aren't atomic.
+
+    A collection's error is raised, unless there's an `on_error` callback,
+    in which case the error is passed to it and the ingest continues.
+    """
+    if not stats:
+        stats = IngestStats()
+    routes = router if router else Router([], database_name, concurrency)
+    locks: DefaultDict[Any, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def ingest_one(loaded: LoadedCollection) -> None:
+        if loaded.files:
+            database = routes.database_for(loaded.files[0].path)
+        else:
+            database = routes.default_database
+        try:
+            async with locks[(database, loaded.name)]:
+                await ingest_collection(
+                    rc,
+                    loaded,
+                    database,
+                    routes.semaphore_for(database),
+                    stats,
+                    update,
+                    manifest,
+                    delta,
+                    max_pending=routes.budgets[database],
+                    fix_invalid=fix_invalid,
+                )
+            stats.collections[database] += 1
+        except Exception as e:  # pylint: disable=W0703
+            if not on_error:
+                raise
+            stats.failed += 1
+            on_error(loaded, e)
+
+    tasks: Set[asyncio.Future] = set()
+    async for loaded in collections:
+        tasks.add(asyncio.ensure_future(ingest_one(loaded)))
+        if len(tasks) >= max_collections_in_flight:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # raise any error
+    await asyncio.gather(*tasks)
+
+    stats.report()
+    return stats
+
+
+async def watch_pickles(
+    watcher: PickleWatcher, router: Router, manifest: Optional[Manifest] = None
+) -> AsyncIterator[str]:
+    """Generate each new/modified pickle the watcher finds, unless it's done."""
+    async for pkl in watcher.watch():
+        if manifest and manifest.is_done(router.database_for(pkl), pkl):
+            continue
+        yield pkl
+
+
+async def log_progress(
+    stats: IngestStats, watcher: PickleWatcher, interval: float = 60.0
+) -> None:
+    """Periodically log the throughput since the last log, and the backlog."""
+    last_histograms, last_time = stats.histograms, time.time()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.time()
+        rate = (stats.histograms - last_histograms) / (now - last_time)
+        logging.info(
+            f"{rate:.2f} histograms/second ({stats.histograms} total,"
+            f" {stats.failed} failed collections); {watcher.backlog} pickles"
+            f" waiting to settle."
+        )
+        last_histograms, last_time = stats.histograms, now
+
+
+def get_rest_client(
+    dbms_url: str, token_url: str, pool_size: int = 10, compress: bool = False
+) -> rest_client.MadDashRestClient:
     """Get database REST client."""
-    token_json = requests.get(
-        urljoin(token_url, "token?scope=maddash:production")
-    ).json()
-    rc = RestClient(dbms_url, token=token_json["access"], timeout=5, retries=0)
-    return rc
+    return rest_client.get_client(
+        dbms_url,
+        token_url,
+        "maddash:production",
+        pool_size=pool_size,
+        compress=compress,
+    )
 
 
 async def main() -> None:
@@ -161,10 +868,37 @@ async def main() -> None:
         action="store_true",
         help="recursively search for pickle files.",
     )
+    parser.add_argument(
+        "--include",
+        metavar="GLOB",
+        action="append",
+        help="only ingest pickles whose filename matches GLOB (repeatable).",
+    )
+    parser.add_argument(
+        "--include-regex",
+        dest="include_regex",
+        metavar="REGEX",
+        help="only ingest pickles whose path matches REGEX.",
+    )
     parser.add_argument(
         "--database",
         default="simprod_histos",
-        help="name of database to ingest histograms.",
+        help="name of database to ingest histograms"
+        " (the default, with --route/--routes).",
+    )
+    parser.add_argument(
+        "--route",
+        metavar="REGEX=DATABASE[:CONCURRENCY]",
+        action="append",
+        help="ingest pickles whose path matches REGEX into DATABASE, with its own"
+        " concurrency budget (default: --concurrency); repeatable, first match wins.",
+    )
+    parser.add_argument(
+        "--routes",
+        metavar="PATH",
+        help="JSON file of routes, like"
+        ' [{"pattern": REGEX, "database": DATABASE, "concurrency": N}, ...];'
+        " checked after any --route.",
     )
     parser.add_argument(
         "-u",
@@ -173,6 +907,77 @@ async def main() -> None:
         action="store_true",
         help="update histogram, if it already exists in the database.",
     )
+    parser.add_argument(
+        "--aggregate",
+        default=False,
+        action="store_true",
+        help="merge all pickles with the same collection name, then POST once"
+        " per collection.",
+    )
+    parser.add_argument(
+        "--delta",
+        default=False,
+        action="store_true",
+        help="POST only the bins that changed since the last ingest of each"
+        " pickle's histogram (recorded in the --manifest).",
+    )
+    parser.add_argument(
+        "--watch",
+        default=False,
+        action="store_true",
+        help="keep running, and ingest new/modified pickles as they're written.",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        dest="watch_interval",
+        type=float,
+        default=5.0,
+        help="seconds between checks for new pickles (when watching).",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=10.0,
+        help="seconds a pickle must be unmodified before it's ingested"
+        " (when watching).",
+    )
+    parser.add_argument(
+        "--manifest",
+        metavar="PATH",
+        help="SQLite file recording what's been ingested, to resume from"
+        " (created if needed).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        default=False,
+        action="store_true",
+        help="do everything but send the requests (no server needed);"
+        " implies --benchmark.",
+    )
+    parser.add_argument(
+        "--benchmark",
+        default=False,
+        action="store_true",
+        help="report the time spent discovering, loading, validating, encoding,"
+        " and sending, plus throughput and peak memory.",
+    )
+    parser.add_argument(
+        "--gzip",
+        default=False,
+        action="store_true",
+        help="gzip large request bodies (the server must support"
+        " Content-Encoding: gzip).",
+    )
+    parser.add_argument(
+        "--fix-invalid",
+        dest="fix_invalid",
+        default=False,
+        action="store_true",
+        help="fix histograms the server would reject, where that's lossless"
+        " (e.g. whole-number float counts, a 'history' field), instead of"
+        " skipping them.",
+    )
     parser.add_argument(
         "--dbms-url",
         dest="dbms_url",
@@ -185,21 +990,162 @@ async def main() -> None:
         default="http://localhost:8888",
         help="url to the token service.",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="max number of histograms/filelists to POST at once (per database).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes unpickling collections;"
+        " 0 to unpickle in the uploading process.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="max number of collections to unpickle ahead of (and upload at) once.",
+    )
     parser.add_argument("-l", "--log", default="DEBUG", help="the output logging level")
     args = parser.parse_args()
+    if args.watch and args.aggregate:
+        parser.error("--watch and --aggregate can't be used together")
+    if args.delta and (args.aggregate or not args.manifest or not args.update):
+        parser.error("--delta requires --manifest and -u, and not --aggregate")
+    if args.dry_run and (args.manifest or args.watch):
+        parser.error("--dry-run can't be used with --manifest or --watch")
+    if args.benchmark and args.watch:
+        parser.error("--benchmark can't be used with --watch")
+    try:
+        routes = [parse_route(spec) for spec in args.route or []]
+        if args.routes:
+            routes += load_routes(args.routes)
+    except (OSError, KeyError, ValueError, re.error) as e:
+        parser.error(f"bad routes ({e})")
+    router = Router(routes, args.database, args.concurrency)
 
     logging.basicConfig(level=getattr(logging, args.log.upper()))
     for arg, val in vars(args).items():
         logging.info(f"{arg}: {val}")
 
-    rc = get_rest_client(args.dbms_url, args.token_url)
-    for collection, name in get_each_collection(args.paths, args.recurse_paths):
-        for histo in get_each_histogram(collection, name):
-            await post_histogram(rc, histo, name, args.database)
+    timer = None  # type: Optional[benchmark.StageTimer]
+    if args.dry_run:
+        timer = benchmark.StageTimer()
+        rc = benchmark.BenchmarkRestClient(timer, compress=args.gzip)  # type: Any
+    else:
+        rc = get_rest_client(
+            args.dbms_url,
+            args.token_url,
+            pool_size=max(router.total_concurrency, 10),
+            compress=args.gzip,
+        )
+        if args.benchmark:
+            timer = benchmark.StageTimer()
+            rc = benchmark.BenchmarkRestClient(timer, rc, compress=args.gzip)
+    find_pickles = partial(
+        get_all_pickles,
+        recurse=args.recurse_paths,
+        include=args.include,
+        include_regex=args.include_regex,
+    )
+    manifest = Manifest(args.manifest) if args.manifest else None
+
+    if args.watch:
+        await watch(args, rc, find_pickles, manifest, router)
+        return
+
+    pickles = find_pickles(args.paths)
+    if timer:
+        pickles = benchmark.timed_iter(pickles, timer, "discover")
+    if manifest:
+        pickles = (
+            p for p in pickles if not manifest.is_done(router.database_for(p), p)
+        )
 
-        filelist = get_filelist(collection, name)
-        if filelist:
-            await post_filelist(rc, filelist, name, args.database)
+    if args.aggregate:
+        collections = aggregate_each_collection(
+            pickles, args.workers, args.prefetch, database_for=router.database_for
+        )
+    else:
+        collections = load_each_collection(
+            pickles, workers=args.workers, prefetch=args.prefetch
+        )
+    if timer:
+        collections = benchmark.timed_load(collections, timer)
+
+    await ingest(
+        rc,
+        collections,
+        args.database,
+        concurrency=args.concurrency,
+        update=args.update,
+        max_collections_in_flight=args.prefetch,
+        manifest=manifest,
+        delta=args.delta,
+        router=router,
+        fix_invalid=args.fix_invalid,
+    )
+    rc.stats.log()
+    if timer:
+        timer.report(dry_run=args.dry_run)
+
+
+async def watch(
+    args: argparse.Namespace,
+    rc: rest_client.MadDashRestClient,
+    find_pickles: Callable[[List[str]], Iterable[str]],
+    manifest: Optional[Manifest],
+    router: Router,
+) -> None:
+    """Ingest pickles as they're written, until SIGINT/SIGTERM.
+
+    A pickle that fails is logged and retried at a later full scan.
+    """
+    watcher = PickleWatcher(
+        args.paths, find_pickles, interval=args.watch_interval, settle=args.settle
+    )
+    loop = asyncio.get_event_loop()
+    for sig in [signal.SIGINT, signal.SIGTERM]:
+        loop.add_signal_handler(sig, watcher.stop)
+
+    def on_load_error(pkl: str, e: Exception) -> None:
+        logging.error(f"Failed to load {pkl} ({e}); will retry.")
+        watcher.forget(pkl)
+
+    def on_ingest_error(loaded: LoadedCollection, e: Exception) -> None:
+        logging.error(f"Failed to ingest {loaded.name} ({e}); will retry.")
+        for pkl in loaded.files:
+            watcher.forget(pkl.path)
+
+    stats = IngestStats()
+    progress = asyncio.ensure_future(log_progress(stats, watcher))
+    try:
+        await ingest(
+            rc,
+            load_each_collection(
+                watch_pickles(watcher, router, manifest),
+                workers=args.workers,
+                prefetch=args.prefetch,
+                on_error=on_load_error,
+            ),
+            args.database,
+            concurrency=args.concurrency,
+            update=args.update,
+            max_collections_in_flight=args.prefetch,
+            manifest=manifest,
+            delta=args.delta,
+            stats=stats,
+            on_error=on_ingest_error,
+            router=router,
+            fix_invalid=args.fix_invalid,
+        )
+    finally:
+        progress.cancel()
+    logging.info("Stopped watching.")
+    rc.stats.log()
 
 
 if __name__ == "__main__":
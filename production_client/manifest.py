@@ -0,0 +1,159 @@
+"""A local record of ingested pickles, for resuming an interrupted ingest."""
+
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import numpy as np  # type: ignore
+
+# local imports
+from .archives import source_path
+
+COUNTERS = ["overflow", "underflow", "nan_count"]
+
+# types
+HistogramState = Tuple[np.ndarray, Dict[str, int]]
+
+
+class Manifest:
+    """SQLite-backed record of which pickles (and histograms) were ingested.
+
+    A pickle is identified by its path, size, and mtime (those of its
+    archive, for an archived pickle); the histograms
+    acknowledged by the server are recorded by the pickle's path and
+    content hash, so a re-written pickle is re-ingested from scratch, and
+    identical pickles (of different collections, or jobs) are each ingested.
+
+    For delta ingestion, it also keeps the last-ingested bins and counters
+    of each pickle's histograms. They're kept per pickle (not per
+    collection), since several pickles may add to the same collection.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                database TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (database, path)
+            );
+            CREATE TABLE IF NOT EXISTS acks (
+                database TEXT NOT NULL,
+                path TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                name TEXT NOT NULL,
+                PRIMARY KEY (database, path, digest, name)
+            );
+            CREATE TABLE IF NOT EXISTS states (
+                database TEXT NOT NULL,
+                path TEXT NOT NULL,
+                name TEXT NOT NULL,
+                dtype TEXT NOT NULL,
+                bins BLOB NOT NULL,
+                overflow INTEGER NOT NULL,
+                underflow INTEGER NOT NULL,
+                nan_count INTEGER NOT NULL,
+                PRIMARY KEY (database, path, name)
+            );
+            """
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.conn.close()
+
+    def is_done(self, database_name: str, path: str) -> bool:
+        """Return whether the pickle, as it is now, was completely ingested."""
+        try:
+            stat = os.stat(source_path(path))
+        except FileNotFoundError:
+            return False
+        row = self.conn.execute(
+            "SELECT size, mtime_ns FROM files WHERE database = ? AND path = ?",
+            (database_name, path),
+        ).fetchone()
+        return row == (stat.st_size, stat.st_mtime_ns)
+
+    def get_digest(self, database_name: str, path: str) -> Optional[str]:
+        """Return the pickle's content hash when it was completely ingested, if ever."""
+        row = self.conn.execute(
+            "SELECT digest FROM files WHERE database = ? AND path = ?",
+            (database_name, path),
+        ).fetchone()
+        return row[0] if row else None
+
+    def pending(self, database_name: str, paths: Iterable[str]) -> Iterator[str]:
+        """Generate the paths that weren't completely ingested."""
+        for path in paths:
+            if not self.is_done(database_name, path):
+                yield path
+
+    def get_acked(self, database_name: str, path: str, digest: str) -> Set[str]:
+        """Return the names of the pickle's acknowledged histograms/filelist."""
+        rows = self.conn.execute(
+            "SELECT name FROM acks WHERE database = ? AND path = ? AND digest = ?",
+            (database_name, path, digest),
+        )
+        return {r[0] for r in rows}
+
+    def ack(self, database_name: str, path: str, digest: str, name: str) -> None:
+        """Record that the server acknowledged the pickle's histogram/filelist."""
+        self.conn.execute(
+            "INSERT OR IGNORE INTO acks VALUES (?, ?, ?, ?)",
+            (database_name, path, digest, name),
+        )
+        self.conn.commit()
+
+    def mark_done(  # pylint: disable=R0913
+        self, database_name: str, path: str, size: int, mtime_ns: int, digest: str
+    ) -> None:
+        """Record that the pickle was completely ingested."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+            (database_name, path, size, mtime_ns, digest),
+        )
+        self.conn.commit()
+
+    def get_state(
+        self, database_name: str, path: str, name: str
+    ) -> Optional[HistogramState]:
+        """Return the pickle's histogram's last-ingested bins and counters, if any."""
+        row = self.conn.execute(
+            "SELECT dtype, bins, overflow, underflow, nan_count FROM states"
+            " WHERE database = ? AND path = ? AND name = ?",
+            (database_name, path, name),
+        ).fetchone()
+        if not row:
+            return None
+        bins = np.frombuffer(row[1], dtype=row[0])
+        return bins, dict(zip(COUNTERS, row[2:]))
+
+    def set_state(  # pylint: disable=R0913
+        self,
+        database_name: str,
+        path: str,
+        name: str,
+        bins: np.ndarray,
+        counters: Dict[str, int],
+    ) -> None:
+        """Record the pickle's histogram's last-ingested bins and counters."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO states VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                database_name,
+                path,
+                name,
+                bins.dtype.str,
+                bins.tobytes(),
+                *[int(counters.get(c, 0)) for c in COUNTERS],
+            ),
+        )
+        self.conn.commit()
@@ -0,0 +1,89 @@
+"""Route pickles to databases, each with its own concurrency budget."""
+
+import asyncio
+import json
+import re
+from typing import Dict, List, NamedTuple, Optional, Pattern
+
+
+class Route(NamedTuple):
+    """Pickles whose path matches `pattern` go to `database`."""
+
+    pattern: Pattern[str]
+    database: str
+    concurrency: Optional[int] = None  # None means the default
+
+
+def parse_route(spec: str) -> Route:
+    """Parse a "REGEX=DATABASE[:CONCURRENCY]" route spec."""
+    try:
+        regex, target = spec.rsplit("=", 1)
+        database, _, concurrency = target.partition(":")
+        if not regex or not database:
+            raise ValueError()
+        return Route(
+            re.compile(regex), database, int(concurrency) if concurrency else None
+        )
+    except (ValueError, re.error):
+        raise ValueError(f"invalid route ({spec}); use REGEX=DATABASE[:CONCURRENCY]")
+
+
+def load_routes(path: str) -> List[Route]:
+    """Load routes from a JSON file.
+
+    The file has a list of objects, like:
+        [{"pattern": "/2020/", "database": "simprod_2020", "concurrency": 8}]
+    where "concurrency" is optional.
+    """
+    with open(path) as f:
+        return [
+            Route(re.compile(r["pattern"]), r["database"], r.get("concurrency"))
+            for r in json.load(f)
+        ]
+
+
+class Router:
+    """Pick each pickle's database, and each database's POST semaphore.
+
+    The first route whose pattern matches (`re.search`) a pickle's path
+    wins; otherwise the pickle goes to `default_database`. Each database
+    gets its own semaphore, so a slow database only holds back its own
+    uploads, while all of them share one REST client.
+    """
+
+    def __init__(
+        self,
+        routes: List[Route],
+        default_database: str,
+        default_concurrency: int = 1,
+    ) -> None:
+        self.routes = routes
+        self.default_database = default_database
+        self.default_concurrency = default_concurrency
+
+        self.budgets = {default_database: default_concurrency}
+        for route in reversed(routes):  # so the first route's budget wins
+            self.budgets[route.database] = (
+                route.concurrency if route.concurrency else default_concurrency
+            )
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def total_concurrency(self) -> int:
+        """Most POSTs in flight at once, across all databases."""
+        return sum(self.budgets.values())
+
+    def database_for(self, path: str) -> str:
+        """Return the database for the pickle."""
+        for route in self.routes:
+            if route.pattern.search(path):
+                return route.database
+        return self.default_database
+
+    def semaphore_for(self, database_name: str) -> asyncio.Semaphore:
+        """Return the database's semaphore, bounding its in-flight POSTs."""
+        if database_name not in self.semaphores:
+            self.semaphores[database_name] = asyncio.Semaphore(
+                self.budgets[database_name]
+            )
+        return self.semaphores[database_name]
@@ -0,0 +1,82 @@
+"""An indexed, one-record-per-histogram format for very large collections.
+
+A pickled collection has to be unpickled whole, so a multi-GB pickle
+needs several GB of memory to ingest. A shard holds the same collection
+as one pickle per histogram (and one for the filelist), followed by an
+index of where each record starts. Reading a shard only loads the index;
+each histogram is unpickled when it's accessed.
+
+Layout:
+    MAGIC | record... | pickled index | index offset (uint64, LE) | MAGIC
+"""
+
+import os
+import pickle
+import struct
+from typing import Any, Dict, Iterator, Mapping, Tuple
+
+EXTENSION = ".shard"
+MAGIC = b"MADSHRD1"
+
+_TRAILER = struct.Struct("<Q")
+
+
+def write_shard(collection: Mapping[str, Any], path: str, digest: str) -> None:
+    """Write the collection to a shard at `path`, one record per item.
+
+    `digest` is stored as the collection's content hash (see
+    `ShardCollection.digest`). The shard is written to a temporary file
+    then renamed, so a shard at `path` is always complete.
+    """
+    records: Dict[str, Tuple[int, int]] = {}
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        for name, value in collection.items():
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            records[name] = (f.tell(), len(data))
+            f.write(data)
+        index_offset = f.tell()
+        pickle.dump({"digest": digest, "records": records}, f)
+        f.write(_TRAILER.pack(index_offset))
+        f.write(MAGIC)
+    os.replace(tmp, path)
+
+
+class ShardCollection(Mapping[str, Any]):
+    """A read-only, lazily-loaded collection backed by a shard.
+
+    Only the index is kept in memory; every access of an item reads and
+    unpickles its record.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < 2 * len(MAGIC) + _TRAILER.size or f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a shard.")
+            f.seek(size - len(MAGIC) - _TRAILER.size)
+            (index_offset,) = _TRAILER.unpack(f.read(_TRAILER.size))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is an incomplete shard.")
+            f.seek(index_offset)
+            index = pickle.load(f)
+        self.digest: str = index["digest"]
+        self.records: Dict[str, Tuple[int, int]] = index["records"]
+
+    def size_of(self, name: str) -> int:
+        """Return the size (bytes) of the item's record."""
+        return self.records[name][1]
+
+    def __getitem__(self, name: str) -> Any:
+        offset, length = self.records[name]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return pickle.loads(f.read(length))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
@@ -0,0 +1,178 @@
+"""Check histograms against the server's rules before POSTing them.
+
+The server builds an `api.I3Histogram` from each POSTed histogram
+(`I3Histogram.from_dict()`), and rejects it (400) if that fails, or if it
+has a "history". Checking first, a batch at a time, means bad histograms
+don't cost an upload each, and can be reported together.
+
+A batch's fields are checked a column at a time: the set of a column's
+types is found in one pass, and only a column with unexpected types is
+looked at value by value. Numeric checks (like whether float counts are
+whole numbers) are done with numpy. Bins are checked by their array
+dtype, or a list's type set, never bin by bin in Python; the ingest
+loads bins as arrays (see `compact_histogram()`), so that's one check
+per histogram.
+"""
+
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+import numpy as np  # type: ignore
+
+# local imports
+import api
+
+REQUIRED = ["name", "xmax", "xmin", "overflow", "underflow", "nan_count", "bin_values"]
+COUNTERS = ["overflow", "underflow", "nan_count"]
+LIMITS = ["xmax", "xmin"]
+RESERVED = ["history"]
+
+BATCH_SIZE = 100  # histograms checked at once
+
+INT_TYPES = {int, bool}
+NUM_TYPES = {int, bool, float}
+
+
+class Invalid(NamedTuple):
+    """A histogram that broke the server's rules, and whether it was fixed."""
+
+    name: str
+    reasons: List[str]
+    fixed: bool
+
+
+# a value's problem (or None), its fixed value, and whether that's a fix
+Check = Tuple[Optional[str], Any, bool]
+
+
+def _check_counts(values: List[Any]) -> List[Check]:
+    """Check each count, which has to be an int."""
+    results: List[Check] = [(None, v, True) for v in values]
+    if set(map(type, values)) <= INT_TYPES:
+        return results
+
+    floats = [i for i, v in enumerate(values) if isinstance(v, (float, np.floating))]
+    if floats:
+        array = np.asarray([values[i] for i in floats], dtype=float)
+        whole = np.isfinite(array) & (array == np.floor(array))
+        for i, is_whole in zip(floats, whole.tolist()):
+            value = int(values[i]) if is_whole else values[i]
+            results[i] = (f"count is a float ({values[i]})", value, is_whole)
+    for i, value in enumerate(values):
+        if isinstance(value, np.integer):
+            results[i] = (f"count is a numpy {value.dtype}", int(value), True)
+        elif not isinstance(value, (int, float, np.floating)):
+            results[i] = (f"count is a {type(value).__name__}", value, False)
+    return results
+
+
+def _check_limits(values: List[Any]) -> List[Check]:
+    """Check each x-limit, which has to be an int or float."""
+    results: List[Check] = [(None, v, True) for v in values]
+    if set(map(type, values)) <= NUM_TYPES:
+        return results
+    for i, value in enumerate(values):
+        if isinstance(value, np.integer):
+            results[i] = (f"x-limit is a numpy {value.dtype}", int(value), True)
+        elif not isinstance(value, (int, float)):
+            results[i] = (f"x-limit is a {type(value).__name__}", value, False)
+    return results
+
+
+def _check_bins(bins: Any) -> Tuple[Optional[str], Optional[Any]]:
+    """Return the bins' problem (or None), and the fixed bins (or None if unfixable).
+
+    Numeric arrays are fine, since they're sent as lists. A list with
+    numpy numbers is fixed by making it an array.
+    """
+    if isinstance(bins, np.ndarray) and bins.dtype != object:
+        if bins.ndim == 1 and bins.dtype.kind in "biuf":
+            return None, bins
+        return f"bins are a {bins.ndim}-D {bins.dtype} array", None
+    if not isinstance(bins, (list, np.ndarray)):
+        return f"bins are a {type(bins).__name__}", None
+
+    types = set(map(type, bins))
+    if types <= NUM_TYPES:
+        return None, bins
+    array = np.asarray(list(bins))
+    if array.ndim == 1 and array.dtype.kind in "biuf":
+        return "bins include numpy numbers", array
+    others = sorted(t.__name__ for t in types - NUM_TYPES)
+    return f"bins include {', '.join(others)} values", None
+
+
+def validate_histograms(
+    histos: Mapping[str, Any], fix: bool = False
+) -> Tuple[List[api.MongoHistogram], List[Invalid]]:
+    """Return the histograms the server would accept, and those it wouldn't.
+
+    `histos` is a batch of histograms by name (like a collection, minus
+    its filelist). With `fix`, histograms that can be fixed losslessly
+    (whole-number float counts, numpy scalars, a "history") are fixed and
+    returned with the valid ones. The inputs are never modified.
+    """
+    valid: List[Dict[str, Any]] = []
+    invalid: List[Invalid] = []
+    reasons: Dict[int, List[str]] = {}
+    unfixable: Set[int] = set()
+
+    # the structure, which the other checks rely on
+    candidates: List[Dict[str, Any]] = []
+    for key, histo in histos.items():
+        if not isinstance(histo, dict):
+            invalid.append(Invalid(key, [f"is a {type(histo).__name__}"], False))
+            continue
+        missing = [k for k in REQUIRED if k not in histo]
+        if missing:
+            invalid.append(Invalid(key, [f"missing {', '.join(missing)}"], False))
+            continue
+        if not isinstance(histo["name"], str) or histo["name"] == "filelist":
+            invalid.append(Invalid(key, [f"illegal name ({histo['name']!r})"], False))
+            continue
+        candidates.append(dict(histo))
+
+    def problem(i: int, reason: str, fixable: bool) -> None:
+        reasons.setdefault(i, []).append(reason)
+        if not fixable:
+            unfixable.add(i)
+
+    for field in COUNTERS + LIMITS:
+        values = [histo[field] for histo in candidates]
+        check = _check_counts if field in COUNTERS else _check_limits
+        for i, (reason, value, fixable) in enumerate(check(values)):
+            if reason:
+                problem(i, f"{field}: {reason}", fixable)
+                candidates[i][field] = value
+
+    for i, histo in enumerate(candidates):
+        reason, bins = _check_bins(histo["bin_values"])
+        if reason:
+            problem(i, reason, bins is not None)
+            if bins is not None:
+                histo["bin_values"] = bins
+        for key in RESERVED:
+            if key in histo:
+                problem(i, f"has a reserved field ({key})", True)
+                del histo[key]
+
+    for i, histo in enumerate(candidates):
+        if i not in reasons:
+            valid.append(histo)
+        elif fix and i not in unfixable:
+            invalid.append(Invalid(histo["name"], reasons[i], True))
+            valid.append(histo)
+        else:
+            invalid.append(Invalid(histo["name"], reasons[i], False))
+
+    return valid, invalid  # type: ignore
+
+
+def validate_filelist(files: Any) -> Optional[str]:
+    """Return why the server would reject the filelist, or None if it wouldn't."""
+    if not isinstance(files, list):
+        return f"filelist is a {type(files).__name__}"
+    types = set(map(type, files))
+    if types <= {str}:
+        return None
+    others = sorted(t.__name__ for t in types - {str})
+    return f"filelist includes {', '.join(others)} values"
@@ -0,0 +1,151 @@
+"""Watch directories for new/modified pickles, for continuous ingestion."""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Set, Tuple
+
+try:
+    import inotify_simple  # type: ignore
+except ImportError:
+    inotify_simple = None
+
+# local imports
+from .archives import source_path
+
+# types
+FindPickles = Callable[[List[str]], Iterable[str]]
+
+
+class PickleWatcher:
+    """Generate each new or modified pickle, once it's done being written.
+
+    Changes are detected with inotify (if `inotify_simple` is installed) or
+    else by rescanning every `interval` seconds. A pickle is only
+    generated once its mtime is `settle` seconds old and its size/mtime
+    haven't changed since last seen, so partially-written files are
+    skipped until they're complete.
+
+    `find_pickles(paths)` returns the (filtered) pickles found at paths,
+    like `get_all_pickles()`.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        paths: List[str],
+        find_pickles: FindPickles,
+        interval: float = 5.0,
+        settle: float = 10.0,
+        rescan_interval: float = 600.0,
+        use_inotify: bool = True,
+    ) -> None:
+        self.paths = paths
+        self.find_pickles = find_pickles
+        self.interval = interval
+        self.settle = settle
+        self.rescan_interval = rescan_interval
+
+        self.pending: Set[str] = set()
+        self.generated: Dict[str, Tuple[int, int]] = {}
+        self.stopped = asyncio.Event()
+
+        self.inotify: Any = None
+        if use_inotify and inotify_simple:
+            self.inotify = inotify_simple.INotify()
+            self.watch_descriptors: Dict[int, str] = {}
+            for path in paths:
+                self._add_watches(
+                    path if os.path.isdir(path) else os.path.dirname(path)
+                )
+        logging.info(
+            f"Watching {paths} for pickles"
+            f" ({'inotify' if self.inotify else f'polling every {interval}s'})."
+        )
+
+    @property
+    def backlog(self) -> int:
+        """Number of pickles seen but not yet settled."""
+        return len(self.pending)
+
+    def stop(self) -> None:
+        """Stop watching; `watch()` returns after its current check."""
+        self.stopped.set()
+
+    def forget(self, path: str) -> None:
+        """Generate the pickle again, at the next full scan (e.g. after an error)."""
+        self.generated.pop(path, None)
+
+    def _add_watches(self, dir_: str) -> None:
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY
+        for root, _, _ in os.walk(dir_):
+            wd = self.inotify.add_watch(root, mask)
+            self.watch_descriptors[wd] = root
+
+    def _read_inotify(self) -> List[str]:
+        """Return the files changed within `interval` seconds; add new dirs."""
+        flags = inotify_simple.flags
+        files: List[str] = []
+        for event in self.inotify.read(timeout=int(self.interval * 1000)):
+            if event.wd not in self.watch_descriptors:
+                continue
+            path = os.path.join(self.watch_descriptors[event.wd], event.name)
+            if event.mask & flags.ISDIR:
+                if event.mask & (flags.CREATE | flags.MOVED_TO):
+                    self._add_watches(path)
+                    files.extend(self.find_pickles([path]))
+            else:
+                files.append(path)
+        return files
+
+    def _observe(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            try:
+                stat = os.stat(source_path(path))
+            except FileNotFoundError:
+                continue
+            if self.generated.get(path) != (stat.st_size, stat.st_mtime_ns):
+                self.pending.add(path)
+
+    def _pop_settled(self) -> List[str]:
+        settled = []
+        now = time.time()
+        for path in list(self.pending):
+            try:
+                stat = os.stat(source_path(path))
+            except FileNotFoundError:
+                self.pending.discard(path)
+                continue
+            if now - stat.st_mtime_ns / 1e9 < self.settle:
+                continue  # still being written (maybe)
+            self.pending.discard(path)
+            self.generated[path] = (stat.st_size, stat.st_mtime_ns)
+            settled.append(path)
+        return sorted(settled)
+
+    async def watch(self) -> AsyncIterator[str]:
+        """Generate each pickle, now and as they're written, until stopped."""
+        loop = asyncio.get_event_loop()
+        last_scan = 0.0
+
+        while not self.stopped.is_set():
+            if not self.inotify or time.time() - last_scan >= self.rescan_interval:
+                # full scan: polling, the first time, or inotify's safety net
+                last_scan = time.time()
+                self._observe(self.find_pickles(self.paths))
+
+            for path in self._pop_settled():
+                yield path
+
+            if self.inotify:
+                changed = await loop.run_in_executor(None, self._read_inotify)
+                self._observe(self.find_pickles(changed) if changed else [])  # filter
+            else:
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        if self.inotify:
+            self.inotify.close()
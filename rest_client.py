@@ -0,0 +1,260 @@
+"""REST client for Mad-Dash-wide usages (production client & web app).
+
+Clients are shared per (server, token service, scope): they cache their
+access token until it's about to expire, reuse a pool of keep-alive
+connections, and retry idempotent calls with jittered exponential backoff.
+"""
+
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, DefaultDict, Deque, Dict, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+IDEMPOTENT_METHODS = ["GET", "HEAD", "PUT", "DELETE", "OPTIONS"]
+RETRY_STATUSES = [429, 502, 503, 504]
+GZIP_MIN_SIZE = 1024  # smaller bodies aren't worth compressing
+GZIP_LEVEL = 6
+
+
+def get_token_expiry(token: str) -> Optional[float]:
+    """Return the JWT's expiration epoch (unverified), or None if it has none."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def encode_body(args: Dict[str, Any], compress: bool = False) -> Tuple[bytes, bool]:
+    """Return the JSON-encoded body, and whether it was gzipped.
+
+    With `compress`, bodies of at least `GZIP_MIN_SIZE` bytes are gzipped.
+    """
+    data = json.dumps(args).encode()
+    if compress and len(data) >= GZIP_MIN_SIZE:
+        return gzip.compress(data, compresslevel=GZIP_LEVEL), True
+    return data, False
+
+
+class TokenCache:
+    """Get an access token from the token service, and reuse it until near expiry.
+
+    A token without an expiration is reused for `default_lifetime` seconds.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        token_url: str,
+        scope: str,
+        session: Optional[requests.Session] = None,
+        refresh_margin: float = 60.0,
+        default_lifetime: float = 300.0,
+    ) -> None:
+        self.token_url = token_url
+        self.scope = scope
+        self.session = session if session else requests.Session()
+        self.refresh_margin = refresh_margin
+        self.default_lifetime = default_lifetime
+
+        self.lock = threading.Lock()
+        self.token = ""
+        self.expiry = 0.0
+
+    def get(self, force_refresh: bool = False) -> str:
+        """Return a token that's good for at least `refresh_margin` seconds."""
+        with self.lock:
+            if force_refresh or time.time() + self.refresh_margin >= self.expiry:
+                url = urljoin(self.token_url, f"token?scope={self.scope}")
+                response = self.session.get(url)
+                response.raise_for_status()
+                self.token = response.json()["access"]
+                expiry = get_token_expiry(self.token)
+                self.expiry = expiry if expiry else time.time() + self.default_lifetime
+                logging.debug(f"Got new token for {self.scope}.")
+            return self.token
+
+
+class LatencyStats:
+    """Latencies of the most recent calls, per (method, path)."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self.lock = threading.Lock()
+        self.latencies: DefaultDict[Tuple[str, str], Deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self.calls: DefaultDict[Tuple[str, str], int] = defaultdict(int)
+        self.errors: DefaultDict[Tuple[str, str], int] = defaultdict(int)
+        self.retries: DefaultDict[Tuple[str, str], int] = defaultdict(int)
+
+    def record(  # pylint: disable=R0913
+        self, method: str, path: str, seconds: float, error: bool, retries: int
+    ) -> None:
+        """Record a finished call (including its retries)."""
+        with self.lock:
+            self.latencies[(method, path)].append(seconds)
+            self.calls[(method, path)] += 1
+            self.errors[(method, path)] += int(error)
+            self.retries[(method, path)] += retries
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return call counts and latency percentiles (seconds) per call."""
+        summary = {}
+        with self.lock:
+            for key, latencies in self.latencies.items():
+                ordered = sorted(latencies)
+                summary[" ".join(key)] = {
+                    "calls": self.calls[key],
+                    "errors": self.errors[key],
+                    "retries": self.retries[key],
+                    "p50": ordered[int(0.50 * (len(ordered) - 1))],
+                    "p95": ordered[int(0.95 * (len(ordered) - 1))],
+                    "max": ordered[-1],
+                }
+        return summary
+
+    def log(self) -> None:
+        """Log the summary, one line per call."""
+        for call, stats in sorted(self.summary().items()):
+            logging.info(
+                f"{call}: {stats['calls']:.0f} calls, {stats['errors']:.0f} errors,"
+                f" {stats['retries']:.0f} retries; p50={stats['p50']*1000:.1f}ms"
+                f" p95={stats['p95']*1000:.1f}ms max={stats['max']*1000:.1f}ms"
+            )
+
+
+class MadDashRestClient:
+    """A JSON REST client with the same `request`/`request_seq` API as RestClient.
+
+    Calls share one pooled `requests.Session`. Idempotent calls are retried
+    on connection errors, timeouts, and 429/502/503/504s. Any call is
+    retried once with a fresh token on a 401.
+
+    With `compress`, large bodies are sent gzipped (`Content-Encoding:
+    gzip`), which the server decompresses.
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        address: str,
+        token_cache: Optional[TokenCache] = None,
+        timeout: float = 5.0,
+        retries: int = 3,
+        backoff: float = 0.25,
+        max_backoff: float = 5.0,
+        pool_size: int = 10,
+        compress: bool = False,
+    ) -> None:
+        self.address = address
+        self.token_cache = token_cache
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.compress = compress
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+
+        self.executor = ThreadPoolExecutor(pool_size)
+        self.stats = LatencyStats()
+
+    def close(self) -> None:
+        """Close the connections and threads."""
+        self.session.close()
+        self.executor.shutdown(wait=False)
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        """Sleep a random ("full jitter") time, up to the exponential backoff."""
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def _send(self, method: str, url: str, args: Dict[str, Any]) -> requests.Response:
+        data, compressed = encode_body(args, self.compress)
+        headers = {}
+        if compressed:
+            headers["Content-Encoding"] = "gzip"
+        if self.token_cache:
+            headers["Authorization"] = f"Bearer {self.token_cache.get()}"
+        response = self.session.request(
+            method, url, data=data, headers=headers, timeout=self.timeout
+        )
+        if response.status_code == 401 and self.token_cache:  # maybe revoked early
+            headers["Authorization"] = f"Bearer {self.token_cache.get(True)}"
+            response = self.session.request(
+                method, url, data=data, headers=headers, timeout=self.timeout
+            )
+        return response
+
+    def request_seq(
+        self, method: str, path: str, args: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """Send request to the REST server, and return the decoded JSON response.
+
+        Raise `requests.exceptions.HTTPError` for an error status.
+        """
+        url = urljoin(self.address, path)
+        retries = self.retries if method in IDEMPOTENT_METHODS else 0
+
+        start = time.time()
+        attempt = 0
+        error = True
+        try:
+            while True:
+                try:
+                    response = self._send(method, url, args if args else {})
+                    if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                        response.raise_for_status()
+                        error = False
+                        return response.json() if response.content else None
+                    logging.debug(f"Retrying {method} {path} ({response.status_code}).")
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt >= retries:
+                        raise
+                    logging.debug(f"Retrying {method} {path} ({e}).")
+                self._sleep_before_retry(attempt)
+                attempt += 1
+        finally:
+            self.stats.record(method, path, time.time() - start, error, attempt)
+
+    async def request(
+        self, method: str, path: str, args: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """Send request to the REST server, asynchronously (see `request_seq`)."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, self.request_seq, method, path, args
+        )
+
+
+_clients: Dict[Tuple[str, str, str], MadDashRestClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(
+    address: str, token_url: str, scope: str, **kwargs: Any
+) -> MadDashRestClient:
+    """Return the shared client for the server, token service, and scope.
+
+    `kwargs` (see `MadDashRestClient`) only apply when the client is created.
+    """
+    with _clients_lock:
+        key = (address, token_url, scope)
+        if key not in _clients:
+            _clients[key] = MadDashRestClient(
+                address, TokenCache(token_url, scope), **kwargs
+            )
+        return _clients[key]
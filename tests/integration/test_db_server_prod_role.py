@@ -3,6 +3,8 @@
 # pylint: disable=redefined-outer-name
 
 import copy
+import json
+import threading
 import uuid
 from typing import Any, Dict, List
 
@@ -244,3 +246,132 @@ class TestDBServerProdRole:
         assert_get(sorted(set(files) | set(new_files)))  # set-add files
 
         db_rc.close()
+
+    @staticmethod
+    def test_events(db_rc: RestClient) -> None:
+        """Test that a POST publishes a change event."""
+        collection_name = f"TEST-{uuid.uuid4().hex}"
+        histo = TestDBServerProdRole._create_new_histograms()[0]
+        events = []
+
+        token_json = requests.get(
+            "http://localhost:8888/token?scope=maddash:web"
+        ).json()
+
+        def listen() -> None:
+            resp = requests.get(
+                "http://localhost:8080/events",
+                params={"database": "test_histograms", "collection": collection_name},
+                headers={"Authorization": f"Bearer {token_json['access']}"},
+                stream=True,
+                timeout=20,
+            )
+            for raw in resp.iter_lines():
+                line = raw.decode()
+                if line.startswith("data:"):
+                    events.append(json.loads(line[len("data:") :]))
+                    break
+            resp.close()
+
+        listener = threading.Thread(target=listen)
+        listener.start()
+
+        post_body = {
+            "database": "test_histograms",
+            "collection": collection_name,
+            "histogram": histo,
+        }
+        for _ in range(10):  # the listener may not be subscribed yet
+            if events:
+                break
+            db_rc.request_seq("POST", "/histogram", post_body)
+            post_body["update"] = True
+            listener.join(timeout=1)
+        listener.join(timeout=20)
+
+        assert events
+        assert events[0]["database"] == "test_histograms"
+        assert events[0]["collection"] == collection_name
+        assert events[0]["name"] == histo["name"]
+        assert events[0]["version"] >= 1
+
+        db_rc.close()
+
+    @staticmethod
+    def test_delta(db_rc: RestClient) -> None:
+        """Test incrementing a histogram by a sparse delta."""
+        collection_name = f"TEST-{uuid.uuid4().hex}"
+        histo = TestDBServerProdRole._create_new_histograms()[0]
+        n_bins = len(histo["bin_values"])
+
+        def post_delta(name: str, indices: List[int], values: List[int]) -> Any:
+            body = {
+                "database": "test_histograms",
+                "collection": collection_name,
+                "name": name,
+                "indices": indices,
+                "values": values,
+                "overflow": 1,
+            }
+            return db_rc.request_seq("POST", "/histogram/delta", body)
+
+        def assert_rejected(name: str, indices: List[int], values: List[int]) -> None:
+            with pytest.raises(requests.exceptions.HTTPError) as e:
+                post_delta(name, indices, values)
+            assert e.value.response.status_code == 400  # Bad Request
+
+        def get_histo() -> Any:
+            get_body = {
+                "database": "test_histograms",
+                "collection": collection_name,
+                "name": histo["name"],
+            }
+            return db_rc.request_seq("GET", "/histogram", get_body)
+
+        # POST the histogram
+        post_body = {
+            "database": "test_histograms",
+            "collection": collection_name,
+            "histogram": histo,
+        }
+        db_rc.request_seq("POST", "/histogram", post_body)
+
+        # 1. in-range delta
+        post_resp = post_delta(histo["name"], [0, n_bins - 1], [2, 3])
+        assert post_resp["updated"]
+        assert post_resp["history_length"] == 2
+        histo["bin_values"][0] += 2
+        histo["bin_values"][n_bins - 1] += 3
+        histo["overflow"] += 1
+        get_resp = get_histo()
+        assert get_resp["histogram"] == histo
+        assert len(get_resp["history"]) == 2
+
+        # 2. out-of-range index, with an in-range one that mustn't be incremented
+        assert_rejected(histo["name"], [0, n_bins], [1, 1])
+        # 3. negative & duplicate indices
+        assert_rejected(histo["name"], [-1], [1])
+        assert_rejected(histo["name"], [1, 1], [1, 1])
+        # 4. mismatched lengths
+        assert_rejected(histo["name"], [0, 1], [1])
+
+        get_resp = get_histo()
+        assert get_resp["histogram"] == histo  # nothing was partially incremented
+        assert len(get_resp["history"]) == 2
+
+        # 5. missing histogram, and the filelist (which isn't a histogram)
+        assert_rejected(f"missing_{uuid.uuid4().hex}", [0], [1])
+        files_body = {
+            "database": "test_histograms",
+            "collection": collection_name,
+            "files": ["a.i3"],
+        }
+        db_rc.request_seq("POST", "/files/names", files_body)
+        assert_rejected("filelist", [0], [1])
+        assert_rejected("filelist", [], [])
+        get_body = {"database": "test_histograms", "collection": collection_name}
+        get_resp = db_rc.request_seq("GET", "/files/names", get_body)
+        assert get_resp["files"] == ["a.i3"]
+        assert len(get_resp["history"]) == 1
+
+        db_rc.close()
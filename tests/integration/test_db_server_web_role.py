@@ -80,3 +80,26 @@ class TestDBServerWebRole:
             assert e.response.status_code == 403  # Forbidden Error
 
         db_rc.close()
+
+    @staticmethod
+    def test_metrics(db_rc: RestClient) -> None:
+        """Test the metrics route."""
+        db_rc.request_seq("GET", "/databases/names")
+
+        resp = requests.get("http://localhost:8080/metrics")
+        assert resp.status_code in (401, 403)  # needs a token
+
+        token_json = requests.get(
+            "http://localhost:8888/token?scope=maddash:web"
+        ).json()
+        resp = requests.get(
+            "http://localhost:8080/metrics",
+            headers={"Authorization": f"Bearer {token_json['access']}"},
+        )
+        resp.raise_for_status()
+        assert resp.headers["Content-Type"].startswith("text/plain")
+        assert "# TYPE maddash_requests_total counter" in resp.text
+        assert 'route="/databases/names"' in resp.text
+        assert "maddash_mongo_seconds_count" in resp.text
+
+        db_rc.close()
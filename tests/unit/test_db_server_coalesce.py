@@ -0,0 +1,148 @@
+"""Test db_server/coalesce.py."""
+
+import asyncio
+
+import pytest  # type: ignore
+
+# local imports
+from db_server.coalesce import SingleFlight
+
+
+class TestSingleFlight:
+    """Unit test the SingleFlight class."""
+
+    @staticmethod
+    def test_10() -> None:
+        """Test that concurrent calls with the same key share one call."""
+        n_called = 0
+
+        async def query() -> str:
+            nonlocal n_called
+            n_called += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run() -> None:
+            single_flight = SingleFlight()  # type: SingleFlight[str]
+            results = await asyncio.gather(
+                *[single_flight.do(("route", "a"), query) for _ in range(5)],
+                single_flight.do(("route", "b"), query),
+            )
+
+            assert [r for r, _ in results] == ["result"] * 6
+            assert [coalesced for _, coalesced in results].count(True) == 4
+            assert n_called == 2
+            assert single_flight.calls == 6
+            assert single_flight.coalesced == 4
+            assert not single_flight.inflight
+
+            # nothing is cached
+            await single_flight.do(("route", "a"), query)
+            assert n_called == 3
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_20() -> None:
+        """Test that an exception is raised for every coalesced call."""
+
+        async def query() -> str:
+            await asyncio.sleep(0.01)
+            raise ValueError("bad")
+
+        async def run() -> None:
+            single_flight = SingleFlight()  # type: SingleFlight[str]
+            results = await asyncio.gather(
+                *[single_flight.do("key", query) for _ in range(3)],
+                return_exceptions=True,
+            )
+            assert all(isinstance(r, ValueError) for r in results)
+
+            with pytest.raises(ValueError):
+                await single_flight.do("key", query)
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_30() -> None:
+        """Test that cancelling the first call doesn't cancel the shared one."""
+        n_called = 0
+
+        async def query() -> str:
+            nonlocal n_called
+            n_called += 1
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run() -> None:
+            single_flight = SingleFlight()  # type: SingleFlight[str]
+            leader = asyncio.ensure_future(single_flight.do("key", query))
+            await asyncio.sleep(0)  # let it start the call
+            waiters = [
+                asyncio.ensure_future(single_flight.do("key", query)) for _ in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+
+            results = await asyncio.gather(*waiters)
+            assert results == [("result", True)] * 3
+            assert leader.cancelled()
+            assert n_called == 1
+            assert not single_flight.inflight
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_40() -> None:
+        """Test that a forgotten call isn't shared with later calls."""
+        version = 0
+
+        async def query() -> int:
+            seen = version
+            await asyncio.sleep(0.02)
+            return seen
+
+        async def run() -> None:
+            nonlocal version
+            single_flight = SingleFlight()  # type: SingleFlight[int]
+            before = [
+                asyncio.ensure_future(single_flight.do(("route", "a"), query)),
+                asyncio.ensure_future(single_flight.do(("route", "b"), query)),
+            ]
+            await asyncio.sleep(0.005)  # let them start their calls
+
+            version = 1  # a write, which makes "a" stale
+            assert single_flight.forget(lambda key: key == ("route", "a")) == 1
+            after = [
+                asyncio.ensure_future(single_flight.do(("route", "a"), query)),
+                asyncio.ensure_future(single_flight.do(("route", "b"), query)),
+            ]
+
+            assert await asyncio.gather(*before) == [(0, False), (0, False)]
+            assert await asyncio.gather(*after) == [(1, False), (0, True)]
+            assert not single_flight.inflight
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_50() -> None:
+        """Test that nothing is shared when disabled."""
+        n_called = 0
+
+        async def query() -> str:
+            nonlocal n_called
+            n_called += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run() -> None:
+            single_flight = SingleFlight(enabled=False)  # type: SingleFlight[str]
+            results = await asyncio.gather(
+                *[single_flight.do("key", query) for _ in range(3)]
+            )
+            assert results == [("result", False)] * 3
+            assert n_called == 3
+            assert single_flight.calls == 3
+            assert not single_flight.inflight
+
+        asyncio.run(run())
@@ -0,0 +1,37 @@
+"""Test db_server/compression.py."""
+
+import gzip
+
+import pytest  # type: ignore
+
+# local imports
+from db_server.compression import BodyTooLargeError, decompress_body
+
+
+class TestDecompressBody:
+    """Unit test decompress_body()."""
+
+    @staticmethod
+    def test_10() -> None:
+        """Test decompressing gzipped and plain bodies."""
+        body = b'{"files": ["/data/sim/IceCube/2020/file.i3.zst"]}' * 100
+        assert decompress_body(gzip.compress(body), "gzip", len(body)) == body
+        assert decompress_body(gzip.compress(body), " GZIP ", len(body)) == body
+        assert decompress_body(body, "", 10) == body  # not compressed: no guard
+        assert decompress_body(body, "identity", 10) == body
+
+    @staticmethod
+    def test_20() -> None:
+        """Test that oversized, invalid, and unsupported bodies are rejected."""
+        bomb = gzip.compress(b"0" * 10 ** 6)
+        with pytest.raises(BodyTooLargeError):
+            decompress_body(bomb, "gzip", 10 ** 6 - 1)
+
+        body = gzip.compress(b'{"a": 1}')
+        for bad, encoding in [
+            (b'{"a": 1}', "gzip"),  # not gzipped
+            (body[:-4], "gzip"),  # truncated
+            (body, "br"),
+        ]:
+            with pytest.raises(ValueError):
+                decompress_body(bad, encoding, 100)
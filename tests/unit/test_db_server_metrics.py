@@ -0,0 +1,97 @@
+"""Test db_server/metrics.py."""
+
+import asyncio
+import time
+from typing import List
+
+# local imports
+from db_server.metrics import CachedGauges, Gauges, Histogram, Metrics
+
+
+class TestMetrics:
+    """Unit test the Metrics, Histogram, and CachedGauges classes."""
+
+    @staticmethod
+    def test_10() -> None:
+        """Test Histogram buckets are cumulative."""
+        histogram = Histogram(buckets=[1.0, 2.0])
+        for value in [0.5, 1.0, 1.5, 3.0]:
+            histogram.observe(value)
+
+        lines = histogram.render("h", (("route", "/r"),))
+        assert lines == [
+            'h_bucket{route="/r",le="1.0"} 2',
+            'h_bucket{route="/r",le="2.0"} 3',
+            'h_bucket{route="/r",le="+Inf"} 4',
+            'h_sum{route="/r"} 6.0',
+            'h_count{route="/r"} 4',
+        ]
+
+    @staticmethod
+    def test_20() -> None:
+        """Test render() of requests and gauges."""
+        metrics = Metrics()
+        metrics.observe_request("/histogram", "GET", 200, 0.003, 0, 512)
+        metrics.observe_request("/histogram", "GET", 200, 0.004, 0, 512)
+        metrics.observe_request("/histogram", "POST", 409, 0.1, 64, 0)
+
+        text = metrics.render(
+            {
+                (
+                    "maddash_collection_documents",
+                    (("database", "d"), ("collection", "c")),
+                ): 7
+            }
+        )
+
+        assert "# TYPE maddash_requests_total counter" in text
+        assert (
+            'maddash_requests_total{route="/histogram",method="GET",status="200"} 2'
+            in text
+        )
+        assert (
+            'maddash_requests_total{route="/histogram",method="POST",status="409"} 1'
+            in text
+        )
+        assert (
+            'maddash_response_bytes_total{route="/histogram",method="GET"} 1024' in text
+        )
+        assert (
+            'maddash_request_seconds_count{route="/histogram",method="GET"} 2' in text
+        )
+        assert "# TYPE maddash_collection_documents gauge" in text
+        assert 'maddash_collection_documents{database="d",collection="c"} 7' in text
+
+    @staticmethod
+    def test_30() -> None:
+        """Test that label values are escaped."""
+        metrics = Metrics()
+        metrics.inc("c", (("collection", 'a\\b"c\nd'),))
+
+        text = metrics.render({})
+        assert 'c{collection="a\\\\b\\"c\\nd"} 1' in text.splitlines()
+
+    @staticmethod
+    def test_40() -> None:
+        """Test that CachedGauges are re-read only after their TTL."""
+        reads: List[int] = []
+
+        async def read() -> Gauges:
+            reads.append(len(reads))
+            await asyncio.sleep(0.01)
+            return {("g", ()): len(reads)}
+
+        async def test() -> None:
+            gauges = CachedGauges(ttl=0.1)
+
+            # concurrent reads share one refresh
+            results = await asyncio.gather(*[gauges.get(read) for _ in range(5)])
+            assert results == [{("g", ()): 1}] * 5
+            assert await gauges.get(read) == {("g", ()): 1}
+            assert len(reads) == 1
+
+            time.sleep(0.1)
+            assert await gauges.get(read) == {("g", ()): 2}
+            assert len(reads) == 2
+
+        asyncio.run(test())
@@ -0,0 +1,84 @@
+"""Test db_server/notifications.py."""
+
+import asyncio
+
+# local imports
+from db_server.notifications import ChangeNotifier, matches
+
+
+class TestChangeNotifier:
+    """Unit test the ChangeNotifier class."""
+
+    @staticmethod
+    def test_10() -> None:
+        """Test publish/subscribe fan out."""
+
+        async def run() -> None:
+            notifier = ChangeNotifier()
+            queue_1 = notifier.subscribe()
+            queue_2 = notifier.subscribe()
+
+            notifier.notify_write("db", "coll", "histo", 2)
+
+            for queue in [queue_1, queue_2]:
+                event = queue.get_nowait()
+                assert event == {
+                    "database": "db",
+                    "collection": "coll",
+                    "name": "histo",
+                    "version": 2,
+                }
+
+            notifier.unsubscribe(queue_1)
+            notifier.notify_write("db", "coll", "histo", 3)
+            assert queue_1.empty()
+            assert queue_2.get_nowait()["version"] == 3
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_20() -> None:
+        """Test that a full queue drops its oldest events."""
+
+        async def run() -> None:
+            notifier = ChangeNotifier(max_queue_size=2)
+            queue = notifier.subscribe()
+            for version in range(5):
+                notifier.publish("db", "coll", "histo", version)
+
+            assert queue.get_nowait()["version"] == 3
+            assert queue.get_nowait()["version"] == 4
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_30() -> None:
+        """Test that writes aren't double-published with change streams."""
+
+        async def run() -> None:
+            notifier = ChangeNotifier()
+            notifier.from_change_streams = True
+            queue = notifier.subscribe()
+
+            notifier.notify_write("db", "coll", "histo", 1)
+            assert queue.empty()
+
+            notifier._publish_change(  # pylint: disable=W0212
+                {
+                    "ns": {"db": "db", "coll": "coll"},
+                    "fullDocument": {"name": "histo", "history": [1.0, 2.0]},
+                }
+            )
+            assert queue.get_nowait()["version"] == 2
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_40() -> None:
+        """Test matches()."""
+        event = {"database": "db", "collection": "coll", "name": "h", "version": 1}
+        assert matches(event, None, None)
+        assert matches(event, "db", None)
+        assert matches(event, "db", "coll")
+        assert not matches(event, "other", None)
+        assert not matches(event, "db", "other")
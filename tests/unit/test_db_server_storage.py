@@ -0,0 +1,138 @@
+"""Test db_server/storage.py."""
+
+import asyncio
+from typing import Dict, List, Tuple, Union
+
+import pytest  # type: ignore
+
+# local imports
+from db_server.config import check_config, EXPECTED_CONFIG
+from db_server.storage import create_storage, InMemoryStorage
+
+
+class TestInMemoryStorage:
+    """Unit test the InMemoryStorage class."""
+
+    HISTOGRAM = {
+        "name": "PrimaryEnergy",
+        "xmax": 10.0,
+        "xmin": 0.0,
+        "overflow": 0,
+        "underflow": 0,
+        "nan_count": 0,
+        "bin_values": [1, 2, 3],
+        "history": [1.0],
+    }
+
+    @staticmethod
+    def test_10() -> None:
+        """Test upsert(), find_one(), and find_all()."""
+
+        async def run() -> None:
+            storage = create_storage("memory", "")
+            assert isinstance(storage, InMemoryStorage)
+
+            assert await storage.get_database_names() == []
+            assert await storage.find_one("db", "coll", "PrimaryEnergy") is None
+            assert await storage.find_all("db", "coll") == []
+
+            histo = dict(TestInMemoryStorage.HISTOGRAM)
+            assert await storage.upsert("db", "coll", [histo])
+            assert await storage.get_database_names() == ["db"]
+            assert await storage.get_collection_names("db") == ["coll"]
+            assert await storage.find_one("db", "coll", "PrimaryEnergy") == histo
+
+            # stored state is copied
+            found = await storage.find_one("db", "coll", "PrimaryEnergy")
+            found["bin_values"].append(4)  # type: ignore
+            assert await storage.find_one("db", "coll", "PrimaryEnergy") == histo
+
+            # replace by name
+            histo_2 = dict(histo, bin_values=[4, 5, 6])
+            await storage.upsert("db", "coll", [histo_2])
+            assert await storage.find_all("db", "coll") == [histo_2]
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_20() -> None:
+        """Test filelist and histogram helpers."""
+
+        async def run() -> None:
+            storage = InMemoryStorage()
+            await storage.upsert("db", "coll", [TestInMemoryStorage.HISTOGRAM])
+            await storage.put_filelist("db", "coll", ["a.i3", "b.i3"], [1.0])
+
+            filelist = await storage.get_filelist("db", "coll")
+            assert filelist == {
+                "name": "filelist",
+                "files": ["a.i3", "b.i3"],
+                "history": [1.0],
+            }
+
+            histos = await storage.get_mongo_histograms_in_collection("db", "coll")
+            assert histos == [TestInMemoryStorage.HISTOGRAM]
+
+            sizes = await storage.get_collection_sizes()
+            assert sizes[("db", "coll")]["documents"] == 2
+            assert sizes[("db", "coll")]["bytes"] > 0
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_30() -> None:
+        """Test increment_histogram()."""
+
+        async def run() -> None:
+            storage = InMemoryStorage()
+            await storage.upsert("db", "coll", [TestInMemoryStorage.HISTOGRAM])
+            await storage.put_filelist("db", "coll", ["a.i3"], [1.0])
+
+            length = await storage.increment_histogram(
+                "db", "coll", "PrimaryEnergy", {0: 5, 2: -1}, {"nan_count": 2}, 2.0
+            )
+            assert length == 2
+            histo = await storage.find_one("db", "coll", "PrimaryEnergy")
+            assert histo["bin_values"] == [6, 2, 2]  # type: ignore
+            assert histo["nan_count"] == 2  # type: ignore
+            assert histo["history"] == [1.0, 2.0]  # type: ignore
+
+            # not found, or out of range
+            bad: List[Tuple[str, Dict[int, Union[int, float]]]] = [
+                ("Nope", {0: 1}),
+                ("filelist", {}),
+                ("PrimaryEnergy", {3: 1}),
+            ]
+            for name, bins in bad:
+                assert (
+                    await storage.increment_histogram("db", "coll", name, bins, {}, 3.0)
+                    is None
+                )
+            histo = await storage.find_one("db", "coll", "PrimaryEnergy")
+            assert histo["history"] == [1.0, 2.0]  # type: ignore
+
+        asyncio.run(run())
+
+    @staticmethod
+    def test_40() -> None:
+        """Test that multiple workers can't share the in-memory store."""
+        config = {**EXPECTED_CONFIG, "MAD_DASH_STORAGE_BACKEND": "memory"}
+        check_config(config)
+        for workers in ["0", "4"]:
+            with pytest.raises(RuntimeError, match="MAD_DASH_REST_WORKERS=1"):
+                check_config({**config, "MAD_DASH_REST_WORKERS": workers})
+
+        check_config({**EXPECTED_CONFIG, "MAD_DASH_REST_WORKERS": "4"})
+
+    @staticmethod
+    def test_50() -> None:
+        """Test that insert() doesn't replace an existing document."""
+
+        async def run() -> None:
+            storage = InMemoryStorage()
+            histo = TestInMemoryStorage.HISTOGRAM
+            assert await storage.insert("db", "coll", histo)
+            assert not await storage.insert("db", "coll", dict(histo, bin_values=[0]))
+            assert await storage.find_all("db", "coll") == [histo]
+
+        asyncio.run(run())
@@ -1,13 +1,55 @@
 """Test production client."""
 
+import asyncio
 import copy
+import io
 import os
 import pickle
-from typing import Any, Dict
+import tarfile
+import tempfile
+import zipfile
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import numpy as np  # type: ignore
+import pytest
 
 # local imports
-from api import MongoCollection
-from production_client import ingest_pickled_collections
+from api import I3Histogram, MongoCollection
+from production_client import (
+    archives,
+    benchmark,
+    columnar,
+    convert_pickles,
+    ingest_pickled_collections,
+    routing,
+    shards,
+    validation,
+)
+from production_client.manifest import Manifest
+
+
+class FakeRestClient:
+    """Record the requests, and the most that were in flight at once."""
+
+    def __init__(self) -> None:
+        self.requests = []  # type: List[Tuple[str, str, Dict[str, Any]]]
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def request(self, method: str, path: str, args: Dict[str, Any]) -> Any:
+        """Fake RestClient.request()."""
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.requests.append((method, path, args))
+        self.in_flight -= 1
+        return {}
+
+
+async def aiter(items: List[Any]) -> AsyncIterator[Any]:
+    """Yield each of items, asynchronously."""
+    for item in items:
+        yield item
 
 
 class TestIngestPickledCollections:
@@ -88,3 +130,814 @@ class TestIngestPickledCollections:
         collection_name = "TEST_30_COLLECTION"
         filelist = ingest_pickled_collections.get_filelist(collection, collection_name)
         assert filelist == collection["filelist"]["files"]  # type: ignore
+
+    @staticmethod
+    def test_40() -> None:
+        """Test ingest() with concurrency."""
+        collections = [
+            ingest_pickled_collections.LoadedCollection(
+                copy.deepcopy(TestIngestPickledCollections.COLLECTION),
+                f"TEST_40_{i}",
+                f"digest-{i}",
+                [],
+            )
+            for i in range(5)
+        ]
+        rc = FakeRestClient()
+
+        stats = asyncio.run(
+            ingest_pickled_collections.ingest(
+                rc, aiter(collections), "test_db", concurrency=3  # type: ignore
+            )
+        )
+
+        assert stats.histograms == 10
+        assert stats.filelists == 5
+        assert 1 < rc.max_in_flight <= 3
+        # each filelist is POSTed after all of its collection's histograms
+        for loaded in collections:
+            paths = [p for _, p, a in rc.requests if a["collection"] == loaded.name]
+            assert paths == ["/histogram", "/histogram", "/files/names"]
+
+    @staticmethod
+    def test_50() -> None:
+        """Test compact_histogram() and expand_histogram()."""
+        collection = copy.deepcopy(TestIngestPickledCollections.COLLECTION)
+        histo = collection["LineFitEnergy"]
+
+        ingest_pickled_collections.compact_histogram(histo)  # type: ignore
+        assert isinstance(histo["bin_values"], np.ndarray)
+
+        expanded = ingest_pickled_collections.expand_histogram(histo)  # type: ignore
+        assert expanded == TestIngestPickledCollections.COLLECTION["LineFitEnergy"]
+        assert isinstance(expanded["bin_values"][0], int)
+
+        # non-numeric bin_values are left alone
+        histo = {"name": "bad", "bin_values": ["a", "b"]}
+        ingest_pickled_collections.compact_histogram(histo)  # type: ignore
+        assert histo["bin_values"] == ["a", "b"]
+
+    @staticmethod
+    def test_60() -> None:
+        """Test load_each_collection()."""
+        collection_dict = TestIngestPickledCollections.COLLECTION
+        filenames = [
+            TestIngestPickledCollections.make_pickle(f"TEST_60_{i}", collection_dict)
+            for i in range(5)
+        ]
+
+        async def load(workers: int) -> List[Any]:
+            loader = ingest_pickled_collections.load_each_collection(
+                filenames, workers=workers, prefetch=2
+            )
+            return [c async for c in loader]
+
+        for workers in [0, 2]:
+            loaded = asyncio.run(load(workers))
+            assert [c.name for c in loaded] == [f"TEST_60_{i}" for i in range(5)]
+            for collection in loaded:
+                for histo in collection.collection.values():
+                    histo = ingest_pickled_collections.expand_histogram(histo)
+                    assert histo == collection_dict[histo.get("name", "filelist")]
+
+        for filename in filenames:
+            TestIngestPickledCollections.delete_pickle(filename)
+
+    @staticmethod
+    def test_70() -> None:
+        """Test get_all_pickles()."""
+        with tempfile.TemporaryDirectory() as root:
+            for path in [
+                "a/one.pkl",
+                "a/b/two.pkl",
+                "a/b/c/three.pkl",
+                "a/b/notes.txt",
+                "four.pkl",
+            ]:
+                os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+                open(os.path.join(root, path), "w").close()
+
+            def get(*args: Any, **kwargs: Any) -> List[str]:
+                pickles = ingest_pickled_collections.get_all_pickles(*args, **kwargs)
+                return sorted(os.path.relpath(p, root) for p in pickles)
+
+            assert get([root], recurse=True) == [
+                "a/b/c/three.pkl",
+                "a/b/two.pkl",
+                "a/one.pkl",
+                "four.pkl",
+            ]
+            assert get([root], recurse=True, include=["t*"]) == [
+                "a/b/c/three.pkl",
+                "a/b/two.pkl",
+            ]
+            assert get([root], recurse=True, include_regex=r"/b/") == [
+                "a/b/c/three.pkl",
+                "a/b/two.pkl",
+            ]
+            assert get([os.path.join(root, "four.pkl")]) == ["four.pkl"]
+
+            # it's a generator, so the error is raised on iterating
+            pickles = ingest_pickled_collections.get_all_pickles([root])
+            with pytest.raises(RuntimeError):
+                next(pickles)
+
+    @staticmethod
+    def test_80() -> None:
+        """Test resuming an ingest with a Manifest."""
+        collection_name = "TEST_80_COLLECTION"
+        filename = TestIngestPickledCollections.make_pickle(
+            collection_name, TestIngestPickledCollections.COLLECTION
+        )
+
+        class FailingRestClient(FakeRestClient):
+            """Fail the filelist POST."""
+
+            async def request(
+                self, method: str, path: str, args: Dict[str, Any]
+            ) -> Any:
+                if path == "/files/names":
+                    raise RuntimeError("server went away")
+                return await super().request(method, path, args)
+
+        async def ingest(rc: Any, manifest: Manifest) -> Any:
+            pickles = manifest.pending("test_db", [filename])
+            return await ingest_pickled_collections.ingest(
+                rc,
+                ingest_pickled_collections.load_each_collection(pickles, workers=0),
+                "test_db",
+                manifest=manifest,
+            )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Manifest(os.path.join(tmp, "manifest.sqlite"))
+
+            # the histograms get through, then it dies
+            rc = FailingRestClient()  # type: FakeRestClient
+            with pytest.raises(RuntimeError):
+                asyncio.run(ingest(rc, manifest))
+            assert len(rc.requests) == 2
+            assert not manifest.is_done("test_db", filename)
+
+            # resume: only the filelist is left
+            rc = FakeRestClient()
+            stats = asyncio.run(ingest(rc, manifest))
+            assert [p for _, p, _ in rc.requests] == ["/files/names"]
+            assert stats.skipped == 2
+            assert manifest.is_done("test_db", filename)
+
+            # nothing left
+            rc = FakeRestClient()
+            asyncio.run(ingest(rc, manifest))
+            assert not rc.requests
+
+            # but, a re-written pickle is ingested again
+            TestIngestPickledCollections.make_pickle(
+                collection_name, {"filelist": {"files": ["new.i3.zst"]}}
+            )
+            os.utime(filename, ns=(0, 0))
+            rc = FakeRestClient()
+            asyncio.run(ingest(rc, manifest))
+            assert [p for _, p, _ in rc.requests] == ["/files/names"]
+
+            manifest.close()
+
+        TestIngestPickledCollections.delete_pickle(filename)
+
+    @staticmethod
+    def test_90() -> None:
+        """Test aggregate_each_collection()."""
+        collection_dict = TestIngestPickledCollections.COLLECTION
+
+        with tempfile.TemporaryDirectory() as root:
+            pickles = []
+            for i in range(3):
+                collection = copy.deepcopy(collection_dict)
+                collection["LineFitEnergy"]["bin_values"][i] = 1  # type: ignore
+                collection["LineFitEnergy"]["nan_count"] = 1  # type: ignore
+                collection["filelist"]["files"] = [f"job_{i}.i3.zst"]  # type: ignore
+                os.makedirs(os.path.join(root, f"job_{i}"))
+                for name, dict_ in [
+                    ("TEST_90", collection),
+                    ("OTHER", collection_dict),
+                ]:
+                    pickles.append(os.path.join(root, f"job_{i}", f"{name}.pkl"))
+                    with open(pickles[-1], "wb") as f:
+                        pickle.dump(dict_, f)
+
+            async def aggregate() -> List[Any]:
+                loader = ingest_pickled_collections.aggregate_each_collection(
+                    pickles, workers=0
+                )
+                return [c async for c in loader]
+
+            aggregated = {c.name: c for c in asyncio.run(aggregate())}
+
+        assert sorted(aggregated) == ["OTHER", "TEST_90"]
+        assert len(aggregated["TEST_90"].files) == 3
+
+        merged = aggregated["TEST_90"].collection
+        histo = ingest_pickled_collections.expand_histogram(merged["LineFitEnergy"])
+        assert histo["bin_values"][:4] == [1, 1, 1, 0]
+        assert histo["nan_count"] == 3
+        assert merged["filelist"]["files"] == [
+            "job_0.i3.zst",
+            "job_1.i3.zst",
+            "job_2.i3.zst",
+        ]
+
+        other = aggregated["OTHER"].collection
+        histo = ingest_pickled_collections.expand_histogram(other["LineFitEnergy"])
+        assert histo["nan_count"] == 3 * collection_dict["LineFitEnergy"]["nan_count"]
+
+    @staticmethod
+    def test_100() -> None:
+        """Test delta ingestion (compute_delta() & ingest(delta=True))."""
+        collection_name = "TEST_100_COLLECTION"
+        collection = copy.deepcopy(TestIngestPickledCollections.COLLECTION)
+        histo = collection["LineFitEnergy"]
+
+        async def ingest(rc: Any, manifest: Manifest) -> Any:
+            filename = TestIngestPickledCollections.make_pickle(
+                collection_name, collection
+            )
+            stats = await ingest_pickled_collections.ingest(
+                rc,
+                ingest_pickled_collections.load_each_collection([filename], workers=0),
+                "test_db",
+                update=True,
+                manifest=manifest,
+                delta=True,
+            )
+            TestIngestPickledCollections.delete_pickle(filename)
+            return stats
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Manifest(os.path.join(tmp, "manifest.sqlite"))
+
+            # first time: the whole histogram
+            rc = FakeRestClient()  # type: Any
+            asyncio.run(ingest(rc, manifest))
+            assert [p for _, p, _ in rc.requests] == ["/histogram"] * 2 + [
+                "/files/names"
+            ]
+
+            # then, only the changed bins & counters
+            histo["bin_values"][3] += 5  # type: ignore
+            histo["bin_values"][7] += 1  # type: ignore
+            histo["nan_count"] += 2  # type: ignore
+            rc = FakeRestClient()
+            stats = asyncio.run(ingest(rc, manifest))
+            assert [p for _, p, _ in rc.requests] == [
+                "/histogram/delta",
+                "/files/names",
+            ]
+            _, _, args = rc.requests[0]
+            assert args["indices"] == [3, 7]
+            assert args["values"] == [5, 1]
+            assert args["nan_count"] == 2
+            assert "overflow" not in args
+            assert stats.delta_bins == 2
+            assert stats.unchanged == 1
+
+            # nothing changed
+            collection["filelist"]["files"] = ["another.i3.zst"]  # type: ignore
+            rc = FakeRestClient()
+            stats = asyncio.run(ingest(rc, manifest))
+            assert [p for _, p, _ in rc.requests] == ["/files/names"]
+            assert stats.unchanged == 2
+
+            manifest.close()
+
+        # a histogram that was re-binned can't be a delta
+        state = (np.zeros(3), {c: 0 for c in ingest_pickled_collections.COUNTERS})
+        with pytest.raises(ValueError):
+            ingest_pickled_collections.compute_delta(histo, state)  # type: ignore
+
+    @staticmethod
+    def test_110() -> None:
+        """Test converting a pickle to a shard, and ingesting from it."""
+        collection_name = "TEST_110_COLLECTION"
+        filename = TestIngestPickledCollections.make_pickle(
+            collection_name, TestIngestPickledCollections.COLLECTION
+        )
+
+        async def ingest(path: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+            rc = FakeRestClient()  # type: Any
+            await ingest_pickled_collections.ingest(
+                rc,
+                ingest_pickled_collections.load_each_collection([path], workers=1),
+                "test_db",
+            )
+            return sorted(rc.requests, key=lambda r: str(r[2].get("histogram")))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = convert_pickles.convert(filename, "shard", tmp)
+            assert path == os.path.join(tmp, f"{collection_name}.shard")
+
+            shard = shards.ShardCollection(path)
+            assert sorted(shard) == sorted(TestIngestPickledCollections.COLLECTION)
+            assert (
+                shard["filelist"] == TestIngestPickledCollections.COLLECTION["filelist"]
+            )
+            loaded = ingest_pickled_collections.load_collection(filename)
+            assert shard.digest == loaded.digest
+
+            # same requests, whether from the pickle or the shard
+            assert asyncio.run(ingest(path)) == asyncio.run(ingest(filename))
+
+            # an incomplete shard
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path, "wb") as g:
+                g.write(data[:-1])
+            with pytest.raises(ValueError):
+                shards.ShardCollection(path)
+
+        TestIngestPickledCollections.delete_pickle(filename)
+
+    @staticmethod
+    def test_120() -> None:
+        """Test a dry run's stage timings, and its validation."""
+        collection_name = "TEST_120_COLLECTION"
+        filename = TestIngestPickledCollections.make_pickle(
+            collection_name, TestIngestPickledCollections.COLLECTION
+        )
+
+        timer = benchmark.StageTimer()
+        rc = benchmark.BenchmarkRestClient(timer)
+        pickles = benchmark.timed_iter([filename], timer, "discover")
+        collections = ingest_pickled_collections.load_each_collection(
+            pickles, workers=0
+        )
+        asyncio.run(
+            ingest_pickled_collections.ingest(
+                rc,  # type: ignore
+                benchmark.timed_load(collections, timer),
+                "test_db",
+            )
+        )
+        size = os.path.getsize(filename)
+        TestIngestPickledCollections.delete_pickle(filename)
+
+        assert timer.histograms == 2
+        assert timer.calls["discover"] == 2  # the pickle, then the end
+        assert timer.calls["validate"] == timer.calls["encode"] == 3
+        assert not timer.calls["send"]
+        assert timer.input_bytes == size
+        assert timer.encoded_bytes > 0
+        assert benchmark.get_peak_rss()[0] > 0
+
+        # an invalid histogram fails, like it would on the server
+        histo = copy.deepcopy(TestIngestPickledCollections.COLLECTION["LineFitEnergy"])
+        histo["overflow"] = 1.5  # type: ignore
+        with pytest.raises(TypeError):
+            asyncio.run(rc.request("POST", "/histogram", {"histogram": histo}))
+
+    @staticmethod
+    def test_130() -> None:
+        """Test converting a pickle to a columnar collection, and ingesting it."""
+        collection_name = "TEST_130_COLLECTION"
+        collection = copy.deepcopy(TestIngestPickledCollections.COLLECTION)
+        collection["OnlineL2_SplineMPESpeed"]["bin_values"] = [0.5, 1.5, 0, 0, 2]
+        filename = TestIngestPickledCollections.make_pickle(collection_name, collection)
+
+        async def ingest(path: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+            rc = FakeRestClient()  # type: Any
+            await ingest_pickled_collections.ingest(
+                rc,
+                ingest_pickled_collections.load_each_collection([path], workers=1),
+                "test_db",
+            )
+            return sorted(rc.requests, key=lambda r: str(r[2].get("histogram")))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = convert_pickles.convert(filename, "columnar", tmp)
+            assert path == os.path.join(tmp, f"{collection_name}.mdcol")
+
+            loaded = ingest_pickled_collections.load_collection(path)
+            assert (
+                loaded.digest
+                == ingest_pickled_collections.load_collection(filename).digest
+            )
+            bins = loaded.collection["LineFitEnergy"]["bin_values"]
+            assert isinstance(bins, np.memmap)
+            assert bins.dtype == np.int64
+            assert not bins.flags.writeable
+
+            # same requests (and bin types), whether from the pickle or not
+            from_columnar, from_pickle = asyncio.run(ingest(path)), asyncio.run(
+                ingest(filename)
+            )
+            assert from_columnar == from_pickle
+            histos = {
+                args["histogram"]["name"]: args["histogram"]
+                for _, _, args in from_columnar
+                if "histogram" in args
+            }
+            assert all(type(b) is int for b in histos["LineFitEnergy"]["bin_values"])
+            assert histos["OnlineL2_SplineMPESpeed"]["bin_values"][:2] == [0.5, 1.5]
+
+            # not a columnar collection
+            with pytest.raises(ValueError):
+                columnar.ColumnarCollection(filename)
+
+        # written directly by a job (no digest given)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "JOB.mdcol")
+            columnar.write_columnar(collection, path)
+            written = columnar.ColumnarCollection(path)
+            assert written.digest
+            assert written["filelist"] == collection["filelist"]
+            assert list(written["OnlineL2_SplineMPESpeed"]["bin_values"]) == [
+                0.5,
+                1.5,
+                0,
+                0,
+                2,
+            ]
+
+        TestIngestPickledCollections.delete_pickle(filename)
+
+    @staticmethod
+    def test_140() -> None:
+        """Test finding and loading pickles in tar/zip archives."""
+        collection_dict = TestIngestPickledCollections.COLLECTION
+        data = pickle.dumps(collection_dict)
+
+        with tempfile.TemporaryDirectory() as root:
+            tar_path = os.path.join(root, "run.tar.gz")
+            with tarfile.open(tar_path, "w:gz") as tar:
+                for member in ["job_0/A.pkl", "job_0/log.txt", "job_1/B.pkl"]:
+                    info = tarfile.TarInfo(member)
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            zip_path = os.path.join(root, "more", "run.zip")
+            os.makedirs(os.path.dirname(zip_path))
+            with zipfile.ZipFile(zip_path, "w") as zf:
+                zf.writestr("C.pkl", data)
+                zf.writestr("D.pkl", data)
+
+            pickles = list(ingest_pickled_collections.get_all_pickles([root], True))
+            assert sorted(pickles) == [
+                f"{zip_path}/C.pkl",
+                f"{zip_path}/D.pkl",
+                f"{tar_path}/job_0/A.pkl",
+                f"{tar_path}/job_1/B.pkl",
+            ]
+            assert list(
+                ingest_pickled_collections.get_all_pickles([tar_path], include=["B*"])
+            ) == [f"{tar_path}/job_1/B.pkl"]
+
+            async def load(workers: int) -> List[Any]:
+                loader = ingest_pickled_collections.load_each_collection(
+                    pickles, workers=workers
+                )
+                return [c async for c in loader]
+
+            for workers in [0, 2]:
+                loaded = asyncio.run(load(workers))
+                assert sorted(c.name for c in loaded) == ["A", "B", "C", "D"]
+                for collection in loaded:
+                    histo = ingest_pickled_collections.expand_histogram(
+                        collection.collection["LineFitEnergy"]  # type: ignore
+                    )
+                    assert histo == collection_dict["LineFitEnergy"]
+
+            # out of order, and missing
+            reader = archives.ArchiveReader()
+            assert reader.read(f"{tar_path}/job_1/B.pkl") == data
+            assert reader.read(f"{tar_path}/job_0/A.pkl") == data
+            with pytest.raises(FileNotFoundError):
+                reader.read(f"{tar_path}/job_2/E.pkl")
+            reader.close()
+
+            # the manifest knows an archived pickle by its archive
+            manifest = Manifest(os.path.join(root, "manifest.sqlite"))
+            for pkl in loaded[0].files:
+                manifest.mark_done("test_db", pkl.path, pkl.size, pkl.mtime_ns, "")
+            assert manifest.is_done("test_db", loaded[0].files[0].path)
+            assert not manifest.is_done("test_db", loaded[1].files[0].path)
+            manifest.close()
+
+    @staticmethod
+    def test_150() -> None:
+        """Test routing collections to several databases."""
+        router = routing.Router(
+            [
+                routing.parse_route("/2020/=sim_2020:2"),
+                routing.parse_route("TEST_150=sim_test"),
+                routing.parse_route("/2020/=ignored:5"),
+            ],
+            "test_db",
+            3,
+        )
+        assert router.database_for("/data/2020/TEST_150.pkl") == "sim_2020"
+        assert router.database_for("/data/2021/TEST_150.pkl") == "sim_test"
+        assert router.database_for("/data/2021/other.pkl") == "test_db"
+        assert router.budgets == {
+            "test_db": 3,
+            "sim_2020": 2,
+            "sim_test": 3,
+            "ignored": 5,
+        }
+        assert router.total_concurrency == 13
+        for bad in ["no_database", "=db", "(=db", "x=db:many"]:
+            with pytest.raises(ValueError):
+                routing.parse_route(bad)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for year in ["2020", "2021"]:
+                os.mkdir(os.path.join(tmp, year))
+                path = os.path.join(tmp, year, "TEST_150_COLLECTION.pkl")
+                with open(path, "wb") as f:
+                    pickle.dump(TestIngestPickledCollections.COLLECTION, f)
+                paths.append(path)
+
+            rc = FakeRestClient()  # type: Any
+            router = routing.Router(
+                [routing.parse_route("/2020/=sim_2020:1")], "test_db", 3
+            )
+            stats = asyncio.run(
+                ingest_pickled_collections.ingest(
+                    rc,
+                    ingest_pickled_collections.load_each_collection(paths, workers=1),
+                    "test_db",
+                    max_collections_in_flight=1,
+                    router=router,
+                )
+            )
+
+            assert stats.collections == {"sim_2020": 1, "test_db": 1}
+            databases = [r[2]["database"] for r in rc.requests]
+            assert databases.count("sim_2020") == databases.count("test_db") == 3
+            # the first collection's budget is 1, so only the second's overlap
+            assert 1 < rc.max_in_flight <= 3
+
+            # aggregating keeps the databases' collections apart
+            async def names() -> List[Tuple[str, int]]:
+                return [
+                    (loaded.name, len(loaded.files))
+                    async for loaded in ingest_pickled_collections.aggregate_each_collection(
+                        paths, 1, 1, database_for=router.database_for
+                    )
+                ]
+
+            assert asyncio.run(names()) == [("TEST_150_COLLECTION", 1)] * 2
+
+    @staticmethod
+    def test_160() -> None:
+        """Test validating histograms before POSTing them."""
+        good = TestIngestPickledCollections.COLLECTION["LineFitEnergy"]
+        batch = {
+            "good": {**good, "name": "good"},
+            "array": {**good, "name": "array", "bin_values": np.arange(4.0)},
+            "float_count": {**good, "name": "float_count", "overflow": 3.0},
+            "fraction": {**good, "name": "fraction", "nan_count": 2.5},
+            "history": {**good, "name": "history", "history": [0.0]},
+            "numpy": {
+                **good,
+                "name": "numpy",
+                "xmin": np.int64(0),
+                "bin_values": [np.int64(1), 2],
+            },
+            "mixed": {**good, "name": "mixed", "bin_values": [1, 2.0, "3", None]},
+            "filelist": {**good},
+            "missing": {"name": "missing"},
+        }  # type: Dict[str, Any]
+        batch["filelist"]["name"] = "filelist"
+        original = copy.deepcopy(batch)
+
+        valid, invalid = validation.validate_histograms(batch)
+        assert [h["name"] for h in valid] == ["good", "array"]
+        assert sorted(i.name for i in invalid) == sorted(set(batch) - {"good", "array"})
+        assert not any(i.fixed for i in invalid)
+
+        valid, invalid = validation.validate_histograms(batch, fix=True)
+        names = ["good", "array", "float_count", "history", "numpy"]
+        assert [h["name"] for h in valid] == names
+        assert sorted(i.name for i in invalid if i.fixed) == sorted(names[2:])
+        assert valid[2]["overflow"] == 3 and isinstance(valid[2]["overflow"], int)
+        assert "history" not in valid[3]
+        assert isinstance(valid[4]["xmin"], int)
+        for histo in valid:  # the server accepts them
+            histo = ingest_pickled_collections.expand_histogram(histo)
+            I3Histogram.from_dict(histo)
+        assert str(batch) == str(original)  # not modified
+
+        assert validation.validate_filelist(["a.i3", "b.i3"]) is None
+        assert validation.validate_filelist(["a.i3", 2])
+
+        # bad histograms are skipped, or fixed, and the rest are POSTed
+        collection = {**batch, "filelist": {"files": ["a.i3", None]}}
+
+        async def ingest(
+            fix: bool,
+        ) -> Tuple[Any, ingest_pickled_collections.IngestStats]:
+            rc = FakeRestClient()  # type: Any
+            loaded = ingest_pickled_collections.LoadedCollection(
+                collection, "TEST_160_COLLECTION", "", []  # type: ignore
+            )
+            stats = await ingest_pickled_collections.ingest(
+                rc, aiter([loaded]), "test_db", fix_invalid=fix
+            )
+            return rc, stats
+
+        rc, stats = asyncio.run(ingest(False))
+        assert sorted(r[2]["histogram"]["name"] for r in rc.requests) == [
+            "array",
+            "good",
+        ]
+        assert len(stats.invalid) == 7  # 6 histograms and the filelist
+        assert stats.reported_invalid == 7
+
+        rc, stats = asyncio.run(ingest(True))
+        assert sorted(r[2]["histogram"]["name"] for r in rc.requests) == sorted(names)
+        assert sum(1 for _, i in stats.invalid if i.fixed) == 3
+
+    @staticmethod
+    def test_170() -> None:
+        """Test delta ingestion of several pickles for the same collection."""
+        histo = {
+            **TestIngestPickledCollections.COLLECTION["LineFitEnergy"],
+            "nan_count": 0,
+        }  # type: Dict[str, Any]
+        server = {}  # type: Dict[str, np.ndarray]
+
+        def apply(rc: Any) -> None:
+            """Add the POSTed histograms & deltas, like the server does with -u."""
+            for _, path, args in rc.requests:
+                if path == "/histogram":
+                    name = args["histogram"]["name"]
+                    bins = np.asarray(args["histogram"]["bin_values"])
+                    server[name] = server.get(name, 0) + bins
+                elif path == "/histogram/delta":
+                    server[args["name"]][args["indices"]] += args["values"]
+
+        with tempfile.TemporaryDirectory() as root:
+            pickles = []
+            for i, bins in enumerate([[1, 1, 1], [5, 0, 2]]):
+                os.makedirs(os.path.join(root, f"job_{i}"))
+                pickles.append(os.path.join(root, f"job_{i}", "TEST_170.pkl"))
+                with open(pickles[-1], "wb") as f:
+                    pickle.dump({"LineFitEnergy": {**histo, "bin_values": bins}}, f)
+            manifest = Manifest(os.path.join(root, "manifest.sqlite"))
+
+            def ingest(paths: List[str]) -> None:
+                rc = FakeRestClient()  # type: Any
+                asyncio.run(
+                    ingest_pickled_collections.ingest(
+                        rc,
+                        ingest_pickled_collections.load_each_collection(
+                            manifest.pending("test_db", paths), workers=0
+                        ),
+                        "test_db",
+                        update=True,
+                        manifest=manifest,
+                        delta=True,
+                    )
+                )
+                apply(rc)
+
+            # each pickle's histogram is added, not diffed against the other's
+            ingest(pickles[:1])
+            ingest(pickles)
+            assert server["LineFitEnergy"].tolist() == [6, 1, 3]
+
+            # a grown pickle adds only its own change
+            with open(pickles[0], "wb") as f:
+                pickle.dump({"LineFitEnergy": {**histo, "bin_values": [2, 1, 1]}}, f)
+            os.utime(pickles[0], ns=(0, 10 ** 9))
+            ingest(pickles)
+            assert server["LineFitEnergy"].tolist() == [7, 1, 3]
+
+            manifest.close()
+
+    @staticmethod
+    def test_180() -> None:
+        """Test that -u doesn't re-add a pickle that changed since it was ingested."""
+        collection = copy.deepcopy(TestIngestPickledCollections.COLLECTION)
+
+        with tempfile.TemporaryDirectory() as root:
+            filename = os.path.join(root, "TEST_180_COLLECTION.pkl")
+            manifest = Manifest(os.path.join(root, "manifest.sqlite"))
+
+            def ingest(update: bool = True) -> Any:
+                rc = FakeRestClient()  # type: Any
+                stats = asyncio.run(
+                    ingest_pickled_collections.ingest(
+                        rc,
+                        ingest_pickled_collections.load_each_collection(
+                            manifest.pending("test_db", [filename]), workers=0
+                        ),
+                        "test_db",
+                        update=update,
+                        manifest=manifest,
+                    )
+                )
+                return rc, stats
+
+            with open(filename, "wb") as f:
+                pickle.dump(collection, f)
+            rc, _ = ingest()
+            assert len(rc.requests) == 3
+
+            collection["LineFitEnergy"]["bin_values"][3] += 5  # type: ignore
+            with open(filename, "wb") as f:
+                pickle.dump(collection, f)
+            os.utime(filename, ns=(0, 10 ** 9))
+            rc, stats = ingest()
+            assert not rc.requests
+            assert stats.rewritten == 1
+            assert not manifest.is_done("test_db", filename)
+
+            # without -u, it's ingested again from scratch
+            rc, stats = ingest(update=False)
+            assert len(rc.requests) == 3
+            assert not stats.rewritten
+            assert manifest.is_done("test_db", filename)
+
+            manifest.close()
+
+    @staticmethod
+    def test_190() -> None:
+        """Test that byte-identical pickles are each ingested."""
+        collection = TestIngestPickledCollections.COLLECTION
+
+        with tempfile.TemporaryDirectory() as root:
+            pickles = [
+                os.path.join(root, "CollA.pkl"),
+                os.path.join(root, "CollB.pkl"),
+                os.path.join(root, "job_0", "CollA.pkl"),
+            ]
+            os.makedirs(os.path.join(root, "job_0"))
+            for pkl in pickles:
+                with open(pkl, "wb") as f:
+                    pickle.dump(collection, f)
+            manifest = Manifest(os.path.join(root, "manifest.sqlite"))
+
+            for pkl in pickles:
+                rc = FakeRestClient()  # type: Any
+                asyncio.run(
+                    ingest_pickled_collections.ingest(
+                        rc,
+                        ingest_pickled_collections.load_each_collection(
+                            [pkl], workers=0
+                        ),
+                        "test_db",
+                        update=True,
+                        manifest=manifest,
+                    )
+                )
+                assert len(rc.requests) == 3
+                assert manifest.is_done("test_db", pkl)
+
+            manifest.close()
+
+    @staticmethod
+    def test_200() -> None:
+        """Test that pickles of the same collection aren't ingested concurrently."""
+        in_flight = {}  # type: Dict[Tuple[str, str], int]
+        overlaps = []  # type: List[Tuple[str, str]]
+
+        class OverlapRestClient(FakeRestClient):
+            """Record requests to a histogram/filelist while another's in flight."""
+
+            async def request(
+                self, method: str, path: str, args: Dict[str, Any]
+            ) -> Any:
+                name = (args["collection"], args.get("histogram", {}).get("name", path))
+                if in_flight.get(name):
+                    overlaps.append(name)
+                in_flight[name] = in_flight.get(name, 0) + 1
+                try:
+                    return await super().request(method, path, args)
+                finally:
+                    in_flight[name] -= 1
+
+        with tempfile.TemporaryDirectory() as root:
+            pickles = []
+            for i in range(3):
+                os.makedirs(os.path.join(root, f"job_{i}"))
+                for name in ["Level2", "Other"]:
+                    pickles.append(os.path.join(root, f"job_{i}", f"{name}.pkl"))
+                    with open(pickles[-1], "wb") as f:
+                        pickle.dump(TestIngestPickledCollections.COLLECTION, f)
+
+            rc = OverlapRestClient()  # type: Any
+            stats = asyncio.run(
+                ingest_pickled_collections.ingest(
+                    rc,
+                    ingest_pickled_collections.load_each_collection(pickles, workers=0),
+                    "test_db",
+                    concurrency=4,
+                    update=True,
+                    max_collections_in_flight=4,
+                )
+            )
+
+        assert len(rc.requests) == 6 * 3
+        assert stats.collections["test_db"] == 6
+        assert rc.max_in_flight > 1  # different collections still overlap
+        assert not overlaps
@@ -0,0 +1,69 @@
+"""Test production_client/watch.py."""
+
+import asyncio
+import os
+import tempfile
+import time
+from functools import partial
+from typing import List
+
+import pytest  # type: ignore
+
+# local imports
+from production_client import ingest_pickled_collections, watch
+
+
+def touch(path: str, age: float = 0.0) -> None:
+    """Write `path`, with an mtime `age` seconds ago."""
+    with open(path, "w") as f:
+        f.write(str(time.time()))
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+async def watch_for(watcher: watch.PickleWatcher, n_pickles: int) -> List[str]:
+    """Return the first `n_pickles` from the watcher."""
+    pickles = []
+    async for pkl in watcher.watch():
+        pickles.append(os.path.basename(pkl))
+        if len(pickles) == n_pickles:
+            watcher.stop()
+    return pickles
+
+
+class TestPickleWatcher:
+    """Unit test the PickleWatcher class."""
+
+    @staticmethod
+    @pytest.mark.parametrize("use_inotify", [False, True])
+    def test_10(use_inotify: bool) -> None:
+        """Test that new, settled, and modified pickles are generated once."""
+        if use_inotify and not watch.inotify_simple:
+            pytest.skip("inotify_simple is not installed")
+
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "a"))
+            touch(os.path.join(root, "a", "old.pkl"), age=60)
+            touch(os.path.join(root, "a", "old.txt"), age=60)
+
+            async def run() -> List[str]:
+                watcher = watch.PickleWatcher(
+                    [root],
+                    partial(ingest_pickled_collections.get_all_pickles, recurse=True),
+                    interval=0.05,
+                    settle=0.3,
+                    use_inotify=use_inotify,
+                )
+                watching = asyncio.ensure_future(watch_for(watcher, 3))
+
+                await asyncio.sleep(0.2)
+                os.makedirs(os.path.join(root, "b"))
+                touch(os.path.join(root, "b", "new.pkl"))  # not settled yet
+                await asyncio.sleep(0.1)
+                assert watcher.backlog == 1
+                await asyncio.sleep(0.5)
+                touch(os.path.join(root, "a", "old.pkl"), age=30)  # modified
+
+                return await asyncio.wait_for(watching, 5)
+
+            assert asyncio.run(run()) == ["old.pkl", "new.pkl", "old.pkl"]
@@ -0,0 +1,141 @@
+"""Test rest_client.py."""
+
+import base64
+import gzip
+import json
+import time
+
+import pytest  # type: ignore
+import requests
+import requests_mock  # type: ignore
+
+# local imports
+import rest_client
+
+DBMS_URL = "http://dbms:8080"
+TOKEN_URL = "http://tokens:8888"
+
+
+def make_token(exp: float) -> str:
+    """Return an (unsigned) JWT that expires at `exp`."""
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode())
+    return f"header.{payload.decode().rstrip('=')}.signature"
+
+
+class TestRestClient:
+    """Unit test rest_client.py."""
+
+    @staticmethod
+    def test_10() -> None:
+        """Test get_token_expiry()."""
+        assert rest_client.get_token_expiry(make_token(1234.5)) == 1234.5
+        assert rest_client.get_token_expiry("not-a-jwt") is None
+
+    @staticmethod
+    def test_20() -> None:
+        """Test that TokenCache reuses a token until near its expiry."""
+        with requests_mock.Mocker() as mock:
+            mock.get(
+                f"{TOKEN_URL}/token?scope=maddash:web",
+                [
+                    {"json": {"access": make_token(time.time() + 3600)}},
+                    {"json": {"access": make_token(time.time() + 30)}},
+                    {"json": {"access": make_token(time.time() + 3600)}},
+                ],
+            )
+            cache = rest_client.TokenCache(TOKEN_URL, "maddash:web")
+
+            first = cache.get()
+            assert cache.get() == first
+            assert mock.call_count == 1
+
+            second = cache.get(force_refresh=True)
+            assert second != first
+            # expires within the refresh margin, so it's replaced
+            assert cache.get() != second
+            assert mock.call_count == 3
+
+    @staticmethod
+    def test_30() -> None:
+        """Test that idempotent calls are retried, and others aren't."""
+        with requests_mock.Mocker() as mock:
+            mock.get(
+                f"{TOKEN_URL}/token?scope=maddash:web",
+                json={"access": make_token(time.time() + 3600)},
+            )
+            mock.get(
+                f"{DBMS_URL}/databases/names",
+                [{"status_code": 503}, {"status_code": 503}, {"json": {"ok": 1}}],
+            )
+            mock.post(f"{DBMS_URL}/histogram", status_code=503)
+
+            rc = rest_client.MadDashRestClient(
+                DBMS_URL, rest_client.TokenCache(TOKEN_URL, "maddash:web"), backoff=0
+            )
+            assert rc.request_seq("GET", "/databases/names") == {"ok": 1}
+            with pytest.raises(requests.exceptions.HTTPError):
+                rc.request_seq("POST", "/histogram", {"histogram": {}})
+
+            summary = rc.stats.summary()
+            assert summary["GET /databases/names"]["calls"] == 1
+            assert summary["GET /databases/names"]["retries"] == 2
+            assert summary["GET /databases/names"]["errors"] == 0
+            assert summary["POST /histogram"]["retries"] == 0
+            assert summary["POST /histogram"]["errors"] == 1
+
+            # one token for every call
+            token_calls = [r for r in mock.request_history if "tokens" in r.url]
+            assert len(token_calls) == 1
+
+    @staticmethod
+    def test_40() -> None:
+        """Test that a 401 is retried once with a fresh token."""
+        with requests_mock.Mocker() as mock:
+            mock.get(
+                f"{TOKEN_URL}/token?scope=maddash:production",
+                [
+                    {"json": {"access": make_token(time.time() + 3600)}},
+                    {"json": {"access": make_token(time.time() + 7200)}},
+                ],
+            )
+            mock.post(
+                f"{DBMS_URL}/histogram", [{"status_code": 401}, {"json": {"ok": 1}}]
+            )
+
+            rc = rest_client.MadDashRestClient(
+                DBMS_URL, rest_client.TokenCache(TOKEN_URL, "maddash:production")
+            )
+            assert rc.request_seq("POST", "/histogram", {"histogram": {}}) == {"ok": 1}
+
+            posts = [r for r in mock.request_history if r.method == "POST"]
+            assert (
+                posts[0].headers["Authorization"] != posts[1].headers["Authorization"]
+            )
+            assert posts[1].json() == {"histogram": {}}
+
+    @staticmethod
+    def test_50() -> None:
+        """Test that get_client() shares clients."""
+        rc = rest_client.get_client(DBMS_URL, TOKEN_URL, "maddash:web")
+        assert rest_client.get_client(DBMS_URL, TOKEN_URL, "maddash:web") is rc
+        assert rest_client.get_client(DBMS_URL, TOKEN_URL, "maddash:production") != rc
+
+    @staticmethod
+    def test_60() -> None:
+        """Test that large bodies are gzipped, when compressing."""
+        small = {"files": ["a.i3.zst"]}
+        large = {"files": [f"/data/sim/IceCube/2020/{i}.i3.zst" for i in range(1000)]}
+
+        with requests_mock.Mocker() as mock:
+            mock.post(f"{DBMS_URL}/files/names", json={})
+
+            rc = rest_client.MadDashRestClient(DBMS_URL, compress=True)
+            rc.request_seq("POST", "/files/names", small)
+            rc.request_seq("POST", "/files/names", large)
+
+            first, second = mock.request_history
+            assert "Content-Encoding" not in first.headers
+            assert first.json() == small
+            assert second.headers["Content-Encoding"] == "gzip"
+            assert len(second.body) < len(json.dumps(large)) / 10
+            assert json.loads(gzip.decompress(second.body)) == large
@@ -0,0 +1,231 @@
+"""Test web_app/utils/memoize.py, and its use in web_app/utils/db.py."""
+
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest  # type: ignore
+
+pytest.importorskip("dash_bootstrap_components")  # needs web_app/requirements.txt
+
+# local imports
+from web_app.utils import db  # isort:skip  # noqa: E402
+from web_app.utils.memoize import MemoCache, memoize  # isort:skip  # noqa: E402
+
+
+class FakeRestClient:
+    """Answer the web app's GET requests, and count them by route."""
+
+    def __init__(self) -> None:
+        self.counts = {}  # type: Dict[str, int]
+
+    def request_seq(self, method: str, path: str, args: Any = None) -> Any:
+        """Fake RestClient.request_seq()."""
+        self.counts[path] = self.counts.get(path, 0) + 1
+        return {
+            "/databases/names": {"databases": ["db"]},
+            "/collections/names": {"collections": ["coll"]},
+            "/collections/histograms/names": {"histograms": ["a", "b"]},
+            "/collections/histograms": {"histograms": []},
+            "/histogram": {
+                "histogram": {
+                    "name": (args or {}).get("name"),
+                    "xmin": 0.0,
+                    "xmax": 1.0,
+                    "overflow": 0,
+                    "underflow": 0,
+                    "nan_count": 0,
+                    "bin_values": [0, 1],
+                }
+            },
+            "/files/names": {"files": ["a.i3"]},
+        }[path]
+
+
+class TestMemoCache:
+    """Unit test the MemoCache class & memoize()."""
+
+    @staticmethod
+    def test_10() -> None:
+        """Test that results are cached by argument, until their TTL."""
+        calls = []  # type: List[str]
+
+        @memoize(MemoCache("test", ttl=0.1))
+        def get(collection_name: str, database_name: str = "db") -> str:
+            calls.append(collection_name)
+            return collection_name.upper()
+
+        assert get("a") == "A"
+        assert get("a", "db") == "A"  # same bound arguments
+        assert get(collection_name="a") == "A"
+        assert get("b") == "B"
+        assert calls == ["a", "b"]
+
+        time.sleep(0.15)
+        assert get("a") == "A"
+        assert calls == ["a", "b", "a"]
+
+    @staticmethod
+    def test_20() -> None:
+        """Test evicting the least-recently used results, by count & by size."""
+        cache = MemoCache("test", ttl=60, max_entries=3, max_bytes=1000)
+
+        def put(key: str, value: Any) -> None:
+            cache.get((key,), {}, lambda: value)
+
+        put("a", "a" * 250)  # 300 bytes, by size_of()
+        put("b", "b" * 250)
+        cache.get(("a",), {}, lambda: None)  # a hit; so b is least-recently used
+        put("c", "c" * 250)
+        assert cache.bytes == 900
+        put("d", "d" * 250)
+        assert [k for k, in cache.entries] == ["a", "c", "d"]
+        assert cache.bytes == 900
+        assert cache.evictions == 1
+
+        put("e", "e" * 950)  # evicts all of the others
+        assert [k for k, in cache.entries] == ["e"]
+        put("f", "f" * 1000)  # bigger than the cache, so not kept at all
+        assert [k for k, in cache.entries] == ["e"]
+
+        put("g", 1)  # evicts e
+        put("h", 2)
+        put("i", 3)
+        put("j", 4)  # too many
+        assert [k for k, in cache.entries] == ["h", "i", "j"]
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 10
+        assert stats["evictions"] == 6
+
+    @staticmethod
+    def test_30() -> None:
+        """Test invalidating results by scope, and all at once."""
+        cache = MemoCache("test", ttl=60)
+        calls = []  # type: List[Any]
+
+        @memoize(cache)
+        def get(histogram_name: str, collection_name: str, database_name: str) -> str:
+            calls.append((histogram_name, collection_name))
+            return histogram_name
+
+        for args in [("h", "c1", "db"), ("g", "c1", "db"), ("h", "c2", "db")]:
+            get(*args)
+        assert len(calls) == 3
+
+        assert cache.invalidate(collection_name="c1", histogram_name="h") == 1
+        get("h", "c1", "db")
+        get("g", "c1", "db")
+        get("h", "c2", "db")
+        assert calls[3:] == [("h", "c1")]
+
+        assert cache.invalidate(database_name="db", collection_name="c1") == 2
+        assert cache.invalidate() == 1
+        assert not cache.entries
+        assert cache.stats()["invalidations"] == 4
+
+    @staticmethod
+    def test_40() -> None:
+        """Test that concurrent misses make one call, and a stale one isn't kept."""
+        cache = MemoCache("test", ttl=60)
+        release = threading.Event()
+        calls = []  # type: List[int]
+
+        def call() -> int:
+            calls.append(len(calls))
+            release.wait()
+            return len(calls)
+
+        def get_concurrently(invalidate: bool) -> List[int]:
+            results = []  # type: List[int]
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(cache.get(("k",), {}, call))
+                )
+                for _ in range(5)
+            ]
+            release.clear()
+            for thread in threads:
+                thread.start()
+            time.sleep(0.05)  # let the others wait on the first call
+            if invalidate:
+                cache.invalidate()  # the call started before this, so may be stale
+            release.set()
+            for thread in threads:
+                thread.join()
+            return sorted(results)
+
+        assert get_concurrently(False) == [1] * 5
+        assert calls == [0]
+        assert cache.stats()["misses"] == 1
+        assert not cache.in_flight
+
+        # the stale call's result isn't kept, so the waiters make one new call
+        cache.invalidate()
+        assert get_concurrently(True) == [2] + [3] * 4
+        assert calls == [0, 1, 2]
+        assert cache.get(("k",), {}, call) == 3
+        assert not cache.in_flight
+
+        # errors aren't cached
+        def fail() -> int:
+            raise ValueError("bad")
+
+        with pytest.raises(ValueError):
+            cache.get(("x",), {}, fail)
+        assert cache.get(("x",), {}, call) == 4
+
+
+class TestDBInvalidation:
+    """Test web_app/utils/db.py's invalidation of its memoized calls."""
+
+    @staticmethod
+    def test_10(monkeypatch: Any) -> None:
+        """Test that each change event drops only the calls it made stale."""
+        rc = FakeRestClient()
+        monkeypatch.setattr(db, "create_simprod_dbms_rest_connection", lambda: rc)
+        for cache in db.CACHES:
+            cache.invalidate()
+
+        def get_all() -> None:
+            db.get_database_names()
+            db.get_collection_names("db")
+            db.get_histogram_names("coll", "db")
+            db.get_histograms("coll", "db")
+            db.get_histogram("a", "coll", "db")
+            db.get_histogram("b", "coll", "db")
+            db.get_filelist("coll", "db")
+            db.get_collection_snapshot("coll", "db")
+
+        def refetched(event: Dict[str, Any]) -> Dict[str, int]:
+            before = dict(rc.counts)
+            db.on_change(event)
+            get_all()
+            return {k: v - before[k] for k, v in rc.counts.items() if v > before[k]}
+
+        get_all()
+        get_all()
+        assert rc.counts["/histogram"] == 2
+        assert all(n == 1 for p, n in rc.counts.items() if p != "/histogram")
+        snapshot = db.get_collection_snapshot("coll", "db")
+        assert snapshot.filelist == ["a.i3"]
+        assert db.get_collection_snapshot("coll", "db") is snapshot
+
+        event = {"database": "db", "collection": "coll", "version": 4}
+        assert refetched({**event, "name": "filelist"}) == {"/files/names": 1}
+        # the snapshot is rebuilt, but from the histograms that are still cached
+        assert db.get_collection_snapshot("coll", "db") is not snapshot
+        assert refetched({**event, "name": "a"}) == {
+            "/collections/histograms/names": 1,
+            "/collections/histograms": 1,
+            "/histogram": 1,  # not b
+        }
+        assert refetched({**event, "name": "a", "collection": "other"}) == {}
+
+        # a new object may be in a new collection (or database)
+        assert refetched({**event, "name": "filelist", "version": 1}) == {
+            "/databases/names": 1,
+            "/collections/names": 1,
+            "/files/names": 1,
+        }
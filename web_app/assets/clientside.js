@@ -0,0 +1,24 @@
+/* Clientside (in-browser) callbacks, which don't make a round trip to the server. */
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    mad_dash: {
+        /* Return the figure with a log (or linear) y-axis, and its title marked. */
+        set_log_scale: function(figure, log) {
+            if (!figure) {
+                return window.dash_clientside.no_update;
+            }
+            const layout = Object.assign({}, figure.layout);
+            layout.yaxis = Object.assign({}, layout.yaxis, {
+                type: log ? "log" : "linear",
+                autorange: true,
+            });
+            if (layout.title && layout.title.text) {
+                const title = layout.title.text.replace(/ \(Log\)$/, "");
+                layout.title = Object.assign({}, layout.title, {
+                    text: log ? `${title} (Log)` : title,
+                });
+            }
+            return Object.assign({}, figure, {layout: layout});
+        },
+    },
+});
@@ -1,5 +1,7 @@
 """Config file."""
 
+import os
+
 import dash  # type: ignore
 import dash_bootstrap_components as dbc  # type: ignore
 import flask
@@ -13,3 +15,12 @@ app.config.suppress_callback_exceptions = True
 
 dbms_server_url = "http://localhost:8080"
 token_server_url = "http://localhost:8888"
+dbms_max_concurrency = 10  # most REST calls in flight at once (per web-app process)
+
+live_update_interval_ms = 5000  # how often the page checks for change notifications
+
+# the histogram tab's "Common Histograms" per database (see `default_histograms.json`)
+default_histograms_path = os.getenv(
+    "MAD_DASH_DEFAULT_HISTOGRAMS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "default_histograms.json"),
+)
@@ -3,11 +3,15 @@
 
 import dash_core_components as dcc  # type: ignore
 import dash_html_components as html  # type: ignore
+import flask
 from dash.dependencies import Input, Output  # type: ignore
 
-from .config import app
+from .config import app, server
 from .styles import CONTENT_STYLE, TAB_SELECTED_STYLE, TAB_STYLE, TABS_STYLE
 from .tabs import comparison_tab, histogram_tab
+from .utils import db, live_updates
+
+live_updates.subscribe(db.on_change)  # keep the memoized db calls fresh
 
 app.layout = html.Div(
     style={"padding-left": "5%", "padding-right": "5%", "backgroundColor": "#FFFFDA"},
@@ -53,3 +57,15 @@ def render_content(tab: str) -> html.Div:
     layouts = {"tab1": histogram_tab.layout, "tab2": comparison_tab.layout}
 
     return layouts[tab]()
+
+
+@server.route("/stats/rest")  # type: ignore
+def rest_stats() -> flask.Response:
+    """Return the DB REST calls' counts and latencies as JSON."""
+    return flask.jsonify(db.get_rest_stats())
+
+
+@server.route("/stats/cache")  # type: ignore
+def cache_stats() -> flask.Response:
+    """Return the memoized DB calls' cache sizes and hits/misses as JSON."""
+    return flask.jsonify(db.get_cache_stats())
@@ -6,7 +6,7 @@ import dash_core_components as dcc  # type: ignore
 import dash_daq as daq  # type: ignore
 import dash_html_components as html  # type: ignore
 import plotly.graph_objs as go  # type: ignore
-from dash.dependencies import Input, Output  # type: ignore
+from dash.dependencies import ClientsideFunction, Input, Output  # type: ignore
 
 from ..config import app
 from ..styles import CENTERED_100, SHORT_HR, WIDTH_45
@@ -59,6 +59,7 @@ def layout() -> html.Div:
                         style=CENTERED_100,
                         children=[
                             html.Div(dcc.Graph(id="plot-histogram-tab2")),
+                            dcc.Store(id="plot-histogram-figure-tab2"),
                             daq.BooleanSwitch(  # pylint: disable=E1101
                                 id="toggle-log-tab2", on=False, label="log"
                             ),
@@ -125,9 +126,9 @@ def update_histogram_dropdown_options(
     if not collection_names:
         return []
 
-    all_histogram_names = [
-        db.get_histogram_names(c, database_name) for c in collection_names
-    ]
+    all_histogram_names = db.fan_out(
+        db.get_histogram_names, [(c, database_name) for c in collection_names]
+    )
 
     # get common histogram names
     sets_of_names = [set(names) for names in all_histogram_names]
@@ -139,11 +140,10 @@ def update_histogram_dropdown_options(
 
 
 @app.callback(
-    Output("plot-histogram-tab2", "figure"),
+    Output("plot-histogram-figure-tab2", "data"),
     [
         Input("histogram-dropdown-tab2", "value"),
         Input("histogram-dropdown-tab2", "options"),
-        Input("toggle-log-tab2", "on"),
         Input("database-name-dropdown-tab2", "value"),
         Input("collections-dropdown-tab2", "value"),
     ],
@@ -151,22 +151,33 @@ def update_histogram_dropdown_options(
 def update_histogram(
     histogram_name: str,
     histogram_options: List[str],
-    log: bool,
     database_name: str,
     collection_names: List[str],
 ) -> go.Figure:
-    """Plot each collection's histograms on the same plot."""
-    if not collection_names or not histogram_options:
-        return hc.i3histogram_to_plotly(None, y_log=log, no_title=True)
+    """Plot each collection's histograms on the same plot.
 
-    all_histograms = [
-        db.get_histogram(histogram_name, c, database_name) for c in collection_names
-    ]
+    The y-axis is linear; `set_log_scale` toggles it in the browser.
+    """
+    if not collection_names or not histogram_options:
+        return hc.i3histogram_to_plotly(None, no_title=True)
 
-    return hc.i3histogram_to_plotly(
-        list(filter(None, all_histograms)), y_log=log, no_title=True
+    all_histograms = db.fan_out(
+        db.get_histogram,
+        [(histogram_name, c, database_name) for c in collection_names],
     )
 
+    return hc.i3histogram_to_plotly(list(filter(None, all_histograms)), no_title=True)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="mad_dash", function_name="set_log_scale"),
+    Output("plot-histogram-tab2", "figure"),
+    [
+        Input("plot-histogram-figure-tab2", "data"),
+        Input("toggle-log-tab2", "on"),
+    ],
+)
+
 
 # --------------------------------------------------------------------------------------------------
 # Comparison Table
@@ -1,18 +1,30 @@
 """Dash tab for displaying histograms."""
 
-from typing import Dict, List, Union
+import json
+import logging
+import typing
+from typing import Any, Dict, List, Optional, Union
 
+import dash  # type: ignore
 import dash_bootstrap_components as dbc  # type: ignore
 import dash_core_components as dcc  # type: ignore
 import dash_daq as daq  # type: ignore
 import dash_html_components as html  # type: ignore
 import plotly.graph_objs as go  # type: ignore
-from dash.dependencies import Input, Output, State  # type: ignore
+from dash.dependencies import (  # type: ignore
+    ALL,
+    MATCH,
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+)
+from dash.exceptions import PreventUpdate  # type: ignore
 
 # local imports
 import api
 
-from ..config import app
+from ..config import app, default_histograms_path, live_update_interval_ms
 from ..styles import (
     CENTERED_30,
     CENTERED_100,
@@ -25,6 +37,7 @@ from ..styles import (
 )
 from ..utils import db
 from ..utils import histogram_converter as hc
+from ..utils import live_updates
 from .database_controls import get_database_name_options, get_default_database
 
 
@@ -32,6 +45,11 @@ def layout() -> html.Div:
     """Construct the HTML."""
     return html.Div(
         children=[
+            dcc.Interval(
+                id="live-update-interval-tab1", interval=live_update_interval_ms
+            ),
+            dcc.Store(id="collection-changes-tab1"),
+            dcc.Store(id="collection-snapshot-tab1"),
             html.Div(
                 style=CENTERED_100,
                 children=[
@@ -145,6 +163,7 @@ def layout() -> html.Div:
                         style=CENTERED_100,
                         children=[
                             html.Div(dcc.Graph(id="plot-histogram-tab1")),
+                            dcc.Store(id="plot-histogram-figure-tab1"),
                             daq.BooleanSwitch(  # pylint: disable=E1101
                                 id="toggle-log-tab1", on=False, label="log"
                             ),
@@ -179,81 +198,184 @@ def layout() -> html.Div:
                             ),
                         ],
                     ),
-                    html.Div(
-                        className="row",
-                        style=CENTERED_100,
-                        children=[
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="one-one")],
-                            ),
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="one-two")],
-                            ),
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="one-three")],
-                            ),
-                        ],
-                    ),
-                    ####
-                    html.Hr(style=SHORT_HR),
-                    ####
-                    html.Div(
-                        className="row",
-                        style=CENTERED_100,
-                        children=[
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="two-one")],
-                            ),
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="two-two")],
-                            ),
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="two-three")],
-                            ),
-                        ],
-                    ),
-                    ####
-                    html.Hr(style=SHORT_HR),
-                    ####
-                    html.Div(
-                        className="row",
-                        style=CENTERED_100,
-                        children=[
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="three-one")],
-                            ),
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="three-two")],
-                            ),
-                            html.Div(
-                                className="three columns",
-                                style=WIDTH_30,
-                                children=[dcc.Graph(id="three-three")],
-                            ),
-                        ],
-                    ),
+                    html.Div(id="default-histograms-tab1"),  # filled by callback
                 ]
             ),
         ]
     )
 
 
+# --------------------------------------------------------------------------------------------------
+# Live Updates
+
+
+@app.callback(
+    Output("collection-changes-tab1", "data"),
+    [Input("live-update-interval-tab1", "n_intervals")],
+    [
+        State("database-name-dropdown-tab1", "value"),
+        State("collection-name-dropdown-tab1", "value"),
+        State("collection-changes-tab1", "data"),
+    ],
+)  # type: ignore
+def poll_collection_changes(
+    _: int,
+    database_name: str,
+    collection_name: str,
+    previous: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Record which objects in the collection changed since the last poll.
+
+    Only reads the local change-notification state, not the database.
+    """
+    if not database_name or not collection_name:
+        raise PreventUpdate
+
+    versions = live_updates.get_versions(database_name, collection_name)
+
+    changed = []  # type: List[str]
+    if (
+        previous
+        and previous["database"] == database_name
+        and previous["collection"] == collection_name
+    ):
+        changed = [n for n, v in versions.items() if previous["versions"].get(n) != v]
+        if not changed:
+            raise PreventUpdate
+
+    return {
+        "database": database_name,
+        "collection": collection_name,
+        "versions": versions,
+        "changed": changed,
+    }
+
+
+def _skip_if_unaffected(
+    snapshot: Optional[Dict[str, Any]], names: Optional[List[str]] = None
+) -> None:
+    """Raise `PreventUpdate` if a change notification alone triggered the callback
+    (by refreshing the snapshot), and none of `names` changed.
+
+    If `names` is None, a change to any histogram is relevant. Also raise
+    it if there's no snapshot yet.
+    """
+    if not snapshot:
+        raise PreventUpdate
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    if triggered != ["collection-snapshot-tab1.data"] or snapshot["changed"] is None:
+        return
+
+    changed = set(snapshot["changed"])
+    if names is None:
+        changed.discard("filelist")
+    else:
+        changed &= set(names)
+
+    if not changed:
+        raise PreventUpdate
+
+
+# --------------------------------------------------------------------------------------------------
+# Collection Snapshot
+
+DEFAULT_HISTOGRAMS = [
+    "PrimaryEnergy",
+    "PrimaryZenith",
+    "PrimaryCosZenith",
+    "CascadeEnergy",
+    "PulseTime",
+    "SecondaryMultiplicity",
+    "InIceDOMOccupancy",
+    "InIceDOMLaunchTime",
+    "LogQtot",
+]
+
+
+def get_default_histograms(database_name: str) -> List[str]:
+    """Return the names of the database's default ("common") histograms.
+
+    They're read from the `default_histograms_path` JSON file, which maps
+    database names, or "default" for any other database, to lists of
+    names. The file is re-read each time, so it can be edited live.
+    """
+    try:
+        with open(default_histograms_path) as f:
+            defaults = json.load(f)
+        names = defaults.get(database_name, defaults["default"])
+        api.check_type(names, list, str)
+        return typing.cast(List[str], names)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Can't read default histograms ({e}), using the built-ins.")
+        return DEFAULT_HISTOGRAMS
+
+
+@app.callback(
+    Output("collection-snapshot-tab1", "data"),
+    [
+        Input("database-name-dropdown-tab1", "value"),
+        Input("collection-name-dropdown-tab1", "value"),
+        Input("collection-changes-tab1", "data"),
+    ],
+    [State("collection-snapshot-tab1", "data")],
+)  # type: ignore
+def update_collection_snapshot(
+    database_name: str,
+    collection_name: str,
+    changes: Optional[Dict[str, Any]],
+    previous: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Fetch what the tab shows of the collection, once for all of its widgets.
+
+    The snapshot itself (see `db.get_collection_snapshot()`) stays in the
+    server's cache; the store has its key (the database, collection, and
+    `version`), and the small parts: the histograms' names, which of them
+    are empty, and the number of files. `changed` has the names of what
+    changed, if a change notification triggered the refresh, otherwise
+    it's None (all new).
+    """
+    changed = None  # type: Optional[List[str]]
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    if (
+        triggered == ["collection-changes-tab1.data"]
+        and previous
+        and previous["database"] == database_name
+        and previous["collection"] == collection_name
+    ):
+        changed = changes["changed"] if changes else []
+        if not changed:
+            raise PreventUpdate
+
+    store = {
+        "database": database_name,
+        "collection": collection_name,
+        "version": 0,
+        "names": [],
+        "empty": [],
+        "n_files": 0,
+        "changed": changed,
+    }  # type: Dict[str, Any]
+    if not database_name or not collection_name:
+        return store
+
+    versions = live_updates.get_versions(database_name, collection_name)
+    store["version"] = sum(versions.values())
+    snapshot = _get_snapshot(store)
+    store["names"] = list(snapshot.histograms)
+    store["empty"] = [
+        h.name for h in snapshot.histograms.values() if not any(h.bin_values)
+    ]
+    store["n_files"] = len(snapshot.filelist)
+    return store
+
+
+def _get_snapshot(store: Dict[str, Any]) -> db.CollectionSnapshot:
+    """Return the (cached) collection snapshot that the store is for."""
+    return db.get_collection_snapshot(
+        store["collection"], store["database"], store["version"]
+    )
+
+
 # --------------------------------------------------------------------------------------------------
 # Collection Stats
 
@@ -302,16 +424,14 @@ def filelist_modal_header(collection_name: str) -> str:
 
 @app.callback(
     Output("filelist-list-tab1", "children"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-    ],
+    [Input("collection-snapshot-tab1", "data")],
 )  # type: ignore
 def filelist_modal_list(
-    database_name: str, collection_name: str
+    snapshot: Dict[str, Any],
 ) -> Union[List[dbc.ListGroupItem], str]:
     """Return list of files for the filelist modal."""
-    filelist = db.get_filelist(collection_name, database_name)
+    _skip_if_unaffected(snapshot, ["filelist"])
+    filelist = _get_snapshot(snapshot).filelist
     if filelist:
         return [dbc.ListGroupItem(x) for x in filelist]
     return "None"
@@ -337,16 +457,12 @@ def update_collection_options(database_name: str) -> List[Dict[str, str]]:
 
 @app.callback(
     Output("files-number-tab1", "children"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-    ],
+    [Input("collection-snapshot-tab1", "data")],
 )  # type: ignore
-def update_histogram_filelist_number(database_name: str, collection_name: str) -> str:
+def update_histogram_filelist_number(snapshot: Dict[str, Any]) -> str:
     """Return number of files in the collection."""
-    filelist = db.get_filelist(collection_name, database_name)
-
-    return str(len(filelist))
+    _skip_if_unaffected(snapshot, ["filelist"])
+    return str(snapshot["n_files"])
 
 
 @app.callback(
@@ -365,15 +481,12 @@ def update_histogram_filelist_label(files: str) -> str:
 
 @app.callback(
     Output("n-histograms-number-tab1", "children"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-    ],
+    [Input("collection-snapshot-tab1", "data")],
 )  # type: ignore
-def update_n_histograms_number(database_name: str, collection_name: str) -> str:
+def update_n_histograms_number(snapshot: Dict[str, Any]) -> str:
     """Return number of histograms in the collection."""
-    histogram_names = db.get_histogram_names(collection_name, database_name)
-    return str(len(histogram_names))
+    _skip_if_unaffected(snapshot)
+    return str(len(snapshot["names"]))
 
 
 @app.callback(
@@ -393,18 +506,12 @@ def update_n_histograms_label(histos: str) -> str:
 
 @app.callback(
     Output("n-empty-histograms-number-tab1", "children"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-    ],
+    [Input("collection-snapshot-tab1", "data")],
 )  # type: ignore
-def update_n_empty_histograms_number(database_name: str, collection_name: str) -> str:
+def update_n_empty_histograms_number(snapshot: Dict[str, Any]) -> str:
     """Return number of empty histograms in the collection."""
-    histograms = db.get_histograms(collection_name, database_name,)
-    non_empty_histograms = [h for h in histograms if any(h.bin_values)]
-    n_empty = len(histograms) - len(non_empty_histograms)
-
-    return str(n_empty)
+    _skip_if_unaffected(snapshot)
+    return str(len(snapshot["empty"]))
 
 
 @app.callback(
@@ -424,196 +531,115 @@ def update_n_empty_histograms_label(empty_histos: str) -> str:
 
 @app.callback(
     Output("histogram-dropdown-tab1", "options"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-    ],
+    [Input("collection-snapshot-tab1", "data")],
 )  # type: ignore
-def update_histogram_dropdown_options(
-    database_name: str, collection_name: str
-) -> List[Dict[str, str]]:
+def update_histogram_dropdown_options(snapshot: Dict[str, Any]) -> List[Dict[str, str]]:
     """Return the histograms available for selection in the dropdown menu."""
-    if not collection_name:
-        return []
-
-    histograms = db.get_histograms(collection_name, database_name)
+    _skip_if_unaffected(snapshot)
+    empty = set(snapshot["empty"])
 
-    def make_label(h: api.I3Histogram) -> str:
-        if any(h.bin_values):
-            return h.name
-        return f"{h.name} (empty)"
+    def make_label(name: str) -> str:
+        if name not in empty:
+            return name
+        return f"{name} (empty)"
 
-    return [{"label": make_label(h), "value": h.name} for h in histograms]
+    return [{"label": make_label(n), "value": n} for n in snapshot["names"]]
 
 
 @app.callback(
-    Output("plot-histogram-tab1", "figure"),
+    Output("plot-histogram-figure-tab1", "data"),
     [
         Input("histogram-dropdown-tab1", "value"),
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-tab1", "on"),
+        Input("collection-snapshot-tab1", "data"),
     ],
 )  # type: ignore
 def update_histogram_dropdown(
-    histogram_name: str, database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot chosen histogram."""
-    histogram = db.get_histogram(histogram_name, collection_name, database_name)
-    return hc.i3histogram_to_plotly(histogram, y_log=log, no_title=True)
-
-
-# --------------------------------------------------------------------------------------------------
-# Default Histograms
-
-
-def _plot_default_histogram(
-    database_name: str, collection_name: str, histo_name: str, log: bool
-) -> go.Figure:
-    histogram = db.get_histogram(histo_name, collection_name, database_name)
-    return hc.i3histogram_to_plotly(
-        histogram, title=histo_name, alert_no_data=True, y_log=log
-    )
-
-
-@app.callback(
-    Output("one-one", "figure"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-default-tab1", "on"),
-    ],
-)  # type: ignore
-def update_default_histograms_one_one(
-    database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(database_name, collection_name, "PrimaryEnergy", log)
-
-
-@app.callback(
-    Output("one-two", "figure"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-default-tab1", "on"),
-    ],
-)  # type: ignore
-def update_default_histograms_one_two(
-    database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(database_name, collection_name, "PrimaryZenith", log)
-
-
-@app.callback(
-    Output("one-three", "figure"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-default-tab1", "on"),
-    ],
-)  # type: ignore
-def update_default_histograms_one_three(
-    database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(
-        database_name, collection_name, "PrimaryCosZenith", log
-    )
-
-
-@app.callback(
-    Output("two-one", "figure"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-default-tab1", "on"),
-    ],
-)  # type: ignore
-def update_default_histograms_two_one(
-    database_name: str, collection_name: str, log: bool
+    histogram_name: str, snapshot: Dict[str, Any]
 ) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(database_name, collection_name, "CascadeEnergy", log)
+    """Plot chosen histogram (with a linear y-axis, see `set_log_scale`)."""
+    _skip_if_unaffected(snapshot, [histogram_name])
+    histogram = _get_snapshot(snapshot).histograms.get(histogram_name)
+    return hc.i3histogram_to_plotly(histogram, no_title=True)
 
 
-@app.callback(
-    Output("two-two", "figure"),
+app.clientside_callback(
+    ClientsideFunction(namespace="mad_dash", function_name="set_log_scale"),
+    Output("plot-histogram-tab1", "figure"),
     [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-default-tab1", "on"),
+        Input("plot-histogram-figure-tab1", "data"),
+        Input("toggle-log-tab1", "on"),
     ],
-)  # type: ignore
-def update_default_histograms_two_two(
-    database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(database_name, collection_name, "PulseTime", log)
+)
 
 
-@app.callback(
-    Output("two-three", "figure"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-default-tab1", "on"),
-    ],
-)  # type: ignore
-def update_default_histograms_two_three(
-    database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(
-        database_name, collection_name, "SecondaryMultiplicity", log
-    )
+# --------------------------------------------------------------------------------------------------
+# Default Histograms
 
 
 @app.callback(
-    Output("three-one", "figure"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-default-tab1", "on"),
-    ],
+    Output("default-histograms-tab1", "children"),
+    [Input("database-name-dropdown-tab1", "value")],
 )  # type: ignore
-def update_default_histograms_three_one(
-    database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(
-        database_name, collection_name, "InIceDOMOccupancy", log
-    )
+def update_default_histograms_grid(database_name: str) -> List[html.Div]:
+    """Lay out a graph for each of the database's default histograms, 3 per row."""
+    names = get_default_histograms(database_name)
+
+    rows = []  # type: List[html.Div]
+    for i in range(0, len(names), 3):
+        if rows:
+            rows.append(html.Hr(style=SHORT_HR))
+        graphs = [
+            html.Div(
+                className="three columns",
+                style=WIDTH_30,
+                children=[
+                    dcc.Graph(id={"type": "default-histogram-tab1", "index": n}),
+                    dcc.Store(id={"type": "default-figure-tab1", "index": n}),
+                ],
+            )
+            for n in names[i : i + 3]
+        ]
+        rows.append(html.Div(className="row", style=CENTERED_100, children=graphs))
+    return rows
 
 
 @app.callback(
-    Output("three-two", "figure"),
-    [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
-        Input("toggle-log-default-tab1", "on"),
-    ],
+    Output({"type": "default-figure-tab1", "index": ALL}, "data"),
+    [Input("collection-snapshot-tab1", "data")],
 )  # type: ignore
-def update_default_histograms_three_two(
-    database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(
-        database_name, collection_name, "InIceDOMLaunchTime", log
-    )
+def update_default_histograms(snapshot: Dict[str, Any]) -> List[Any]:
+    """Plot every default histogram, from the (cached) collection snapshot.
 
+    The figures have linear y-axes; `set_log_scale` toggles them in the browser.
 
-@app.callback(
-    Output("three-three", "figure"),
+    After a change notification, only the changed histograms are re-plotted.
+    """
+    names = [o["id"]["index"] for o in dash.callback_context.outputs_list]
+    _skip_if_unaffected(snapshot, names)
+
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    changed = None  # type: Optional[List[str]]
+    if triggered == ["collection-snapshot-tab1.data"]:
+        changed = snapshot["changed"]
+
+    histograms = _get_snapshot(snapshot).histograms
+    figures = []  # type: List[Any]
+    for name in names:
+        if changed is not None and name not in changed:
+            figures.append(dash.no_update)
+            continue
+        histogram = histograms.get(name)
+        figures.append(
+            hc.i3histogram_to_plotly(histogram, title=name, alert_no_data=True)
+        )
+    return figures
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="mad_dash", function_name="set_log_scale"),
+    Output({"type": "default-histogram-tab1", "index": MATCH}, "figure"),
     [
-        Input("database-name-dropdown-tab1", "value"),
-        Input("collection-name-dropdown-tab1", "value"),
+        Input({"type": "default-figure-tab1", "index": MATCH}, "data"),
         Input("toggle-log-default-tab1", "on"),
     ],
-)  # type: ignore
-def update_default_histograms_three_three(
-    database_name: str, collection_name: str, log: bool
-) -> go.Figure:
-    """Plot a default histogram."""
-    return _plot_default_histogram(database_name, collection_name, "LogQtot", log)
+)
@@ -1,3 +1,3 @@
 """Init."""
 
-from . import db, histogram_converter  # noqa: F401
+from . import db, histogram_converter, live_updates  # noqa: F401
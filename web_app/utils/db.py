@@ -2,26 +2,118 @@
 
 import logging
 import typing
-from typing import List, Optional
-from urllib.parse import urljoin
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
 
 import requests
 
 # local imports
 import api
-from rest_tools.client import RestClient  # type: ignore
-
-from ..config import dbms_server_url, token_server_url
-
-
-def create_simprod_dbms_rest_connection() -> RestClient:
-    """Return REST Client connection object."""
-    token_request_url = urljoin(token_server_url, "token?scope=maddash:web")
-
-    token_json = requests.get(token_request_url).json()
-    rc = RestClient(dbms_server_url, token=token_json["access"], timeout=5, retries=0)
-
-    return rc
+import rest_client
+
+from ..config import dbms_max_concurrency, dbms_server_url, token_server_url
+from .memoize import MemoCache, memoize
+
+# types
+T = TypeVar("T")
+
+# caches -- results are kept until their TTL, or until a change invalidates them
+DATABASE_NAMES_CACHE = MemoCache("get_database_names", ttl=60, max_entries=1)
+COLLECTION_NAMES_CACHE = MemoCache("get_collection_names", ttl=60, max_entries=64)
+HISTOGRAM_NAMES_CACHE = MemoCache("get_histogram_names", ttl=30, max_entries=256)
+HISTOGRAMS_CACHE = MemoCache(
+    "get_histograms", ttl=30, max_entries=64, max_bytes=256 * 1024**2
+)
+HISTOGRAM_CACHE = MemoCache(
+    "get_histogram", ttl=30, max_entries=4096, max_bytes=128 * 1024**2
+)
+FILELIST_CACHE = MemoCache(
+    "get_filelist", ttl=30, max_entries=64, max_bytes=64 * 1024**2
+)
+COLLECTION_SNAPSHOT_CACHE = MemoCache(
+    "get_collection_snapshot", ttl=30, max_entries=64, max_bytes=256 * 1024**2
+)
+CACHES = [
+    DATABASE_NAMES_CACHE,
+    COLLECTION_NAMES_CACHE,
+    HISTOGRAM_NAMES_CACHE,
+    HISTOGRAMS_CACHE,
+    HISTOGRAM_CACHE,
+    FILELIST_CACHE,
+    COLLECTION_SNAPSHOT_CACHE,
+]
+
+
+class CollectionSnapshot(NamedTuple):
+    """A collection's histograms (by name) and filelist, as of one version."""
+
+    histograms: Dict[str, api.I3Histogram]
+    filelist: List[str]
+
+
+def create_simprod_dbms_rest_connection() -> rest_client.MadDashRestClient:
+    """Return the (shared) REST Client connection object."""
+    return rest_client.get_client(
+        dbms_server_url, token_server_url, "maddash:web", pool_size=dbms_max_concurrency
+    )
+
+
+def fan_out(func: Callable[..., T], calls: List[Tuple[Any, ...]]) -> List[T]:
+    """Return `func(*args)` for each of `calls`, made concurrently.
+
+    The calls share the REST client's thread pool (and connection pool),
+    so at most `dbms_max_concurrency` are in flight at once. The results
+    are in the same order as `calls`, and the first error is raised.
+    """
+    if len(calls) <= 1:
+        return [func(*args) for args in calls]
+    executor = create_simprod_dbms_rest_connection().executor
+    futures = [executor.submit(func, *args) for args in calls]
+    return [f.result() for f in futures]
+
+
+def get_token() -> str:
+    """Return a web-scoped access token (cached until near its expiry)."""
+    token_cache = create_simprod_dbms_rest_connection().token_cache
+    return token_cache.get()  # type: ignore
+
+
+def get_rest_stats() -> Dict[str, Dict[str, float]]:
+    """Return the REST calls' counts and latencies."""
+    return create_simprod_dbms_rest_connection().stats.summary()
+
+
+def get_cache_stats() -> Dict[str, Dict[str, float]]:
+    """Return each memoized call's cache size and hits/misses."""
+    return {cache.name: cache.stats() for cache in CACHES}
+
+
+def invalidate(
+    database_name: str, collection_name: str, name: str, version: int = 0
+) -> None:
+    """Drop the memoized calls that a change to the object could have made stale.
+
+    A filelist change only affects the filelist, and a histogram change
+    only affects that histogram and its collection's histograms; either
+    affects the collection's snapshots. A new object (`version` 1, or
+    unknown) may be in a new collection/database.
+    """
+    scope = {"database_name": database_name, "collection_name": collection_name}
+    if name == "filelist":
+        FILELIST_CACHE.invalidate(**scope)
+    else:
+        HISTOGRAM_CACHE.invalidate(**scope, histogram_name=name)
+        HISTOGRAMS_CACHE.invalidate(**scope)
+        HISTOGRAM_NAMES_CACHE.invalidate(**scope)
+    # last, so a snapshot isn't rebuilt from the stale parts
+    COLLECTION_SNAPSHOT_CACHE.invalidate(**scope)
+    if version <= 1:
+        COLLECTION_NAMES_CACHE.invalidate(database_name=database_name)
+        DATABASE_NAMES_CACHE.invalidate()
+
+
+def on_change(event: Dict[str, Any]) -> None:
+    """Invalidate the memoized calls a change event affects (a change subscriber)."""
+    invalidate(event["database"], event["collection"], event["name"], event["version"])
 
 
 def _log(
@@ -38,6 +130,7 @@ def _log(
     logging.info(f"DB REST Call: {url} {db_str} {coll_str} {histo_str}")
 
 
+@memoize(DATABASE_NAMES_CACHE)
 def get_database_names() -> List[str]:
     """Return the database names."""
     rc = create_simprod_dbms_rest_connection()
@@ -48,6 +141,7 @@ def get_database_names() -> List[str]:
     return sorted(response["databases"])
 
 
+@memoize(COLLECTION_NAMES_CACHE)
 def get_collection_names(database_name: str) -> List[str]:
     """Return the database's collections."""
     if not database_name:
@@ -62,6 +156,7 @@ def get_collection_names(database_name: str) -> List[str]:
     return sorted(response["collections"])
 
 
+@memoize(HISTOGRAM_NAMES_CACHE)
 def get_histogram_names(collection_name: str, database_name: str) -> List[str]:
     """Return the histograms names in the collection."""
     if not collection_name or not database_name:
@@ -76,6 +171,7 @@ def get_histogram_names(collection_name: str, database_name: str) -> List[str]:
     return sorted(response["histograms"])
 
 
+@memoize(HISTOGRAMS_CACHE)
 def get_histograms(collection_name: str, database_name: str) -> List[api.I3Histogram]:
     """Return the histograms from the collection."""
     if not collection_name or not database_name:
@@ -90,9 +186,13 @@ def get_histograms(collection_name: str, database_name: str) -> List[api.I3Histo
     response = rc.request_seq("GET", url, coll_histos_request_body)
 
     _log(url, database_name, collection_name)
-    return [api.I3Histogram.from_dict(h) for h in response["histograms"]]
+    histograms = [api.I3Histogram.from_dict(h) for h in response["histograms"]]
+    for i3histo in histograms:
+        i3histo.collection = collection_name  # type: ignore
+    return histograms
 
 
+@memoize(HISTOGRAM_CACHE)
 def get_histogram(
     histogram_name: str, collection_name: str, database_name: str
 ) -> Optional[api.I3Histogram]:
@@ -119,6 +219,7 @@ def get_histogram(
     return i3histo
 
 
+@memoize(FILELIST_CACHE)
 def get_filelist(collection_name: str, database_name: str) -> List[str]:
     """Return the filenames in the filelist from the collection."""
     if not collection_name or not database_name:
@@ -133,3 +234,20 @@ def get_filelist(collection_name: str, database_name: str) -> List[str]:
     files = response["files"]
     api.check_type(files, list, str)  # actually type check
     return typing.cast(List[str], files)  # type check for mypy
+
+
+@memoize(COLLECTION_SNAPSHOT_CACHE)
+def get_collection_snapshot(
+    collection_name: str, database_name: str, version: int = 0
+) -> CollectionSnapshot:
+    """Return the collection's histograms and filelist, for several widgets to share.
+
+    `version` identifies the collection's state (see `live_updates`), so a
+    client can keep just the key, and get the same snapshot from the
+    cache. After a change, only what changed is re-fetched, since the
+    parts are memoized on their own.
+    """
+    histograms = get_histograms(collection_name, database_name)
+    return CollectionSnapshot(
+        {h.name: h for h in histograms}, get_filelist(collection_name, database_name)
+    )
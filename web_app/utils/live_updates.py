@@ -0,0 +1,87 @@
+"""Listen to the database's change notifications (Server-Sent Events)."""
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+
+from ..config import dbms_server_url
+from . import db
+
+# types
+ChangeEvent = Dict[str, Any]
+Subscriber = Callable[[ChangeEvent], None]
+
+RECONNECT_SECONDS = 5
+
+_lock = threading.Lock()
+_versions: Dict[Tuple[str, str], Dict[str, int]] = {}
+_subscribers: List[Subscriber] = []
+_listener: Optional[threading.Thread] = None
+
+
+def subscribe(subscriber: Subscriber) -> None:
+    """Call `subscriber` with every change event received."""
+    with _lock:
+        _subscribers.append(subscriber)
+    start_listener()
+
+
+def get_versions(database_name: str, collection_name: str) -> Dict[str, int]:
+    """Return the latest known version of each changed object in the collection.
+
+    Only objects changed since the listener started are included.
+    """
+    start_listener()
+    with _lock:
+        return dict(_versions.get((database_name, collection_name), {}))
+
+
+def start_listener() -> None:
+    """Start the background listener thread, if it's not already running."""
+    global _listener  # pylint: disable=W0603
+    with _lock:
+        if _listener:
+            return
+        _listener = threading.Thread(target=_listen, name="live-updates", daemon=True)
+        _listener.start()
+
+
+def _handle_event(event: ChangeEvent) -> None:
+    """Call the subscribers (like `db.on_change()`), then publish the version.
+
+    In that order, a poll that sees the new version can't refetch (and
+    keep) results that weren't invalidated yet.
+    """
+    with _lock:
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber(event)
+        except Exception:  # pylint: disable=W0703
+            logging.exception(f"Change subscriber failed on {event}.")
+    key = (event["database"], event["collection"])
+    with _lock:
+        _versions.setdefault(key, {})[event["name"]] = event["version"]
+
+
+def _listen() -> None:
+    """Consume the event stream forever, reconnecting when it drops."""
+    url = urljoin(dbms_server_url, "/events")
+    while True:
+        try:
+            headers = {"Authorization": f"Bearer {db.get_token()}"}
+            with requests.get(url, headers=headers, stream=True, timeout=60) as resp:
+                resp.raise_for_status()
+                logging.info(f"Listening for change events at {url}.")
+                for raw in resp.iter_lines():
+                    line = raw.decode()
+                    if line.startswith("data:"):
+                        _handle_event(json.loads(line[len("data:") :]))
+        except Exception as e:  # pylint: disable=W0703
+            logging.warning(f"Change event stream dropped ({e}), reconnecting...")
+        time.sleep(RECONNECT_SECONDS)
@@ -0,0 +1,180 @@
+"""Memoize database calls, with TTLs, size limits, and explicit invalidation."""
+
+import functools
+import inspect
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, TypeVar, cast
+
+# local imports
+import api
+
+# types
+Function = TypeVar("Function", bound=Callable[..., Any])
+Key = Tuple[Any, ...]
+
+# arguments that say what a call's result depends on, for invalidation
+SCOPE = ["database_name", "collection_name", "histogram_name"]
+
+
+def size_of(value: Any) -> int:
+    """Return roughly how many bytes the value takes up."""
+    if isinstance(value, api.I3Histogram):
+        return 200 + 8 * (len(value.bin_values) + len(value.history))
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(size_of(v) for v in value)
+    if isinstance(value, dict):
+        return 64 + sum(size_of(k) + size_of(v) for k, v in value.items())
+    if isinstance(value, str):
+        return 50 + len(value)
+    return sys.getsizeof(value)
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires: float
+    size: int
+    scope: Dict[str, Any]
+
+
+class MemoCache:
+    """A thread-safe LRU cache of a function's results.
+
+    Each result is kept for `ttl` seconds, or until it's invalidated. At
+    most `max_entries` results, and `max_bytes` (by `size_of()`) if given,
+    are kept; the least-recently used are evicted first. Concurrent misses
+    for the same arguments make one call, which the others wait for.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int = 128,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # type: OrderedDict[Key, _Entry]
+        self.in_flight = {}  # type: Dict[Key, threading.Event]
+        self.generation = 0  # incremented by every invalidation
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Key, scope: Dict[str, Any], call: Callable[[], Any]) -> Any:
+        """Return the cached result for `key`, or else `call()` and cache its result.
+
+        Errors aren't cached. A result whose call started before an
+        invalidation isn't cached either, since it may be stale.
+        """
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry and entry.expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                if entry:
+                    self._remove(key)
+                waiting = self.in_flight.get(key)
+                if not waiting:
+                    self.misses += 1
+                    done = self.in_flight[key] = threading.Event()
+                    generation = self.generation
+                    break
+            waiting.wait()
+
+        try:
+            value = call()
+            with self.lock:
+                if self.generation == generation:
+                    expires = time.monotonic() + self.ttl
+                    self._put(key, _Entry(value, expires, size_of(value), scope))
+            return value
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            done.set()
+
+    def _remove(self, key: Key) -> None:
+        self.bytes -= self.entries.pop(key).size
+
+    def _put(self, key: Key, entry: _Entry) -> None:
+        if key in self.entries:
+            self._remove(key)
+        if self.max_bytes is not None and entry.size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.bytes += entry.size
+
+        while len(self.entries) > self.max_entries or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def invalidate(self, **scope: Any) -> int:
+        """Drop the results that depend on `scope`, and return how many.
+
+        A result matches if each of its own scope arguments (see `SCOPE`)
+        that's in `scope` has the same value; so `invalidate()` drops all.
+        """
+        with self.lock:
+            self.generation += 1
+            stale = [
+                key
+                for key, entry in self.entries.items()
+                if all(
+                    entry.scope[k] == v for k, v in scope.items() if k in entry.scope
+                )
+            ]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        """Return the cache's size and hit/miss counts."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def memoize(cache: MemoCache) -> Callable[[Function], Function]:
+    """Memoize the decorated function in `cache`, by its (bound) arguments.
+
+    The cached results are shared, so callers mustn't modify them.
+    """
+
+    def decorator(func: Function) -> Function:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = tuple(bound.arguments.values())
+            scope = {k: v for k, v in bound.arguments.items() if k in SCOPE}
+            return cache.get(key, scope, lambda: func(*args, **kwargs))
+
+        return cast(Function, wrapper)
+
+    return decorator